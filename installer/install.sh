@@ -499,7 +499,14 @@ do_pyvenv() {
         if [ "$is_pi" = true ]; then  # removed --ignore-installed from below need to verify what's needed here
             sudo ${consolepi_dir}venv/bin/python3 -m pip install RPi.GPIO 2> >(grep -v "WARNING: Retrying " | tee -a $log_file >&2) ||
                 logit "pip install/upgrade RPi.GPIO (separately) returned an error." "WARNING"
+            # -- libgpiod bindings, used for GPIO connected relays.  Falls back to RPi.GPIO if not installed
+            sudo ${consolepi_dir}venv/bin/python3 -m pip install --upgrade gpiod 2> >(grep -v "WARNING: Retrying " | tee -a $log_file >&2) ||
+                logit "pip install/upgrade gpiod (libgpiod) returned an error." "WARNING"
         fi
+        # -- Optional API encoders (orjson, msgpack, brotli) and server (uvloop, httptools).  ConsolePi falls back to json/gzip and the
+        #    stock asyncio loop/h11 if they fail to install (no wheel for the platform)
+        sudo ${consolepi_dir}venv/bin/python3 -m pip install --upgrade orjson msgpack Brotli uvloop httptools 2> >(grep -v "WARNING: Retrying " | tee -a $log_file >&2) ||
+            logit "pip install/upgrade orjson msgpack Brotli uvloop httptools (optional API packages) returned an error." "WARNING"
         # -- Update venv packages based on requirements file --
         sudo ${consolepi_dir}venv/bin/python3 -m pip install --upgrade -r ${consolepi_dir}installer/requirements.txt 2> >(grep -v "WARNING: Retrying " | tee -a $log_file >&2) &&
             ( echo; logit "Success - pip install/upgrade ConsolePi requirements" ) ||
@@ -972,6 +972,13 @@ do_consolepi_api() {
     unset process
 }
 
+# Create or Update ConsolePi Power Broker service (systemd)
+do_consolepi_powerbroker() {
+    process="ConsolePi Power Broker (systemd)"
+    systemd_diff_update consolepi-powerbroker
+    unset process
+}
+
 # Create or Update ConsolePi mdns startup service (systemd)
 do_consolepi_mdns() {
     process="ConsolePi mDNS (systemd)"
@@ -1403,6 +1410,7 @@ update_main() {
     do_blue_config
     do_consolepi_cleanup
     do_consolepi_api
+    do_consolepi_powerbroker
     do_consolepi_mdns
     do_resize
 
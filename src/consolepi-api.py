@@ -11,8 +11,19 @@ attached to the remotes).
 mdns and gdrive provide discovery/sync mechanisms, the API is used
 to ensure the remote is reachable and that the data is current.
 '''
+import asyncio
+import grp
+import importlib.util
+import os
+import signal
+import socket
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Tuple
 
+import pyudev
 import setproctitle
 import uvicorn  # NoQA
 from rich.traceback import install
@@ -20,27 +31,94 @@ from rich.traceback import install
 sys.path.insert(0, '/etc/ConsolePi/src/pypkg')
 from consolepi import config, log  # type: ignore # NoQA
 from consolepi.consolepi import ConsolePi  # type: ignore # NoQA
+from consolepi.cache import RefreshCache  # type: ignore # NoQA
+from consolepi.localapi import API_SOCK  # type: ignore # NoQA
+from consolepi import codec, metrics  # type: ignore # NoQA
 from fastapi import FastAPI  # NoQA
 # from pydantic import BaseModel  # NoQA
-from time import time  # NoQA
 from starlette.requests import Request  # NoQA
+from starlette.responses import PlainTextResponse, Response  # NoQA
 
 install(show_locals=True)
 
 setproctitle.setproctitle("consolepi-api")
 
 
-cpi = ConsolePi()
-cpiexec = cpi.cpiexec
-local = cpi.local
-if config.power:
-    if not cpiexec.wait_for_threads():
-        OUTLETS = cpi.pwr.data if cpi.pwr.data else None
-else:
-    OUTLETS = None
-user = local.user
-last_update = int(time())
-udev_last_update = int(time())
+# -- ConsolePi objects, the refresh cache and the udev observer are built by init() in each worker process --
+cpi = cpiexec = local = user = OUTLETS = None
+executor: ThreadPoolExecutor = None
+cache: RefreshCache = None
+udev_observer: pyudev.MonitorObserver = None
+API_SHARED_DIR = Path('/dev/shm/consolepi-api')  # with multiple workers the cache is shared (refreshed once for all workers)
+METRICS_SAVE_INTERVAL = 10  # seconds, workers save metrics so any worker can serve /metrics for all of them
+CACHE_TTL = {'adapters': 20, 'interfaces': 20}
+WATCH_INTERVAL = 2  # seconds between checks of watched files
+MAX_VARIANTS = 32  # max number of encoded responses retained
+API_VERSION = '1.0'
+_revision: Tuple[Tuple[int, ...], str] = ((), '')  # (adapters version, inventory revision)
+_variants: Dict[Tuple[str, ...], Tuple[Tuple[int, ...], bytes, Dict[str, str]]] = {}
+WATCHED_FILES = [config.ser2net_file, config.static.get('CONFIG_FILE_YAML'), config.static.get('RULES_FILE')]
+
+
+def refresh_adapters() -> Dict[str, Any]:
+    config.ser2net_conf = config.get_ser2net()
+    local.adapters = local.build_adapter_dict(refresh=True)
+    return local.adapters
+
+
+def refresh_interfaces() -> Dict[str, Any]:
+    local.interfaces = local.get_if_info()
+    return local.interfaces
+
+
+# -- // Cache Invalidation Hooks \\ --
+def udev_event(device: pyudev.Device) -> None:
+    if device.action in ['add', 'remove', 'change']:
+        log.debug(f'[API] udev {device.action} {device.device_node}, invalidating adapters')
+        cache.invalidate('adapters')
+
+
+def init() -> None:
+    '''Build the ConsolePi objects, refresh cache, and udev observer used by the API.
+
+    Called in each worker process after it's forked.  ConsolePi() starts threads (outlet init,
+    remote verification) and takes locks, which are not safe to inherit across a fork.
+    '''
+    global cpi, cpiexec, local, user, OUTLETS, executor, cache, udev_observer
+    cpi = ConsolePi()
+    cpiexec = cpi.cpiexec
+    local = cpi.local
+    if config.power:
+        if not cpiexec.wait_for_threads():
+            OUTLETS = cpi.pwr.data if cpi.pwr.data else None
+    user = local.user
+
+    # blocking refresh work (udev scans, ser2net/yaml parsing) is done in this pool, keeping the event loop free
+    # single worker as refreshes update the shared local object (refreshes are serialized)
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='consolepi-api-refresh')
+    cache = RefreshCache(executor, shared_dir=None if config.api_workers <= 1 else API_SHARED_DIR)
+    cache.register('adapters', refresh_adapters, ttl=CACHE_TTL['adapters'])
+    cache.register('interfaces', refresh_interfaces, ttl=CACHE_TTL['interfaces'])
+
+    udev_observer = pyudev.MonitorObserver(
+        pyudev.Monitor.from_netlink(pyudev.Context()), callback=udev_event, name='consolepi-api-udev'
+    )
+    udev_observer.monitor.filter_by('tty')
+
+
+async def watch_files() -> None:
+    '''Invalidate adapters when ser2net config, ConsolePi.yaml or the udev rules file changes.'''
+    def mtimes():
+        return {f: Path(f).stat().st_mtime if f and Path(f).exists() else None for f in WATCHED_FILES}
+
+    last = mtimes()
+    while True:
+        await asyncio.sleep(WATCH_INTERVAL)
+        cur = mtimes()
+        if cur != last:
+            log.debug(f'[API] {", ".join([str(f) for f in cur if cur[f] != last.get(f)])} changed, invalidating adapters')
+            cache.invalidate('adapters')
+            last = cur
 
 
 # class Adapters(BaseModel):
@@ -102,44 +180,72 @@ app = FastAPI(title='ConsolePi.API',
               )
 
 
+@app.middleware('http')
+async def request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get('route')
+    metrics.observe(
+        'consolepi_api_request_seconds', time.perf_counter() - start,
+        path=route.path if route else 'unmatched', method=request.method, status=response.status_code
+    )
+    return response
+
+
 def log_request(request: Request, route: str):
-    log.info('[NEW API RQST IN] {} Requesting -- {} -- Data via API'.format(request.client.host, route))
+    # requests via the unix socket (on-box tools) have no client address
+    log.info('[NEW API RQST IN] {} Requesting -- {} -- Data via API'.format(request.client.host if request.client else 'local', route))
+
+
+def respond(
+    request: Request, data: Any, fields: str = None, exclude: str = None, prefix: str = None, version: Tuple[int, ...] = None
+) -> Response:
+    '''Project (fields/exclude) and encode response based on what the client accepts (msgpack/json, brotli/gzip).
+
+    If version (of the cached data) is provided the encoded response is retained, subsequent requests for the same
+    projection/encoding are served the pre-serialized body until the version changes.
+    '''
+    accept, accept_encoding = request.headers.get('accept'), request.headers.get('accept-encoding')
+    key = (request.url.path, fields or '', exclude or '', accept or '', accept_encoding or '')
+    if version is not None and key in _variants and _variants[key][0] == version:
+        return Response(content=_variants[key][1], headers=_variants[key][2])
+
+    body, headers = codec.encode(codec.project(data, fields, exclude, prefix=prefix), accept, accept_encoding)
+    if version is not None:
+        if key not in _variants and len(_variants) >= MAX_VARIANTS:
+            del _variants[next(iter(_variants))]
+        _variants[key] = (version, body, headers)
+    return Response(content=body, headers=headers)
 
 
 #  -- Haven't yet cracked the code on properly updating swagger-ui with examples and schema --
 # @app.get('/api/v1.0/adapters', responses={200: {'model': Adapters}})
 @app.get('/api/v1.0/adapters')
-async def adapters(request: Request, refresh: bool = False):
-    global last_update
-    time_upd = True if int(time()) - last_update > 20 else False
-    log_request(request, f'adapters Update based on Time {time_upd}, Update based on query param {refresh}')
-    # if data has been refreshed in the last 20 seconds trust it is valid
-    # prevents multiple simul calls to get_adapters after mdns_refresh and
-    # subsequent API calls from all other ConsolePi on the network
-    if refresh or int(time()) - last_update > 20:
-        config.ser2net_conf = config.get_ser2net()
-        local.adapters = local.build_adapter_dict(refresh=True)
-        last_update = int(time())
-    return {'adapters': local.adapters}
+async def adapters(request: Request, refresh: bool = False, fields: str = None, exclude: str = None):
+    log_request(request, f'adapters Update based on query param {refresh}')
+    # adapters are cached (refreshed after ttl, on udev/config changes or refresh query param)
+    # concurrent requests (i.e. all other ConsolePis on the network after mdns_refresh) share a single refresh
+    # fields/exclude are dotted paths applied to each adapter i.e. fields=config,udev.devname
+    data = {'adapters': await cache.get('adapters', refresh=refresh)}
+    return respond(request, data, fields, exclude, prefix='adapters.*', version=cache.version('adapters'))
 
 
 @app.get('/api/v1.0/adapters/udev/{adapter}')
 async def udev(request: Request, adapter: str = None):
     log_request(request, f'fetching udev details for {adapter}')
-    return {adapter: local.udev_adapters.get(f'/dev/{adapter}')}
+    return respond(request, {adapter: local.udev_adapters.get(f'/dev/{adapter}')})
 
 
 @app.get('/api/v1.0/remotes')
-def remotes(request: Request):
+def remotes(request: Request, fields: str = None, exclude: str = None):
     log_request(request, 'remotes')
-    return {'remotes': config.get_remotes_from_file()}
+    return respond(request, {'remotes': config.get_remotes_from_file()}, fields, exclude, prefix='remotes.*')
 
 
 @app.get('/api/v1.0/interfaces')
-def get_ifaces(request: Request):
+async def get_ifaces(request: Request):
     log_request(request, 'ifaces')
-    local.interfaces = local.get_if_info()
-    return {'interfaces': local.interfaces}
+    return respond(request, {'interfaces': await cache.get('interfaces')})
 
 # removing due to fastapi issue #894, outlets method was not being used for anything currently so disabling for now
 # @app.get('/api/v1.0/outlets')
@@ -157,14 +263,161 @@ def get_ifaces(request: Request):
 
 
 @app.get('/api/v1.0/details')
-def get_details(request: Request):
+async def get_details(request: Request, fields: str = None, exclude: str = None):
     log_request(request, 'details')
-    global last_update
-    if int(time()) - last_update > 20:
-        local.data = local.build_local_dict(refresh=True)
-        last_update = int(time())
-    return local.data
+    local.adapters = await cache.get('adapters')
+    local.interfaces = await cache.get('interfaces')
+    local.data = local.build_local_dict()
+    return respond(request, local.data, fields, exclude, prefix='*', version=cache.version('adapters', 'interfaces'))
+
+
+@app.get('/api/v1.0/snapshot')
+async def snapshot(request: Request, refresh: bool = False, fields: str = None, exclude: str = None):
+    '''adapters, interfaces, and identity in a single response (used by remotes to verify this ConsolePi).
+
+    fields/exclude are dotted paths from the root of the response i.e. fields=hostname,revision,adapters.*.config
+    '''
+    global _revision
+    log_request(request, f'snapshot Update based on query param {refresh}')
+    _adapters = await cache.get('adapters', refresh=refresh)
+    _interfaces = await cache.get('interfaces')
+    version = cache.version('adapters', 'interfaces')
+    if _revision[0] != version[0:1]:
+        _revision = (version[0:1], codec.revision(_adapters))
+    data = {
+        'hostname': local.hostname,
+        'cpuserial': local.cpuserial,
+        'api_version': API_VERSION,
+        'version': config.static.get('CONSOLEPI_VER'),
+        'revision': _revision[1],
+        'adapters': _adapters,
+        'interfaces': _interfaces,
+        'api_port': local.api_port,
+        'user': config.cfg.get('rem_user', 'pi'),
+    }
+    return respond(request, data, fields, exclude, version=version)
+
+
+@app.get('/metrics', response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
+
+
+@app.get('/api/v1.0/cache')
+async def cache_stats(request: Request):
+    log_request(request, 'cache stats')
+    return respond(request, {'cache': cache.stats()})
+
+
+async def save_metrics() -> None:
+    while True:
+        await asyncio.sleep(METRICS_SAVE_INTERVAL)
+        metrics.save('consolepi-api')
+
+
+@app.on_event('startup')
+async def startup():
+    log.use_queue()  # request logging is done in a background thread
+    if config.api_workers > 1:
+        asyncio.create_task(save_metrics())
+    cache.prime('adapters', local.adapters)
+    cache.prime('interfaces', local.interfaces)
+    udev_observer.start()
+    asyncio.create_task(watch_files())
+
+
+def unix_socket() -> socket.socket:
+    '''Bind the API's Unix socket (used by on-box tools via consolepi.localapi).  returns: None if it can't be bound.'''
+    path = Path(config.static.get('API_SOCK', API_SOCK))
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.unlink(missing_ok=True)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(str(path))
+        sock.listen(2048)
+    except OSError as e:
+        log.warning(f'[API] Unable to listen on {path} {e.__class__.__name__}: {e}')
+        return None
+    try:
+        os.chown(path, -1, grp.getgrnam('consolepi').gr_gid)
+        os.chmod(path, 0o660)
+    except (KeyError, PermissionError) as e:
+        log.warning(f'[API] Unable to set permissions on {path} {e.__class__.__name__}: {e}')
+    log.info(f'[API] Listening on {path}')
+    return sock
+
+
+def run() -> None:
+    '''Run the API, uvloop/httptools are used if installed.
+
+    The API listens on api_port and on a Unix socket (API_SOCK) for on-box tools.
+
+    With the api_workers override > 1, the listening sockets are opened once and shared by forked worker
+    processes (workers that exit are restarted).  The parent only holds the sockets, each worker builds
+    it's own ConsolePi objects (init) after the fork.
+    '''
+    server_kwargs = {
+        'loop': 'uvloop' if importlib.util.find_spec('uvloop') else 'asyncio',
+        'http': 'httptools' if importlib.util.find_spec('httptools') else 'h11',
+        'access_log': False,  # requests are logged by the API (log_request)
+        'log_level': 'info',
+    }
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("0.0.0.0", config.api_port))
+    sock.listen(2048)
+    sockets = [s for s in [sock, unix_socket()] if s is not None]
+    if config.api_workers <= 1:
+        init()
+        uvicorn.Server(uvicorn.Config(app, **server_kwargs)).run(sockets=sockets)
+        return
+
+    for s in sockets:
+        s.set_inheritable(True)
+    for f in metrics.METRICS_DIR.glob('consolepi-api.*.json'):  # metrics from workers of a previous run
+        f.unlink(missing_ok=True)
+
+    def start_worker() -> int:
+        pid = os.fork()
+        if pid == 0:
+            setproctitle.setproctitle("consolepi-api-worker")
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                init()
+                uvicorn.Server(uvicorn.Config(app, **server_kwargs)).run(sockets=sockets)
+            except Exception as e:
+                log.exception(f'[API] worker {os.getpid()} failed {e.__class__.__name__}: {e}')
+                os._exit(1)
+            os._exit(0)
+        return pid
+
+    workers = [start_worker() for _ in range(config.api_workers)]
+    log.info(f'[API] Started {len(workers)} workers {workers} {server_kwargs["loop"]}/{server_kwargs["http"]}')
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        if pid in workers:
+            workers.remove(pid)
+            if not stopping:
+                log.warning(f'[API] worker {pid} exited ({status}), restarting')
+                workers.append(start_worker())
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=config.api_port, log_level="info")
+    run()
@@ -5,17 +5,26 @@ import subprocess
 
 sys.path.insert(0, '/etc/ConsolePi/src/pypkg')
 from consolepi import config, utils, log  # type: ignore # NoQA
-from consolepi.consolepi import ConsolePi  # type: ignore # NoQA
+from consolepi.localapi import LocalAPI, LocalAPIUnavailable  # type: ignore # NoQA
 
 
-cpi = ConsolePi()
-local = cpi.local
-hostname = local.hostname
-adapters = local.adapters
-interfaces = local.interfaces
-remotes = cpi.remotes.data
-details = local.data
+# -- // local details are collected from the running API (unix socket), built locally if the API is not running \\ --
+cpi = None
+try:
+    details = LocalAPI().get('details')
+    remotes = {r: v for r, v in config.remotes.items() if not v.get('fail_cnt')}
+except LocalAPIUnavailable as e:
+    log.debug(f'[LOCAL API] API not available, collecting details locally {e}')
+    from consolepi.consolepi import ConsolePi  # type: ignore # NoQA
+    cpi = ConsolePi()
+    details = cpi.local.data
+    remotes = cpi.remotes.data
+
+hostname = next(iter(details))
+adapters = details[hostname]['adapters']
+interfaces = details[hostname]['interfaces']
 dump = {'local': details, 'remotes': config.remotes}
+cpiexec = None if not cpi else cpi.cpiexec
 
 
 def jprint(data):
@@ -28,17 +37,30 @@ def jprint(data):
 
 
 def get_outlets():
-    if not config.outlets:
-        cpi.cpiexec.pwr_init_complete = True
-    if config.outlets and not cpi.cpiexec.pwr_init_complete:
-        utils.spinner('Waiting for Power Threads To Complete', cpi.cpiexec.wait_for_threads)
-        if cpi.pwr:
-            return cpi.pwr.data
+    global cpiexec
+    if not config.outlets or not config.power:
+        return
+    if cpiexec is None:
+        from consolepi.power import Outlets  # type: ignore # NoQA
+        from consolepi.exec import ConsolePiExec  # type: ignore # NoQA
+        cpiexec = ConsolePiExec(config, Outlets(), None, None)
+    if not cpiexec.pwr_init_complete:
+        utils.spinner('Waiting for Power Threads To Complete', cpiexec.wait_for_threads)
+    if cpiexec.pwr:
+        return cpiexec.pwr.data
+
+
+def get_remotes():
+    '''Remotes object (used to update the local cloud cache).'''
+    if cpi is not None:
+        return cpi.remotes
+    from consolepi.consolepi import ConsolePi  # type: ignore # NoQA
+    return ConsolePi(bypass_outlets=True).remotes
 
 
 if config.remotes:
     for r in config.remotes:
-        if r not in cpi.remotes.data:
+        if r not in remotes:
             dump['remotes'][r]['!! WARNING !!'] = 'This Device is Currently Unreachable'
 
 if len(sys.argv) > 1:
@@ -59,7 +81,7 @@ if len(sys.argv) > 1:
                 if sys.argv[3] in remotes:
                     print('Removing ' + sys.argv[3] + ' from local cloud cache')
                     remotes.pop(sys.argv[3])
-                    cpi.remotes.update_local_cloud_file(remote_consoles=remotes, current_remotes=remotes)
+                    get_remotes().update_local_cloud_file(remote_consoles=remotes, current_remotes=remotes)
                     print('Remotes remaining in local cache')
                     jprint(remotes)
                     print('{} Removed from local cache'.format(sys.argv[3]))
@@ -84,5 +106,5 @@ if log.error_msgs:
     print('!! ', end='')
     print('\n!! '.join(log.error_msgs))
 
-if config.outlets and not cpi.cpiexec.pwr_init_complete:
-    utils.spinner('Exiting... Waiting for Power Threads To Complete', cpi.cpiexec.wait_for_threads)
+if config.outlets and cpiexec and not cpiexec.pwr_init_complete:
+    utils.spinner('Exiting... Waiting for Power Threads To Complete', cpiexec.wait_for_threads)
@@ -2,6 +2,7 @@
 
 import json
 import readline # NoQA - allows input to accept backspace
+import signal
 import sys
 import re
 import threading
@@ -9,7 +10,7 @@ import itertools
 from os import system
 from pprint import pprint
 from collections import OrderedDict as od
-from typing import Union
+from typing import Callable, Union
 from halo import Halo
 import asyncio
 # from rich.console import Console
@@ -37,6 +38,11 @@ class Actions():
 # console = Console()
 
 
+class Redraw(Exception):
+    '''Raised in the main thread while waiting for input, to redraw the menu (i.e. outlets have been verified).'''
+    pass
+
+
 class Choice():
     def __init__(self, prompt: str, clear=False):
         if not clear:
@@ -235,28 +241,32 @@ class ConsolePiMenu(Rename):
         show_linked = False
         choice = ''
 
-        # Ensure Power Threads are complete
+        # Ensure Power Threads are complete, unless we have the last known state to display while they complete
         if not cpi.pwr_init_complete:
-            with Halo(text='Waiting for Outlet init threads to complete', spinner='dots'):
-                self.cpiexec.wait_for_threads()
-                outlets = pwr.data['defined']
+            if not pwr.stale:
+                with Halo(text='Waiting for Outlet init threads to complete', spinner='dots'):
+                    self.cpiexec.wait_for_threads()
+            outlets = pwr.data['defined']
         else:
             outlets = self.cpiexec.outlet_update()
 
         if not outlets:
             log.show('No Linked Outlets are connected')
             return
-        if cpi.cpiexec.autopwr_wait:
-            utils.spinner("Waiting for Auto Power Threads to Complete", cpi.cpiexec.wait_for_threads, name="auto_pwr", timeout=20)
+        if not cpi.cpiexec.autopwr_done.is_set():
+            utils.spinner("Waiting for Auto Power Threads to Complete", cpi.cpiexec.autopwr_done.wait, timeout=20)
 
         while choice not in ['x']:
             item = 1
+            outlets = pwr.data['defined']  # state is replaced on every update, re-read for each redraw
 
             header = 'Power Control Menu'
             subhead = [
                 '  enter item # to toggle power state on outlet',
                 '  enter c + item # i.e. "c2" to cycle power on outlet'
             ]
+            if pwr.stale:
+                subhead.append('  Showing last known state, outlets are being verified (the menu is updated once they are)')
 
             # Build menu items for each linked outlet
             state_list = []
@@ -266,8 +276,8 @@ class ConsolePiMenu(Rename):
             for r in sorted(outlets):
                 outlet = outlets[r]
 
-                # -- // Linked DLI OUTLET AND ESPHOME MENU LINE(s) \\ --
-                if outlet['type'].lower() in ['dli', 'esphome']:
+                # -- // Linked DLI OUTLET, ESPHOME AND MULTI-RELAY TASMOTA MENU LINE(s) \\ --
+                if outlet['type'].lower() in ['dli', 'esphome'] or isinstance(outlet.get('is_on'), dict):
                     is_on_dict = {}
 
                     # Show DLIs that are linked (Auto Power On)
@@ -278,6 +288,13 @@ class ConsolePiMenu(Rename):
                     elif len(outlet.get("relays", {})) == 1 or (outlet.get('linked_devs') and outlet.get('is_on')):
                         is_on_dict = {k: v for k, v in outlet["is_on"].items() if k in outlet.get("linked_devs", {}).values()}
 
+                    # Show linked tasmota relays (multi-relay tasmota), or all if there is only 1.
+                    if outlet['type'].lower() == 'tasmota':
+                        _linked_relays = [int(p) for v in outlet.get('linked_devs', {}).values() for p in utils.listify(v)]
+                        is_on_dict = {
+                            k: v for k, v in outlet["is_on"].items() if len(outlet["is_on"]) == 1 or k in _linked_relays
+                        }
+
                     for _port in is_on_dict:
                         if show_linked:
                             this_linked = config.cfg_yml.get('POWER', {}).get(r, {}).get('linked_devs', {})
@@ -303,6 +320,8 @@ class ConsolePiMenu(Rename):
                         _menu_line = f"[{_state}] {_name}"
                         _menu_line = f"{_menu_line} ({r}" if _name.strip() != r else f"{_menu_line} ("
                         _menu_line = f"{_menu_line} Port:{_port})" if _name.strip() != _port else f"{_menu_line})"
+                        if pwr.stale_age(r):
+                            _menu_line = f"{_menu_line} {{{{dyellow}}}}(last known {pwr.stale_age(r)}){{{{norm}}}}"
                         _menu_line = f"{_menu_line} {_linked if _linked else ''}"
                         body.append(_menu_line)
 
@@ -329,9 +348,10 @@ class ConsolePiMenu(Rename):
                 # -- // GPIO or tasmota OUTLET MENU LINE \\ --
                 else:
                     # pwr functions put any errors (aborts) in pwr.data[grp]['error']
-                    if pwr.data['defined'][r].get('errors'):
-                        log.show(f'{r} - {pwr.data["defined"][r]["errors"]}')
-                        del pwr.data['defined'][r]['errors']
+                    if outlet.get('errors'):
+                        log.show(f'{r} - {outlet["errors"]}')
+                        with pwr.state.update() as data:
+                            data['defined'][r].pop('errors', None)
 
                     if show_linked:
                         this_linked = config.cfg_yml.get('POWER', {}).get(r, {}).get('linked_devs', {})
@@ -341,8 +361,9 @@ class ConsolePiMenu(Rename):
                     if isinstance(outlet.get('is_on'), bool):
                         _state = states[outlet['is_on']]
                         state_list.append(outlet['is_on'])
+                        _stale = '' if not pwr.stale_age(r) else f"{{{{dyellow}}}}(last known {pwr.stale_age(r)}){{{{norm}}}} "
                         body.append(f"[{_state}] {' ' + r if 'ON' in _state else r} ({outlet['type']}:{outlet['address']}) "
-                                    f"{_linked if _linked else ''}")
+                                    f"{_stale}{_linked if _linked else ''}")
                         menu_actions[str(item)] = {
                             'function': pwr.pwr_toggle,
                             'args': [outlet['type'], outlet['address']],
@@ -397,19 +418,22 @@ class ConsolePiMenu(Rename):
                 menu_actions['d'] = self.dli_menu
 
             menu_actions = menu.print_menu(body, header=header, subhead=subhead, legend=legend, menu_actions=menu_actions)
-            choice_c = self.wait_for_input(locs=locals())
+            choice_c = self.wait_for_input(locs=locals(), redraw_when=None if not pwr.stale else lambda: not pwr.stale)
             choice = choice_c.lower
             if choice not in ['r', 'l']:
                 if menu.cur_page == 1 and choice == "b":
                     break
+                if choice and not cpi.pwr_init_complete:  # outlets need to be verified before performing any operation
+                    with Halo(text='Verifying Outlets', spinner='dots'):
+                        self.cpiexec.wait_for_threads()
                 cpi.cpiexec.menu_exec(choice_c, menu_actions, calling_menu='power_menu')
             elif choice == 'l':
                 show_linked = not show_linked
             elif choice == 'r':
                 if pwr.dli_exists:
-                    outlets = utils.spinner("Refreshing Outlets", self.cpiexec.outlet_update, refresh=True, upd_linked=True)
+                    utils.spinner("Refreshing Outlets", self.cpiexec.outlet_update, refresh=True, upd_linked=True)
 
-    def wait_for_input(self, prompt: str = " >> ", terminate: bool = False, locs: dict = {}) -> Choice:
+    def wait_for_input(self, prompt: str = " >> ", terminate: bool = False, locs: dict = {}, redraw_when: Callable = None) -> Choice:
         '''Get input from user.
 
         User Can Input One of the following for special handling:
@@ -426,6 +450,8 @@ class ConsolePiMenu(Rename):
             lower {bool} -- return lower case user input (default: {True})
             terminate {bool} -- terminates program if Ctrl+C/Ctrl+D (default: {False})
             locs {dict} -- locals from calling func for use in debug print func (default: {{}})
+            redraw_when {Callable} -- if provided an empty str is returned (menu is redrawn) once it returns True,
+                                      i.e. when outlets displayed with last known state have been verified (default: {None})
 
         Returns:
             str -- If user input is not 'exit' (which exits the program) will return an
@@ -443,7 +469,7 @@ class ConsolePiMenu(Rename):
                          f'a[r:{self.cur_menu.tty.rows}, c:{self.cur_menu.tty.cols}]' \
                          f'{prompt}'
 
-            ch = Choice(prompt)
+            ch = Choice(prompt) if redraw_when is None else self.redraw_input(prompt, redraw_when)
 
             # -- // toggle debug \\ --
             if ch.lower == 'debug':
@@ -475,6 +501,39 @@ class ConsolePiMenu(Rename):
                 print('')  # prevents header and prompt on same line in debug
                 return Choice(prompt, clear=True)
 
+    def redraw_input(self, prompt: str, redraw_when: Callable) -> Choice:
+        '''Get input from user, returns an empty Choice (the menu is redrawn) once redraw_when() returns True.
+
+        A watcher thread polls redraw_when and interrupts input() in the main thread via SIGUSR1.
+        '''
+        if redraw_when() or threading.current_thread() is not threading.main_thread():
+            return Choice(prompt)
+
+        done = threading.Event()
+
+        def interrupt(signum, frame):
+            if not done.is_set():
+                raise Redraw
+
+        def watch():
+            while not done.wait(0.25):
+                if redraw_when():
+                    signal.pthread_kill(threading.main_thread().ident, signal.SIGUSR1)
+                    return
+
+        _handler = signal.signal(signal.SIGUSR1, interrupt)
+        threading.Thread(target=watch, name='menu_redraw', daemon=True).start()
+        try:
+            try:
+                return Choice(prompt)
+            finally:
+                done.set()
+        except Redraw:
+            print('')
+            return Choice(prompt, clear=True)
+        finally:
+            signal.signal(signal.SIGUSR1, _handler)
+
     # ------ // DLI WEB POWER SWITCH MENU / Multi-Port menu \\ ------ #
     def dli_menu(self, calling_menu: str = 'power_menu'):
         cpi = self.cpi
@@ -494,7 +553,7 @@ class ConsolePiMenu(Rename):
         }
 
         choice = ''
-        if not cpi.pwr_init_complete:
+        if not cpi.pwr_init_complete and not pwr.stale:
             with Halo(text='Waiting for Outlet init Threads to Complete...',
                       spinner='dots'):
                 cpi.cpiexec.wait_for_threads('init')
@@ -503,15 +562,16 @@ class ConsolePiMenu(Rename):
             log.show('All Defined dli Web Power Switches are unreachable')
             return
 
-        if cpi.cpiexec.autopwr_wait:
-            utils.spinner("Waiting for Auto Power Threads to Complete", cpi.cpiexec.wait_for_threads, name="auto_pwr", timeout=20)
+        if not cpi.cpiexec.autopwr_done.is_set():
+            utils.spinner("Waiting for Auto Power Threads to Complete", cpi.cpiexec.autopwr_done.wait, timeout=20)
 
         while choice not in ['x']:
             item = start = 1
             outer_body = []
             slines = []
             state_list = []
-            dli_dict = {**pwr.data['dli_power'], **pwr.data['esp_power']}
+            _data = pwr.data  # single snapshot, dli and esp data are consistent with each other
+            dli_dict = {**_data['dli_power'], **_data['esp_power']}
             for addr in sorted(dli_dict, key=lambda i: i.lower()):
                 mlines = []
                 state_list = []
@@ -627,6 +687,8 @@ class ConsolePiMenu(Rename):
                 start += 10
 
                 outer_body.append(mlines)   # list of lists where each list = printed menu lines
+                if pwr.stale_age(addr):
+                    host_short = f'{host_short} (last known {pwr.stale_age(addr)})'
                 slines.append(host_short)   # list of strings index to index match with body list of lists
 
             header = 'DLI Web Power Switch / espHome Power Strip'
@@ -634,6 +696,8 @@ class ConsolePiMenu(Rename):
             if True in state_list:
                 subhead.append('enter c + item # i.e. "c2" to cycle power on outlet')
             subhead.append('enter r + item # i.e. "r2" to rename the outlet')
+            if pwr.stale:
+                subhead.append('Showing last known state, outlets are being verified (the menu is updated once they are)')
 
             legend = {'opts': ['back', 'refresh']}
             if (not calling_menu == 'power_menu' and pwr.data) and (pwr.gpio_exists or pwr.tasmota_exists or pwr.linked_exists or pwr.esphome_exists):
@@ -654,18 +718,18 @@ class ConsolePiMenu(Rename):
             if menu.cur_page == 1 and choice == "b":
                 break
 
-            choice_c = self.wait_for_input(locs=locals())
+            choice_c = self.wait_for_input(locs=locals(), redraw_when=None if not pwr.stale else lambda: not pwr.stale)
             choice = choice_c.lower
             if choice == 'r':
                 self.spin.start('Refreshing Outlets')
-                dli_dict = self.cpiexec.outlet_update(refresh=True, key='dli_power')
-                esp_dict = self.cpiexec.outlet_update(refresh=True, key='esp_power')
-                pwr.data['dli_power'] = dli_dict
-                pwr.data['esp_power'] = esp_dict
+                self.cpiexec.outlet_update(refresh=True, key='dli_power')  # refreshes dli and esp data
                 self.spin.succeed()
             elif choice == 'b':
                 return
             else:
+                if choice and not cpi.pwr_init_complete:  # outlets need to be verified before performing any operation
+                    with Halo(text='Verifying Outlets', spinner='dots'):
+                        cpi.cpiexec.wait_for_threads('init')
                 cpi.cpiexec.menu_exec(choice_c, menu_actions, calling_menu='dli_menu')
 
     def key_menu(self):
@@ -3,10 +3,13 @@
 """ Browse for other ConsolePis on the network
 """
 
+import hashlib
 import json
 import time
 import sys
-from zeroconf import ServiceBrowser, ServiceStateChange, Zeroconf
+from typing import Dict, List, Set
+from zeroconf import ServiceStateChange, Zeroconf
+from zeroconf.asyncio import AsyncServiceBrowser, AsyncServiceInfo, AsyncZeroconf
 import setproctitle
 import asyncio
 
@@ -14,16 +17,32 @@ from rich.traceback import install
 install(show_locals=True)
 
 sys.path.insert(0, '/etc/ConsolePi/src/pypkg')
-from consolepi import log, config  # type: ignore # NoQA
+from consolepi import log, config, codec, metrics  # type: ignore # NoQA
 from consolepi.consolepi import ConsolePi  # type: ignore # NoQA
+from consolepi.mdns import decode_txt  # type: ignore # NoQA
 
 
-RESTART_INTERVAL = 300  # time in seconds browser service will restart
+HEALTH_INTERVAL = 60  # seconds between checks that the browser is running (it's restarted if not)
+SERVICE_TYPE = "_consolepi._tcp.local."
+VERIFY_WORKERS = 4  # number of discoveries processed (verified via API) concurrently
+MAX_QUEUED = 256  # max number of discoveries waiting to be processed
+INFO_TIMEOUT = 3000  # ms to wait for service info
 
 setproctitle.setproctitle("consolepi-mdnsbrowser")
 
 
 class MDNS_Browser:
+    '''Browse for other ConsolePis via mdns.
+
+    zeroconf callbacks only queue the discovered service name, discoveries are processed (service info
+    requested, verified via API, local cache updated) by VERIFY_WORKERS async workers.  A service already
+    queued is not queued again, and a service discovered again while it's being processed is processed
+    once more after the current run completes.
+
+    The browser is long-lived, Added and Updated services are processed only if their TXT record/addresses
+    (fingerprint) changed since they were last processed.  Removed services are forgotten (processed
+    again when they return).
+    '''
 
     def __init__(self, show=False):
         config.cloud = False  # mdns doesn't need to sync w cloud
@@ -31,20 +50,78 @@ class MDNS_Browser:
         self.debug = config.cfg.get('debug', False)
         self.show = show
         self.stop = False
-        self.discovered = []    # for display when running interactively, resets @ every restart
+        self.discovered = []    # for display when running interactively
         self.d_discovered = []  # used when running as daemon (doesn't reset)
         self.no_adapters = []  # If both mdns and API report no adapters for remote add to list to prevent subsequent API calls
         self.startup_logged = False
-        self.zc = Zeroconf()
+        self.aiozc: AsyncZeroconf = None
+        self.browser: AsyncServiceBrowser = None
+        self.queue: asyncio.Queue = None
+        self.queued: Set[str] = set()  # service names queued or being processed
+        self.active: Set[str] = set()  # service names being processed
+        self.requeue: Set[str] = set()  # service names discovered again while being processed
+        self.cache_lock: asyncio.Lock = None  # local cache updates are serialized
+        self.workers: List[asyncio.Task] = []
+        self.fingerprints: Dict[str, str] = {}  # service name: fingerprint of the TXT record/addresses last processed
 
     def on_service_state_change(self,
                                 zeroconf: Zeroconf, service_type: str, name: str, state_change: ServiceStateChange) -> None:
+        # Runs in zeroconf's event loop, must not block.  Discoveries are queued for the verification workers.
         if self.cpi.local.hostname == name.split(".")[0]:
             return
-        if state_change is not ServiceStateChange.Added:
+        if state_change is ServiceStateChange.Removed:
+            self.forget(name)
+        else:  # Added, Updated (processed only if the fingerprint changed)
+            self.enqueue(name)
+
+    def forget(self, name: str) -> None:
+        hostname = name.split(".")[0]
+        self.fingerprints.pop(name, None)
+        if hostname in self.no_adapters:
+            self.no_adapters.remove(hostname)
+        self.discovered = [h for h in self.discovered if h.rstrip('*') != hostname]
+        log.info(f'[MDNS DSCVRY] {hostname} is no longer advertised via mdns')
+
+    @staticmethod
+    def fingerprint(info: AsyncServiceInfo) -> str:
+        '''Hash of the services TXT record, addresses and port, changes only when what the remote advertises changes.'''
+        txt = sorted([(k, v or b'') for k, v in info.properties.items()])
+        return hashlib.sha1(repr((txt, sorted(info.parsed_addresses()), info.port)).encode()).hexdigest()
+
+    def enqueue(self, name: str) -> None:
+        if name in self.queued:
+            if name in self.active:
+                self.requeue.add(name)
+            log.debug(f'[MDNS DSCVRY] {name} already queued, coalesced')
             return
+        try:
+            self.queue.put_nowait(name)
+            self.queued.add(name)
+        except asyncio.QueueFull:
+            log.warning(f'[MDNS DSCVRY] Discovery queue full ({MAX_QUEUED}) {name} ignored')
 
-        info = zeroconf.get_service_info(service_type, name)
+    async def worker(self) -> None:
+        while True:
+            name = await self.queue.get()
+            self.active.add(name)
+            try:
+                await self.process(name)
+            except Exception as e:
+                log.exception(f'[MDNS DSCVRY] {e.__class__.__name__} occurred processing {name}:\n{e}')
+            finally:
+                self.active.discard(name)
+                self.queued.discard(name)
+                self.queue.task_done()
+            if name in self.requeue:
+                self.requeue.discard(name)
+                self.enqueue(name)
+
+    async def process(self, name: str) -> None:
+        if self.aiozc is None:  # browser is restarting, services are re-discovered after the restart
+            return
+        info = AsyncServiceInfo(SERVICE_TYPE, name)
+        if not await info.async_request(self.aiozc.zeroconf, INFO_TIMEOUT):
+            info = None
         if not info:
             log.warning(f'[MDNS DSCVRY] {name}: No info found')
             return
@@ -52,17 +129,18 @@ class MDNS_Browser:
             log.warning(f'[MDNS DSCVRY] {name}: No properties found')
             return
 
+        fingerprint = self.fingerprint(info)
+        if self.fingerprints.get(name) == fingerprint:
+            log.debug(f'[MDNS DSCVRY] {name} advertisement unchanged, ignored')
+            return
+
         properties = info.properties
 
         cpi = self.cpi
         mdns_data = None
         update_cache = False
         try:
-            mdns_data = {
-                k.decode('UTF-8'):
-                v.decode('UTF-8') if len(v) == 0 or not v.decode('UTF-8')[0] in ['[', '{'] else json.loads(v.decode('UTF-8'))  # NoQA
-                for k, v in properties.items()
-            }
+            mdns_data = decode_txt(properties)
         except Exception as e:
             log.exception(
                 f"[MDNS DSCVRY] {e.__class__.__name__} occured while parsing mdns_data:\n {mdns_data}\n"
@@ -95,22 +173,38 @@ class MDNS_Browser:
                 hostname, rem_ip if rem_ip is not None else '?'))
 
         from_mdns_adapters = mdns_data.get('adapters')
+        adapter_summary = mdns_data.pop('adapter_summary', None)  # compact TXT (adapter names only, details via API)
+        iface_revision = mdns_data.pop('iface_revision', None)
+        txt_revision = mdns_data.pop('revision', None)  # compact TXT, only a revision from the API (snapshot) is cached
+        cached = cpi.remotes.data.get(hostname, {})
         mdns_data['rem_ip'] = rem_ip
         mdns_data['adapters'] = from_mdns_adapters if from_mdns_adapters else cur_known_adapters
         mdns_data['source'] = 'mdns'
         mdns_data['upd_time'] = int(time.time())
         mdns_data = {hostname: mdns_data}
 
-        # update from API only if no adapter data exists either in cache or from mdns that triggered this
-        # adapter data is updated on menu_launch either way
-        if (not mdns_data[hostname]['adapters'] and hostname not in self.no_adapters) or \
-                hostname not in cpi.remotes.data:
-            log.info(f"[MDNS DSCVRY] {info.server.split('.')[0]} provided no adapter data Collecting via API")
+        if txt_revision:
+            # compact TXT, update from API only if the inventory or interface revision differs from the cache
+            verify = hostname not in cpi.remotes.data or txt_revision != cached.get('revision') \
+                or iface_revision != codec.interfaces_revision(cached.get('interfaces'))
+        else:
+            # update from API only if no adapter data exists either in cache or from mdns that triggered this
+            # adapter data is updated on menu_launch either way
+            verify = (not mdns_data[hostname]['adapters'] and hostname not in self.no_adapters) or hostname not in cpi.remotes.data
+
+        metrics.inc('consolepi_mdns_discovery_total', result='api' if verify else 'cached')
+        if not verify:
+            log.debug(f'[MDNS DSCVRY] {hostname} revision {txt_revision} matches cache, API not queried')
+        else:
+            log.info(f"[MDNS DSCVRY] {info.server.split('.')[0]} adapter data not provided or changed, Collecting via API")
             # TODO check this don't think needed had a hung process on one of my Pis added it to be safe
             try:
                 # TODO we are setting update time here so always result in a cache update with the restart timer
-                res = asyncio.run(cpi.remotes.api_reachable(hostname, mdns_data[hostname]))
-                update_cache = res.update
+                res = await self.verify_api(hostname, mdns_data[hostname])
+                if not res.reachable:
+                    fingerprint = None  # processed again on the next announcement
+                # revision is cached so subsequent discoveries of this remote don't query the API
+                update_cache = res.update or res.data.get('revision') != cached.get('revision')
                 if not res.data.get('adapters'):
                     self.no_adapters.append(hostname)
                 elif hostname in self.no_adapters:
@@ -118,6 +212,8 @@ class MDNS_Browser:
                 mdns_data[hostname] = res.data
             except Exception as e:
                 log.exception(f'Exception occurred verifying reachability via API for {hostname}:\n{e}')
+                fingerprint = None  # processed again on the next announcement
+        metrics.save()  # served by the API (/metrics)
 
         if self.show:
             if hostname in self.discovered:
@@ -128,6 +224,7 @@ class MDNS_Browser:
             try:
                 print(
                     '{}\n{}\n{}'.format(
+                        f'mdns: {adapter_summary}' if adapter_summary is not None else
                         'mdns: None' if from_mdns_adapters is None else 'mdns: {}'.format(
                             [d.replace('/dev/', '') for d in from_mdns_adapters]
                             if not isinstance(from_mdns_adapters, list) else
@@ -159,52 +256,83 @@ class MDNS_Browser:
         if update_cache:
             if 'hostname' in mdns_data[hostname]:
                 del mdns_data[hostname]['hostname']
-            cpi.remotes.data = cpi.remotes.update_local_cloud_file(remote_consoles=mdns_data)
+            async with self.cache_lock:  # file I/O is done in a thread, keeping the event loop (and zeroconf) free
+                cpi.remotes.data = await asyncio.to_thread(cpi.remotes.update_local_cloud_file, remote_consoles=mdns_data)
             log.info(f'[MDNS DSCVRY] {hostname} Local Cache Updated after mdns discovery')
 
-    def run(self):
-        self.zc = Zeroconf()
+        self.fingerprints[name] = fingerprint
+
+    async def verify_api(self, hostname: str, data: dict):
+        '''Verify remote and collect it's data via the API (Remotes.api_reachable).
+
+        The revision in the returned data is from the API (snapshot), it's dropped if the remote was not
+        reachable, so an unreachable remote is verified again when it's next announced.
+        '''
+        res = await self.cpi.remotes.api_reachable(hostname, data)
+        if not res.reachable:
+            res.data.pop('revision', None)
+        return res
+
+    async def start(self) -> None:
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=MAX_QUEUED)
+            self.cache_lock = asyncio.Lock()
+            self.workers = [asyncio.create_task(self.worker()) for _ in range(VERIFY_WORKERS)]
+        self.aiozc = AsyncZeroconf()
         if not self.startup_logged:
             log.info(f"[MDNS DSCVRY] Discovering ConsolePis via mdns - Debug Enabled: {self.debug}")
             self.startup_logged = True
-        return ServiceBrowser(self.zc, "_consolepi._tcp.local.", handlers=[self.on_service_state_change])  # NoQA pylint: disable=unused-variable
+        self.browser = AsyncServiceBrowser(self.aiozc.zeroconf, SERVICE_TYPE, handlers=[self.on_service_state_change])
+
+    async def close(self) -> None:
+        if self.browser is not None:
+            await self.browser.async_cancel()
+            self.browser = None
+        if self.aiozc is not None:
+            await self.aiozc.async_close()
+            self.aiozc = None
+
+    @property
+    def running(self) -> bool:
+        if self.aiozc is None or self.browser is None:
+            return False
+        return not getattr(self.aiozc.zeroconf, 'done', False) and not getattr(self.browser, 'done', False)
+
+    async def run(self) -> None:
+        '''Browse until cancelled.
+
+        The browser is only restarted if it fails (checked every HEALTH_INTERVAL seconds).  Fingerprints are
+        retained, so services re-discovered after a restart are not verified again unless they changed.
+        '''
+        delay = 5
+        try:
+            while True:
+                if not self.running:
+                    await self.close()
+                    try:
+                        await self.start()
+                        delay = 5
+                    except Exception as e:
+                        # Catch any errors, usually related to transient connectivity issues."
+                        log.warning(f'[MDNS BROWSE] caught {e.__class__.__name__} retrying in {delay} sec.\nException:\n{e}')
+                        await self.close()
+                        await asyncio.sleep(delay)
+                        delay = min(delay * 2, HEALTH_INTERVAL)
+                        continue
+                await asyncio.sleep(HEALTH_INTERVAL)
+        finally:
+            await self.close()
 
 
 if __name__ == '__main__':
     program_start = int(time.time())
     if len(sys.argv) > 1:
         mdns = MDNS_Browser(show=True)
-        RESTART_INTERVAL = 30  # when running in interactive mode reduce restart interval
         print("\nBrowsing services, press Ctrl-C to exit...\n")
     else:
         mdns = MDNS_Browser()
 
     try:
-        while True:
-            try:
-                browser = mdns.run()
-            except AttributeError:
-                # hopefully this handles "Zeroconf object has no attribute '_handlers_lock'"
-                log.warning('[MDNS BROWSE] caught _handlers_lock exception retrying in 5 sec')
-                time.sleep(5)
-                continue
-            except Exception as e:
-                # Catch any other errors, usually related to transient connectivity issues."
-                log.warning(f'[MDNS BROWSE] caught {e.__class__.__name__} retrying in 5 sec.\nException:\n{e}')
-                time.sleep(5)
-                continue
-            # re-init zeroconf browser every RESTART_INTERVAL seconds
-            start = time.time()
-            while time.time() < start + RESTART_INTERVAL:
-                time.sleep(start + RESTART_INTERVAL - time.time())
-            if mdns.zc is not None:
-                mdns.zc.close()
-
-            duration = f"{RESTART_INTERVAL / 60}m" if RESTART_INTERVAL > 60 else f"{RESTART_INTERVAL}s"
-            mdns.discovered = []
-
+        asyncio.run(mdns.run())
     except KeyboardInterrupt:
         pass
-    finally:
-        if mdns.zc is not None:
-            mdns.zc.close()
@@ -0,0 +1,126 @@
+#!/etc/ConsolePi/venv/bin/python3
+
+""" ConsolePi Power Broker
+
+Holds authenticated sessions and cached outlet state for all power controllers.
+Local processes (menu, api, remote_launcher) use the broker via a Unix socket
+rather than authenticating to every dli themselves.
+"""
+
+import grp
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import setproctitle
+
+sys.path.insert(0, '/etc/ConsolePi/src/pypkg')
+from consolepi import log, config  # type: ignore # NoQA
+from consolepi.power import Outlets  # type: ignore # NoQA
+from consolepi.power.broker import BROKER_SOCK  # type: ignore # NoQA
+
+REFRESH_INTERVAL = 300  # time in seconds between background refresh of all outlets
+
+setproctitle.setproctitle("consolepi-powerbroker")
+
+
+class PowerBrokerServer:
+    COMMANDS = ['ping', 'data', 'pwr_get_outlets', 'pwr_toggle', 'pwr_cycle', 'pwr_rename']
+
+    def __init__(self):
+        self.pwr = Outlets(use_broker=False, owner=True)
+        self._locks = defaultdict(threading.Lock)  # operations against the same controller are serialized
+        self._refresh_lock = threading.Lock()
+        self.wait_for_init()
+
+    def wait_for_init(self, timeout: int = 20):
+        start = time.perf_counter()
+        for t in threading.enumerate():
+            if t.name.startswith('init_pwr_'):
+                t.join(max(1, timeout - (time.perf_counter() - start)))
+        self.pwr.journal.flush()  # write the init results once
+        log.info(f'[PWR BROKER] outlets initialized, elapsed time: {round(time.perf_counter() - start, 2)}')
+
+    def refresh(self, upd_linked: bool = False):
+        with self._refresh_lock:
+            return self.pwr.pwr_get_outlets(upd_linked=upd_linked)
+
+    def dispatch(self, req: dict):
+        cmd = req.get('cmd')
+        args = req.get('args', [])
+        kwargs = req.get('kwargs', {})
+        if cmd not in self.COMMANDS:
+            raise ValueError(f'Invalid command {cmd}')
+
+        if cmd == 'ping':
+            return 'pong'
+        elif cmd == 'data':
+            return self.pwr.esphome_live_data()
+        elif cmd == 'pwr_get_outlets':
+            return self.refresh(upd_linked=kwargs.get('upd_linked', False))
+        else:
+            if cmd == 'pwr_rename' and not kwargs.get('name'):
+                raise ValueError('name is required for rename via power broker')
+            if kwargs.get('port') is not None and isinstance(kwargs['port'], str) and kwargs['port'].isdigit():
+                kwargs['port'] = int(kwargs['port'])
+            with self._locks[args[1]]:
+                return getattr(self.pwr, cmd)(*args, **kwargs)
+
+    def refresh_loop(self):
+        while True:
+            time.sleep(REFRESH_INTERVAL)
+            try:
+                self.refresh()
+            except Exception as e:
+                log.warning(f'[PWR BROKER] Exception during refresh {e.__class__.__name__}: {e}')
+
+
+class BrokerRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                resp = {'ok': True, 'result': self.server.broker.dispatch(json.loads(line))}
+            except Exception as e:
+                log.error(f'[PWR BROKER] {e.__class__.__name__}: {e}')
+                resp = {'ok': False, 'error': f'{e.__class__.__name__}: {e}'}
+            self.wfile.write((json.dumps(resp, default=str) + '\n').encode())
+
+
+class BrokerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+if __name__ == '__main__':
+    if not config.power or not config.outlets:
+        log.info('[PWR BROKER] Power function is not enabled or no outlets defined, exiting')
+        sys.exit(0)
+
+    sock = Path(config.static.get('POWER_BROKER_SOCK', BROKER_SOCK))
+    sock.parent.mkdir(parents=True, exist_ok=True)
+    if sock.exists():
+        sock.unlink()
+
+    broker = PowerBrokerServer()
+    server = BrokerServer(str(sock), BrokerRequestHandler)
+    server.broker = broker
+    try:
+        os.chown(sock, -1, grp.getgrnam('consolepi').gr_gid)
+        os.chmod(sock, 0o660)
+    except (KeyError, PermissionError) as e:
+        log.warning(f'[PWR BROKER] Unable to set permissions on {sock} {e.__class__.__name__}: {e}')
+
+    threading.Thread(target=broker.refresh_loop, name='pwr_broker_refresh', daemon=True).start()
+    log.info(f'[PWR BROKER] Listening on {sock}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        sock.unlink(missing_ok=True)
+        broker.pwr.dli_close_all()
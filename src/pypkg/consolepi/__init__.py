@@ -1,8 +1,12 @@
 #!/etc/ConsolePi/venv/bin/python3
 
+import atexit
 import json
 import logging
 import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
 import requests  # NoQA
 from consolepi.utils import Utils  # type: ignore # NoQA
 
@@ -56,6 +60,7 @@ class ConsolePiLog:
         self.log_file = log_file
         self._log = self.get_logger()
         self.name = self._log.name
+        self._listener = None
 
     def get_logger(self):
         '''Return custom log object.'''
@@ -68,6 +73,21 @@ class ConsolePiLog:
                             datefmt=dateStr)
         return logging.getLogger('ConsolePi')
 
+    def use_queue(self) -> None:
+        '''Hand log records to a background thread for writing, callers don't block on file I/O (used by the API).
+
+        Must be called in the process doing the logging (after any fork).
+        '''
+        root = logging.getLogger()
+        handlers = [h for h in root.handlers if not isinstance(h, QueueHandler)]
+        if not handlers:
+            return
+        _queue = queue.SimpleQueue()
+        self._listener = QueueListener(_queue, *handlers, respect_handler_level=True)
+        root.handlers = [QueueHandler(_queue)]
+        self._listener.start()
+        atexit.register(self._listener.stop)
+
     def log_print(self, msgs, log=False, show=True, level='info', *args, **kwargs):
         msgs = [msgs] if not isinstance(msgs, list) else msgs
         _msgs = []
@@ -131,12 +151,20 @@ class ConsolePiLog:
 utils = Utils()
 
 log = ConsolePiLog(LOG_FILE)
-
-from consolepi.config import Config  # type: ignore # NoQA
-
-config = Config()  # NoQA
-if config.debug:
-    log.setLevel(logging.DEBUG)
-
-if config.ovrd.get('verbose_debug'):
-    log.verbose = True
+_config_lock = threading.Lock()
+
+
+def __getattr__(name):
+    '''config is built on first use, so on-box tools that get their data from the API (remote_launcher) don't build it.'''
+    if name != 'config':
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    with _config_lock:
+        if 'config' not in globals():
+            from consolepi.config import Config  # type: ignore # NoQA
+            _config = Config()
+            if _config.debug:
+                log.setLevel(logging.DEBUG)
+            if _config.ovrd.get('verbose_debug'):
+                log.verbose = True
+            globals()['config'] = _config
+    return globals()['config']
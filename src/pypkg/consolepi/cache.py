@@ -0,0 +1,183 @@
+#!/etc/ConsolePi/venv/bin/python3
+
+import asyncio
+import fcntl
+import os
+import threading
+import time
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from consolepi import log, metrics, codec  # type: ignore
+
+REFRESH_AHEAD = 0.75  # fraction of ttl after which a hit triggers a background refresh
+
+
+class CacheEntry:
+    def __init__(self, key: str, func: Callable, ttl: float, refresh_ahead: float = REFRESH_AHEAD):
+        self.key = key
+        self.func = func
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.value: Any = None
+        self.loaded = False
+        self.updated: float = 0  # time.monotonic() of last refresh
+        self.expires: float = 0
+        self.generation = 0  # incremented on invalidate, refreshes started before an invalidate don't make the entry valid
+        self.version = 0  # incremented each time the value is updated
+        self.invalidated: float = 0  # time.time() of last invalidate (shared store entries written before this are stale)
+        self.future: asyncio.Future = None
+        self.stats: Dict[str, int] = {
+            'hits': 0, 'misses': 0, 'coalesced': 0, 'refreshes': 0, 'refresh_ahead': 0, 'invalidations': 0, 'errors': 0
+        }
+
+
+class RefreshCache:
+    '''Cache for data served by the API that is expensive to build (adapters, interfaces...).
+
+    Each resource is registered with the (blocking) function that builds it and a ttl.
+
+    - Refreshes run in the executor, never on the event loop.
+    - Requests are coalesced, concurrent requests for a resource that needs a refresh all await a single run.
+    - Refresh-ahead, a hit on an entry older than refresh_ahead * ttl returns the cached value and triggers a
+      background refresh, so frequently requested resources don't expire.
+    - invalidate() expires an entry (i.e. on udev events or config file changes), it's thread safe.
+    - If a refresh fails the last value is returned (if there is one).
+
+    Must be used from a single event loop (the API's).
+
+    If shared_dir is provided the cache is shared between processes (API workers).  Refreshed values are
+    written to shared_dir, refreshes are serialized across processes via flock, and a process that needs a
+    refresh uses the value written by another process if it was written after the value was needed.
+    '''
+
+    def __init__(self, executor: Executor = None, shared_dir: Path = None):
+        self.executor = executor
+        self.shared_dir = None if not shared_dir else Path(shared_dir)
+        self._entries: Dict[str, CacheEntry] = {}
+        self._lock = threading.Lock()
+        if self.shared_dir:
+            self.shared_dir.mkdir(parents=True, exist_ok=True)
+
+    def register(self, key: str, func: Callable, ttl: float, refresh_ahead: float = REFRESH_AHEAD) -> None:
+        self._entries[key] = CacheEntry(key, func, ttl, refresh_ahead=refresh_ahead)
+
+    async def get(self, key: str, refresh: bool = False) -> Any:
+        '''Return value for key, refreshing it first if it's expired (or refresh=True).'''
+        e = self._entries[key]
+        now = time.monotonic()
+        if refresh or not e.loaded or now >= e.expires:
+            e.stats['misses'] += 1
+            metrics.inc('consolepi_cache_requests_total', resource=key, result='miss')
+            if refresh and e.future is not None:  # refresh in flight may have started prior to the change prompting refresh
+                await asyncio.shield(e.future)
+            return await self._refresh(e, forced=refresh)
+
+        e.stats['hits'] += 1
+        metrics.inc('consolepi_cache_requests_total', resource=key, result='hit')
+        if e.future is None and e.refresh_ahead and now - e.updated >= e.ttl * e.refresh_ahead:
+            e.stats['refresh_ahead'] += 1
+            self._refresh(e)  # background, the future is retained by the entry until done
+
+        return e.value
+
+    def _shared_refresh(self, e: CacheEntry, newer_than: float) -> Any:
+        '''Refresh via the shared store (runs in the executor), only one process refreshes a key at a time.'''
+        data_file = self.shared_dir / f'{e.key}.data'
+        with (self.shared_dir / f'{e.key}.lock').open('a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    if data_file.stat().st_mtime > newer_than:
+                        return codec.loads(data_file.read_bytes())
+                except (OSError, ValueError):
+                    pass
+
+                value = e.func()
+                tmp = data_file.with_suffix(f'.{os.getpid()}.tmp')
+                tmp.write_bytes(codec.dumps(value))
+                tmp.replace(data_file)
+                return value
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _refresh(self, e: CacheEntry, forced: bool = False) -> asyncio.Future:
+        '''Start a refresh of the entry (or join the one in flight) returns awaitable with the value.'''
+        if e.future is not None:
+            e.stats['coalesced'] += 1
+            metrics.inc('consolepi_cache_requests_total', resource=e.key, result='coalesced')
+            return asyncio.shield(e.future)
+
+        e.stats['refreshes'] += 1
+        generation = e.generation
+        # value from another process is used if written after this, forced refresh needs a value written after now
+        newer_than = time.time() if forced else max(time.time() - e.ttl, e.invalidated)
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        e.future = fut
+
+        def done(f: asyncio.Future) -> None:
+            e.future = None
+            try:
+                if f.cancelled():  # i.e. executor shutdown with cancel_futures, waiters are still resolved
+                    raise RuntimeError('refresh was cancelled')
+                e.value = f.result()
+                e.loaded = True
+                e.version += 1
+                e.updated = time.monotonic()
+                with self._lock:
+                    # invalidated while refreshing, value is served but the next get refreshes again
+                    e.expires = 0 if generation != e.generation else e.updated + e.ttl
+                fut.set_result(e.value)
+            except BaseException as exc:  # fut is always resolved, anything else leaves requests awaiting it hanging
+                e.stats['errors'] += 1
+                metrics.inc('consolepi_cache_failures_total', resource=e.key)
+                log.error(f'[CACHE] refresh of {e.key} failed {exc.__class__.__name__}: {exc}')
+                if e.loaded:
+                    fut.set_result(e.value)
+                else:
+                    fut.set_exception(exc)
+
+        func = e.func if not self.shared_dir else lambda: self._shared_refresh(e, newer_than)
+        loop.run_in_executor(self.executor, func).add_done_callback(done)
+        # shield, a client disconnecting (cancelling it's request) doesn't cancel the refresh others await
+        return asyncio.shield(fut)
+
+    def prime(self, key: str, value: Any) -> None:
+        '''Set the value for key (i.e. data already built at startup), valid for the entries ttl.'''
+        e = self._entries[key]
+        e.value, e.loaded, e.updated = value, True, time.monotonic()
+        e.version += 1
+        e.expires = e.updated + e.ttl
+
+    def invalidate(self, *keys: str) -> None:
+        '''Expire entries (all entries if no keys provided), safe to call from any thread.'''
+        with self._lock:
+            for key in keys or list(self._entries.keys()):
+                e = self._entries.get(key)
+                if e:
+                    e.expires = 0
+                    e.invalidated = time.time()
+                    e.generation += 1
+                    e.stats['invalidations'] += 1
+        log.debug(f'[CACHE] invalidated {", ".join(keys) if keys else "all"}')
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        return {
+            k: {
+                **e.stats,
+                'age': None if not e.loaded else round(now - e.updated, 2),
+                'ttl': e.ttl,
+                'valid': e.loaded and now < e.expires,
+            } for k, e in self._entries.items()
+        }
+
+    def version(self, *keys: str) -> Tuple[int, ...]:
+        '''Return version of the value for each key (changes whenever any of the values are refreshed).'''
+        return tuple([self._entries[k].version for k in keys])
+
+    @property
+    def keys(self) -> List[str]:
+        return list(self._entries.keys())
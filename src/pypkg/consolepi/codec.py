@@ -0,0 +1,148 @@
+#!/etc/ConsolePi/venv/bin/python3
+
+import gzip
+import hashlib
+import json
+from typing import Any, Dict, List, Tuple, Union
+
+try:
+    import orjson
+except (ModuleNotFoundError, ImportError):
+    orjson = None
+
+try:
+    import msgpack
+except (ModuleNotFoundError, ImportError):
+    msgpack = None
+
+try:
+    import brotli
+except (ModuleNotFoundError, ImportError):
+    brotli = None
+
+JSON_TYPE = 'application/json'
+MSGPACK_TYPE = 'application/msgpack'
+MIN_COMPRESS_SIZE = 512  # bytes, smaller payloads are sent uncompressed
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # higher levels cost more cpu than they save in transfer on a Pi
+
+
+def dumps(data: Any) -> bytes:
+    '''Serialize data to json (orjson if available).'''
+    if orjson:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS, default=str)
+    return json.dumps(data, default=str).encode('utf-8')
+
+
+def loads(payload: bytes, content_type: str = JSON_TYPE) -> Any:
+    '''Deserialize payload based on content_type (msgpack or json).'''
+    if content_type and MSGPACK_TYPE in content_type:
+        if not msgpack:
+            raise ValueError(f'{MSGPACK_TYPE} payload received but msgpack is not installed')
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+    return orjson.loads(payload) if orjson else json.loads(payload)
+
+
+def revision(adapters: Dict[str, Any]) -> str:
+    '''Return inventory revision (hash) of adapters, changes when an adapter is added/removed or it's config/outlets change.
+
+    udev details are not included (time_since_init changes on every refresh).
+    '''
+    inventory = {a: {k: v for k, v in (adapters[a] or {}).items() if k != 'udev'} for a in adapters or {}}
+    return hashlib.sha1(json.dumps(inventory, sort_keys=True, default=str).encode('utf-8')).hexdigest()[0:12]
+
+
+def interfaces_revision(interfaces: Dict[str, Any]) -> str:
+    '''Return revision (hash) of the interface set (interface names and IPs), changes when an IP changes.'''
+    ifaces = {i: v['ip'] for i, v in (interfaces or {}).items() if not i.startswith('_') and isinstance(v, dict) and v.get('ip')}
+    return hashlib.sha1(json.dumps(ifaces, sort_keys=True).encode('utf-8')).hexdigest()[0:8]
+
+
+def _paths(paths: Union[str, List[str]], prefix: str = None) -> List[List[str]]:
+    if isinstance(paths, str):
+        paths = paths.split(',')
+    return [[*([] if not prefix else prefix.split('.')), *p.strip().split('.')] for p in paths or [] if p.strip()]
+
+
+def _include(data: Any, paths: List[List[str]]) -> Any:
+    if not isinstance(data, dict) or [p for p in paths if not p]:
+        return data
+    out = {}
+    for k, v in data.items():
+        sub = [p[1:] for p in paths if p[0] in ['*', str(k)]]
+        if sub:
+            out[k] = _include(v, sub)
+    return out
+
+
+def _exclude(data: Any, paths: List[List[str]]) -> Any:
+    if not isinstance(data, dict):
+        return data
+    out = {}
+    for k, v in data.items():
+        sub = [p[1:] for p in paths if p[0] in ['*', str(k)]]
+        if [p for p in sub if not p]:
+            continue
+        out[k] = v if not sub else _exclude(v, sub)
+    return out
+
+
+def project(data: Any, fields: Union[str, List[str]] = None, exclude: Union[str, List[str]] = None, prefix: str = None) -> Any:
+    '''Return copy of data limited to fields and/or without exclude.
+
+    params:
+        fields/exclude: comma separated str or list of dotted paths i.e. 'config,udev.devname'.  * matches any key
+        prefix: prepended to each path i.e. '*' applies the paths to each item in the dict (each adapter)
+
+    returns: data unchanged if neither fields or exclude are provided.
+    '''
+    if fields:
+        data = _include(data, _paths(fields, prefix))
+    if exclude:
+        data = _exclude(data, _paths(exclude, prefix))
+    return data
+
+
+def _accepts(header: str, value: str) -> bool:
+    '''Return True if value is listed in Accept/Accept-Encoding header (and not q=0).'''
+    for item in (header or '').lower().split(','):
+        parts = [p.strip() for p in item.split(';')]
+        if parts[0] == value:
+            return not [p for p in parts[1:] if p.replace(' ', '') in ['q=0', 'q=0.0']]
+    return False
+
+
+def encode(data: Any, accept: str = None, accept_encoding: str = None) -> Tuple[bytes, Dict[str, str]]:
+    '''Encode response body based on the requests Accept and Accept-Encoding headers.
+
+    msgpack is used if the client accepts it (and msgpack is available) otherwise json.
+    The body is compressed with brotli or gzip if accepted and the payload is at least MIN_COMPRESS_SIZE.
+
+    returns: tuple (body, dict of response headers)
+    '''
+    if msgpack and _accepts(accept, MSGPACK_TYPE):
+        body, content_type = msgpack.packb(data, use_bin_type=True, default=str), MSGPACK_TYPE
+    else:
+        body, content_type = dumps(data), JSON_TYPE
+
+    headers = {'content-type': content_type, 'vary': 'Accept, Accept-Encoding'}
+    if len(body) >= MIN_COMPRESS_SIZE:
+        if brotli and _accepts(accept_encoding, 'br'):
+            body = brotli.compress(body, quality=BROTLI_QUALITY)
+            headers['content-encoding'] = 'br'
+        elif _accepts(accept_encoding, 'gzip'):
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+            headers['content-encoding'] = 'gzip'
+
+    return body, headers
+
+
+def request_headers() -> Dict[str, str]:
+    '''Accept/Accept-Encoding headers for requests to other ConsolePis based on what's available locally.
+
+    Older ConsolePis ignore these and respond with uncompressed json, responses are decoded based on content-type.
+    '''
+    return {
+        'Accept': f'{MSGPACK_TYPE}, {JSON_TYPE};q=0.9, */*;q=0.1' if msgpack else '*/*',
+        'accept-encoding': f'gzip, deflate{", br" if brotli else ""}',
+    }
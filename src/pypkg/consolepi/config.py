@@ -1,13 +1,13 @@
 #!/etc/ConsolePi/venv/bin/python3
 from __future__ import annotations
 import os
-from typing import Any, Dict
+from typing import Any, Dict, List
 import yaml
 import json
 import shutil
 from pathlib import Path
 
-from consolepi import utils, log  # type: ignore
+from consolepi import utils, log, metrics  # type: ignore
 LOG_FILE = '/var/log/ConsolePi/consolepi.log'
 
 # overridable defaults (via OVERRIDES section of ConsolePi.yaml)
@@ -21,6 +21,12 @@ DEFAULT_DLI_TIMEOUT = 7
 DEFAULT_SO_TIMEOUT = 3  # smart outlets
 DEFAULT_CYCLE_TIME = 3
 DEFAULT_API_PORT = 5000
+DEFAULT_API_WORKERS = 1
+DEFAULT_MDNS_QUIET_TIME = 2  # seconds without adapter changes before mdns/cloud are updated
+DEFAULT_MDNS_MAX_DELAY = 10  # max seconds mdns/cloud updates are delayed by continuous adapter changes
+DEFAULT_POWER_STAGGER = 0  # seconds between powering on ports (power sequencing)
+DEFAULT_POWER_MAX_PARALLEL = 4  # max power controllers operated concurrently
+DEFAULT_GPIO_CHIP = '/dev/gpiochip0'
 
 
 class RemoteTimeout:
@@ -72,6 +78,7 @@ class Config():
             self.loc_user = os.getenv('SUDO_USER', os.getenv('USER'))
 
         self.linked_exists = False  # updated in get_outlets_from_file()
+        self.linked_index: Dict[str, List[Dict[str, Any]]] = {}  # updated in get_outlets_from_file()
         self.hosts = self.get_hosts()
         self.power = self.cfg.get('power', False)
         self.do_dli_menu = None  # updated in get_outlets_from_file()
@@ -161,7 +168,15 @@ class Config():
         self.dli_timeout = int(ovrd.get('dli_timeout', DEFAULT_DLI_TIMEOUT))
         self.so_timeout = int(ovrd.get('smartoutlet_timeout', DEFAULT_SO_TIMEOUT))
         self.cycle_time = int(ovrd.get('cycle_time', DEFAULT_CYCLE_TIME))
+        self.esphome_events = ovrd.get('esphome_events', True)
+        self.power_circuits = ovrd.get('power_circuits') or {}
+        self.power_stagger = float(ovrd.get('power_stagger', DEFAULT_POWER_STAGGER))
+        self.power_max_parallel = int(ovrd.get('power_max_parallel', DEFAULT_POWER_MAX_PARALLEL))
+        self.gpio_chip = str(ovrd.get('gpio_chip', DEFAULT_GPIO_CHIP))
         self.api_port = int(ovrd.get("api_port", DEFAULT_API_PORT))
+        self.api_workers = int(ovrd.get("api_workers", DEFAULT_API_WORKERS))
+        self.mdns_quiet_time = float(ovrd.get("mdns_quiet_time", DEFAULT_MDNS_QUIET_TIME))
+        self.mdns_max_delay = float(ovrd.get("mdns_max_delay", DEFAULT_MDNS_MAX_DELAY))
         self.hide_legend = ovrd.get("hide_legend", False)
         # Additional override settings not needed by the python files
         # ovpn_share:  Share VPN connection when wired_dhcp enabled with hotspot connected devices
@@ -176,6 +191,7 @@ class Config():
                 failures: failure to connect to any outlets will result in an entry here
                     outlet_name: failure description
         '''
+        self.linked_index = {}
         outlet_data = self.cfg_yml.get('POWER')
         if not outlet_data:  # fallback to legacy json config
             outlet_data = self.get_json_file(self.static.get('POWER_FILE'))
@@ -205,9 +221,20 @@ class Config():
                     elif _type == 'esphome':
                         _linked = utils.listify(outlet_data[k]['linked_devs'][dev])
                         _this = [f'{k}:{[p for p in _linked]}']
+                    elif _type == 'tasmota' and outlet_data[k].get('relays'):  # multi-relay tasmota
+                        _this = [f"{k}:{[int(p) for p in utils.listify(outlet_data[k]['linked_devs'][dev])]}"]
                     else:
                         _this = [k]
                     by_dev[dev] = _this if dev not in by_dev else by_dev[dev] + _this
+
+                    # structured linkage (used for auto power on) ports is None for single port outlets
+                    if _type == 'dli' or (_type == 'tasmota' and outlet_data[k].get('relays')):
+                        _ports = [int(p) for p in utils.listify(outlet_data[k]['linked_devs'][dev])]
+                    elif _type == 'esphome':
+                        _ports = utils.listify(outlet_data[k]['linked_devs'][dev])
+                    else:
+                        _ports = None
+                    self.linked_index[dev] = [*self.linked_index.get(dev, []), {'grp': k, 'type': _type, 'ports': _ports}]
             else:
                 outlet_data[k]['linked_devs'] = {}
 
@@ -326,6 +353,7 @@ class Config():
 
         return host_dict
 
+    @metrics.timed('consolepi_ser2net_parse_seconds')
     def get_ser2net(self):
         self.verify_ser2net_file()
         return self.get_ser2netv4() if self.ser2net_file.suffix in [".yaml", ".yml"] else self.get_ser2netv3()
@@ -6,9 +6,11 @@ import os
 import json
 import subprocess
 import shlex
+import sys
 from halo import Halo
 
 from consolepi import utils, log, config
+from consolepi.power.readiness import Readiness
 
 # TODO byobu to menu launch new sessions in new tab by default figure out best way to provide split options i.e. 11 split h 14 create new-window and launch 11 on top 14 on bottom
 # Command to launch menu in byobu: byobu new-session -n menu consolepi-menu
@@ -27,6 +29,10 @@ class ConsolePiExec:
         self.menu = menu
         self.pwr_init_complete = False
         self.autopwr_wait = False
+        self.autopwr_done = threading.Event()  # cleared while auto power-on is in progress
+        self.autopwr_done.set()
+        self.autopwr_at = None  # time.monotonic() linked outlets were powered on
+        self.readiness = Readiness()
         self.spin = Halo(spinner="dots")
 
     def exec_auto_pwron(self, pwr_key):
@@ -48,6 +54,7 @@ class ConsolePiExec:
                 f"\n{_dots}\n  {_msg}  \n{_dots}\n"  # TODO send to formatter in menu ... __init__
             )
             print(_msg)
+            self.autopwr_done.clear()
             threading.Thread(
                 target=self.auto_pwron_thread,
                 args=(pwr_key,),
@@ -72,103 +79,120 @@ class ConsolePiExec:
         Returns:
             No Return - Updates class attributes
         """
-        if self.wait_for_threads("init"):
-            return
+        try:
+            self._auto_pwron(pwr_key)
+        finally:
+            self.autopwr_done.set()
 
-        outlets = self.pwr.data
-        if "linked" not in outlets:
-            _msg = "Error linked key not found in outlet dict\nUnable to perform auto power on"
-            log.show(_msg, show=True)
+    def _auto_pwron(self, pwr_key):
+        if self.wait_for_threads("init"):
             return
 
-        if not outlets["linked"].get(pwr_key):
+        linked = config.linked_index.get(pwr_key)
+        if not linked:
             return
 
         # -- // Perform Auto Power On (if not already on) \\ --
-        for o in outlets["linked"][pwr_key]:
-            outlet = outlets["defined"].get(o.split(":")[0])
-            if outlet:
-                ports = [] if ":" not in o else json.loads(o.replace("'", '"').split(":")[1])
-                _addr = outlet["address"]
-            else:
+        # Collect the outlets/ports that need to be powered on, the PowerScheduler powers all of them concurrently
+        # (honoring depends_on, circuit inrush budgets, stagger), ports on the same controller are sent in a single request
+        outlets = self.pwr.data
+        targets = {}  # {outlet grp: [ports] or None for single port outlets}
+        for link in linked:
+            _grp, ports = link["grp"], link["ports"]
+            outlet = outlets["defined"].get(_grp)
+            if not outlet:
                 log.error(
-                    f"Skipping Auto Power On {pwr_key} for {o}. Unable to pull outlet details from defined outlets.",
+                    f"Skipping Auto Power On {pwr_key} for {_grp}. Unable to pull outlet details from defined outlets.",
                     show=True,
                 )
                 log.debugv(f"Outlet Dict:\n{json.dumps(outlets)}")
                 continue
+            _addr = outlet["address"]
 
-            # -- // DLI web power switch Auto Power On \\ --
-            #
-            # TODO combine all ports from same pwr_key and sent to pwr_toggle once
-            # TODO Update outlet if return is OK, then run refresh in the background to validate
-            # TODO Add class attribute to cpi_menu ~ cpi_menu.new_data = "power", "main", etc
-            #      Then in wait_for_input run loop to check for updates and re-display menu
-            # TODO power_menu and dli_menu wait_for_threads auto power ... check cpiexec.autopwr_wait first
-            #
-            if outlet["type"].lower() == "dli":
-                for p in ports:
-                    log.debug(
-                        f"[Auto PwrOn] Power ON {pwr_key} Linked Outlet {outlet['type']}:{_addr} p{p}"
-                    )
-
-                    if not outlet["is_on"][p][
-                        "state"
-                    ]:  # This is just checking what's in the dict not querying the DLI
-                        r = self.pwr.pwr_toggle(outlet["type"], _addr, desired_state=True, port=p)
-                        if isinstance(r, bool):
-                            if r:
-                                threading.Thread(
-                                    target=self.outlet_update,
-                                    kwargs={"refresh": True, "upd_linked": True},
-                                    name="auto_pwr_refresh_dli",
-                                ).start()
-                                self.autopwr_wait = True
-                        else:
-                            log.warning(
-                                f"{pwr_key} Error operating linked outlet @ {o}",
-                                show=True,
-                            )
-
-            # -- // esphome Auto Power On \\ --
-            elif outlet["type"].lower() == "esphome":
+            # -- // DLI, espHome, multi-relay tasmota: only ports that are not already on \\ --
+            if ports:
                 for p in ports:
                     log.debug(
                         f"[Auto PwrOn] Power ON {pwr_key} Linked Outlet {outlet['type']}:{_addr} p{p}"
                     )
-                    if not outlet["is_on"][p]["state"]:  # This is just checking what's in the dict
-                        r = self.pwr.pwr_toggle(outlet["type"], _addr, desired_state=True, port=p)
-                        if isinstance(r, bool):
-                            self.pwr.data["defined"][o.split(":")[0]]["is_on"][p]["state"] = r
-                        else:
-                            log.show(r)
-                            log.warning(
-                                f"{pwr_key} Error operating linked outlet @ {o}",
-                                show=True,
-                            )
-
-            # -- // GPIO & TASMOTA Auto Power On \\ --
+                    # state from the live state table (espHome event stream) if available, otherwise what's in the dict
+                    _state = None
+                    if outlet["type"].lower() == "esphome" and self.pwr.esp:
+                        _state = self.pwr.esp.get(_addr, p)
+                    if _state is None and isinstance(outlet.get("is_on"), dict):
+                        _state = outlet["is_on"].get(p, {}).get("state")
+                    if _state is not True and p not in targets.get(_grp, []):
+                        targets[_grp] = [*targets.get(_grp, []), p]
+
+            # -- // GPIO & TASMOTA \\ --
             else:
                 log.debug(f"[Auto PwrOn] Power ON {pwr_key} Linked Outlet {outlet['type']}:{_addr}")
-                r = self.pwr.pwr_toggle(
-                    outlet["type"],
-                    _addr,
-                    desired_state=True,
-                    noff=outlet.get("noff", True) if outlet["type"].upper() == "GPIO" else True,
+                targets[_grp] = None
+
+        if not targets:
+            return
+
+        # all linked outlets are powered concurrently (each controller is only operated once)
+        _start = time.monotonic()
+        timeline = self.pwr.scheduler.run(
+            {grp: outlets["defined"][grp] for grp in targets}, True, ports=targets, max_parallel=len(targets)
+        )
+        self.pwr.timeline = timeline
+        for t in timeline:
+            r = t["result"]
+            if isinstance(r, dict):
+                r = False if not r or [v for v in r.values() if v is not True] else True
+            if r is True:
+                self.autopwr_wait = True
+                self.autopwr_at = max(self.autopwr_at or 0, _start + t["end"])
+            else:
+                _ports = "" if t["ports"] is None else f" ports {t['ports']}"
+                log.warning(
+                    f"{pwr_key} Error operating linked outlet {t['outlet']}:{t['address']}{_ports}"
+                    f"{'' if isinstance(t['result'], (bool, dict)) else ': ' + str(t['result'])}",
+                    show=True,
                 )
-                if isinstance(r, int) and r > 1:  # return is an error
-                    r = False
-                else:  # return is bool which is what we expect
-                    if r:
-                        self.pwr.data["defined"][o]["state"] = r
-                        self.autopwr_wait = True
-                        # self.pwr.pwr_get_outlets(upd_linked=True)
-                    else:
-                        # self.config.log_and_show(f"Error operating linked outlet {o}:{outlet['address']}", log=log.warning)
-                        log.show(
-                            f"Error operating linked outlet {o}:{outlet['address']}",
-                            show=True,
-                        )
+
+    def wait_for_ready(self, pwr_key, cmd, timeout=20):
+        """Wait for auto power on to complete, and for the device to boot if linked outlets were powered on.
+
+        Called prior to connecting to a device with linked outlets.  The boot wait is opt-in per device
+        (boot_wait override).  Readiness is determined by watching the serial port for a boot complete
+        pattern (or for the output to go quiet), or probing the tcp port for hosts.
+
+        params:
+            pwr_key:str, The device (/dev/... or /host/...) being connected to.
+            cmd:str, The command used to connect to the device.
+            timeout:int, Max seconds to wait for auto power on to complete.
+        """
+        def _wait(spin_txt, function, *args, **kwargs):
+            if sys.stdin.isatty():
+                return utils.spinner(spin_txt, function, *args, **kwargs)
+            return function(*args, **kwargs)
+
+        if not self.autopwr_done.is_set():
+            _wait("Waiting for Auto Power Threads to Complete", self.autopwr_done.wait, timeout=timeout)
+
+        if not self.autopwr_wait:
+            return
+        self.autopwr_wait = False
+        if not self.readiness.enabled(pwr_key):
+            return
+
+        dev_pretty = pwr_key.replace("/dev/", "").replace("/host/", "")
+        _expected = self.readiness.expected(pwr_key)
+        _expected = "" if not _expected else f" (typically {_expected}s)"
+        try:
+            ready = _wait(
+                f"Waiting for {dev_pretty} to boot{_expected}, CTRL-C to Abort",
+                self.readiness.wait, pwr_key, cmd, powered_at=self.autopwr_at
+            )
+        except (KeyboardInterrupt, EOFError):
+            log.show(f"Wait for {dev_pretty} to boot Aborted")
+            return
+
+        if ready is False:
+            log.show(f"{dev_pretty} was powered on but did not indicate it was ready within {self.readiness.timeout}s")
 
     def exec_shell_cmd(self, cmd):
         """Determine if cmd is valid shell cmd and execute if so.
@@ -223,6 +247,8 @@ class ConsolePiExec:
                 if name == "init" and thread_type == "power":
                     if self.pwr and not self.pwr.data or not self.pwr.data.get("dli_power"):
                         self.pwr.dli_exists = False
+                    if self.pwr:
+                        self.pwr.journal.flush()  # write the init results once
                     self.pwr_init_complete = True
                 if do_log:
                     log.info(
@@ -264,12 +290,12 @@ class ConsolePiExec:
         if config.power:
             outlets = pwr.data if outlets is None else outlets
             if not self.pwr_init_complete or refresh:
+                # pwr_get_outlets commits the update to the state store (pwr.data)
                 _outlets = pwr.pwr_get_outlets(
                     outlet_data=outlets.get("defined", {}),
                     upd_linked=upd_linked,
                     failures=outlets.get("failures", {}),
                 )
-                pwr.data = _outlets
             else:
                 _outlets = outlets
 
@@ -371,6 +397,10 @@ class ConsolePiExec:
                         if config.power and "pwr_key" in menu_actions[ch]:
                             self.exec_auto_pwron(menu_actions[ch]["pwr_key"])
 
+                        # -- // Wait for device to boot if linked outlets were powered on \\ --
+                        if config.power and "pwr_key" in menu_actions[ch]:
+                            self.wait_for_ready(menu_actions[ch]["pwr_key"], menu_actions[ch]["cmd"])
+
                         # -- // Print pre-connect messsage if provided \\ --
                         if menu_actions[ch].get("pre_msg"):
                             print(menu_actions[ch]["pre_msg"])
@@ -388,44 +418,6 @@ class ConsolePiExec:
                             if "exec_kwargs" in menu_actions[ch]:
                                 c = menu_actions[ch]["cmd"]
                                 _error = utils.do_shell_cmd(c, **menu_actions[ch]["exec_kwargs"])
-                                if _error and self.autopwr_wait:
-                                    # TODO simplify this after moving to action object
-                                    _h = None
-                                    _method = "ssh -t" if "ssh" in c else "telnet"
-                                    if "ssh" in _method:
-                                        _h = c.split(f"{_method} ")[1].split(" -p")[0].split("@")[1]
-                                        _p = int(c.split("-p ")[1])
-                                    elif _method == "telnet":
-                                        c_list = c.split()
-                                        _h = c_list[-2]
-                                        _p = int(c_list[-1])
-
-                                    def wait_for_boot():
-                                        while True:
-                                            try:
-                                                if utils.is_reachable(_h, _p, silent=True):
-                                                    break
-                                                else:
-                                                    time.sleep(3)
-                                            except (KeyboardInterrupt, EOFError):
-                                                self.autopwr_wait = False
-                                                log.show("Connection Aborted")
-                                                break
-
-                                    if _h:
-                                        print(
-                                            "\nInitial Attempt Failed, but host is linked to an outlet that was"
-                                        )
-                                        print("off. Host may still be booting\n")
-                                        utils.spinner(
-                                            f"Waiting for {_h} to boot, CTRL-C to Abort",
-                                            wait_for_boot,
-                                        )
-                                        if self.autopwr_wait:
-                                            _error = utils.do_shell_cmd(
-                                                c, **menu_actions[ch]["exec_kwargs"]
-                                            )
-                                            self.autopwr_wait = False
                             else:
                                 c = shlex.split(menu_actions[ch]["cmd"])
                                 result = subprocess.run(c, stderr=subprocess.PIPE)
@@ -502,13 +494,9 @@ class ConsolePiExec:
                                                     name="pwr_toggle_refresh",
                                                 ).start()
                                                 if _grp in pwr.data["defined"]:
-                                                    pwr.data["defined"][_grp]["is_on"][_port][
-                                                        "state"
-                                                    ] = response
+                                                    pwr.update_outlet_state(_grp, {_port: response})
                                                 elif _port != "all":
-                                                    pwr.data["dli_power"][_addr][_port][
-                                                        "state"
-                                                    ] = response
+                                                    pwr.update_dli_state(_addr, [_port], response)
                                                 else:  # dli toggle all
                                                     for t in threading.enumerate():
                                                         if t.name == "pwr_toggle_refresh":
@@ -521,10 +509,9 @@ class ConsolePiExec:
                                                             # successfully sent.  In reality the ports
                                                             # may not be in the  state yet, but dli is working it.
                                                             # Update menu items to reflect end state
-                                                            for p in pwr.data["dli_power"][_addr]:
-                                                                pwr.data["dli_power"][_addr][p][
-                                                                    "state"
-                                                                ] = response
+                                                            pwr.update_dli_state(
+                                                                _addr, list(pwr.data["dli_power"][_addr].keys()), response
+                                                            )
                                                             break
                                                 self.spin.stop()
                                             # Cycle operation returns False if outlet is off, only valid on powered outlets
@@ -540,11 +527,9 @@ class ConsolePiExec:
                                                 == "pwr_rename"
                                             ):
                                                 if response:
-                                                    _name = pwr._dli[_addr].name(_port)
+                                                    _name = pwr.dli_port_name(_addr, _port)
                                                     if _grp in pwr.data.get("defined", {}):
-                                                        pwr.data["defined"][_grp]["is_on"][_port][
-                                                            "name"
-                                                        ] = _name
+                                                        pwr.update_outlet_state(_grp, {_port: _name}, key="name")
                                                     else:
                                                         threading.Thread(
                                                             target=self.outlet_update,
@@ -554,9 +539,8 @@ class ConsolePiExec:
                                                             },
                                                             name="pwr_rename_refresh",
                                                         ).start()
-                                                    pwr.data["dli_power"][_addr][_port][
-                                                        "name"
-                                                    ] = _name
+                                                    with pwr.state.update() as data:
+                                                        data["dli_power"][_addr][_port]["name"] = _name
                                         # --// str responses are errors append to error_msgs \\--
                                         # TODO refactor response to use new cpi.response(...)
                                         elif isinstance(response, str) and _port is not None:
@@ -586,15 +570,15 @@ class ConsolePiExec:
                                                         f"Error returned from dli {host_short} when "
                                                         f"attempting to {_action} port {_port}"
                                                     )
-                                    # --// EVAL responses for espHome outlets \\--
-                                    elif _type == "esphome":
+                                    # --// EVAL responses for espHome and multi-relay tasmota outlets \\--
+                                    elif _type == "esphome" or (
+                                        _type == "tasmota" and menu_actions[ch]["kwargs"].get("port") is not None
+                                    ):
                                         host_short = utils.get_host_short(_addr)
                                         _port = menu_actions[ch]["kwargs"]["port"]
                                         # --// Operations performed on ALL outlets \\--
                                         if isinstance(response, bool) and _port is not None:
-                                            pwr.data["defined"][_grp]["is_on"][_port][
-                                                "state"
-                                            ] = response
+                                            pwr.update_outlet_state(_grp, {_port: response})
                                             if (
                                                 menu_actions[ch]["function"].__name__ == "pwr_cycle"
                                                 and not response
@@ -617,9 +601,10 @@ class ConsolePiExec:
                                         if menu_actions[ch]["function"].__name__ == "pwr_toggle":
                                             if _grp in pwr.data.get("defined", {}):
                                                 if isinstance(response, bool):
-                                                    pwr.data["defined"][_grp]["is_on"] = response
+                                                    pwr.update_outlet_state(_grp, response)
                                                 else:
-                                                    pwr.data["defined"][_grp]["errors"] = response
+                                                    with pwr.state.update() as data:
+                                                        data["defined"][_grp]["errors"] = response
                                         elif (
                                             menu_actions[ch]["function"].__name__ == "pwr_cycle"
                                             and not response
@@ -669,6 +654,7 @@ class ConsolePiExec:
         _on_str = "{{green}}ON{{norm}}"
         _cycle_str = "{{red}}C{{green}}Y{{red}}C{{green}}L{{red}}E{{norm}}"
         _type = _addr = None
+        relay_port = False  # esphome and multi-relay tasmota
         to_state = kwargs.get("desired_state")
         if _func in ["pwr_toggle", "pwr_cycle", "pwr_rename"]:
             _type = args[0].lower()
@@ -679,7 +665,8 @@ class ConsolePiExec:
                 if not port == "all":
                     port_name = pwr.data["dli_power"][_addr][port]["name"]
                     to_state = not pwr.data["dli_power"][_addr][port]["state"]
-            elif _type == "esphome":
+            elif _type == "esphome" or (_type == "tasmota" and kwargs.get("port") is not None):  # multi-relay tasmota
+                relay_port = True
                 port = port_name = kwargs["port"]
                 if not port == "all":
                     to_state = not pwr.data["defined"][_grp]["is_on"][port]["state"]
@@ -720,7 +707,7 @@ class ConsolePiExec:
             elif not to_state:
                 if _type == "dli":
                     prompt = f"Power {_off_str} {host_short} Outlet {port}({port_name})"
-                elif _type == "esphome":
+                elif relay_port:
                     prompt = f"Power {_off_str} {host_short} Outlet {port}"
                 else:  # GPIO or TASMOTA
                     prompt = f"Power {_off_str} Outlet {_grp}({_type}:{_addr})"
@@ -764,7 +751,7 @@ class ConsolePiExec:
                 prompt = "Power {} ALL {} Outlets".format(_cycle_str, host_short)
             elif _type == "dli":
                 prompt = "Cycle Power on {} Outlet {}({})".format(host_short, port, port_name)
-            elif _type == "esphome":
+            elif relay_port:
                 _msg = f"{_grp}({host_short})" if _grp != host_short else f"{_grp}"
                 prompt = f"Cycle Power on {_msg} Outlet {port}"
             else:  # GPIO or TASMOTA
@@ -6,7 +6,7 @@ import netifaces as ni
 import os
 import time
 from pathlib import Path
-from consolepi import utils, log, config  # type: ignore
+from consolepi import utils, log, config, metrics  # type: ignore
 
 
 class Local():
@@ -44,6 +44,7 @@ class Local():
         }
         return local
 
+    @metrics.timed('consolepi_udev_scan_seconds')
     def detect_adapters(self, key=None):
         """Detect Locally Attached Adapters.
 
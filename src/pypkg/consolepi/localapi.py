@@ -0,0 +1,98 @@
+#!/etc/ConsolePi/venv/bin/python3
+
+import http.client
+import os
+import socket
+from typing import Any
+from urllib.parse import urlencode
+
+import yaml
+
+from consolepi import log, codec  # type: ignore
+
+STATIC_FILE = '/etc/ConsolePi/.static.yaml'
+API_SOCK = '/run/consolepi/api.sock'
+API_CONNECT_TIMEOUT = 0.5
+API_TIMEOUT = 10
+
+
+class LocalAPIUnavailable(Exception):
+    '''The API is not running or did not respond.'''
+    pass
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, sock_path: str, timeout: float = API_TIMEOUT):
+        super().__init__('localhost', timeout=timeout)
+        self.sock_path = sock_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(API_CONNECT_TIMEOUT)
+        self.sock.connect(self.sock_path)
+        self.sock.settimeout(self.timeout)
+
+
+def api_sock() -> str:
+    '''Return API_SOCK from .static.yaml, read directly as callers may not have built the Config.'''
+    try:
+        with open(STATIC_FILE) as f:
+            return (yaml.safe_load(f) or {}).get('API_SOCK', API_SOCK)
+    except (OSError, yaml.YAMLError):
+        return API_SOCK
+
+
+class LocalAPI:
+    '''Client for the local ConsolePi API (consolepi-api.py) via it's Unix socket.
+
+    On-box tools (consolepi-details, remote_launcher) get data the API already holds (adapters,
+    interfaces, details) from the API rather than building it themselves.  Callers fall back to
+    building the data locally if the API is not running (LocalAPIUnavailable).
+    '''
+
+    def __init__(self, sock: str = None, timeout: float = API_TIMEOUT):
+        self.sock = sock or api_sock()
+        self.timeout = timeout
+
+    def available(self) -> bool:
+        '''Return True if the API socket exists (the API is running).'''
+        return os.path.exists(self.sock)
+
+    def get(self, path: str, **params) -> Any:
+        '''Send GET request to the API and return the decoded response.
+
+        params:
+            path: path relative to /api/v1.0/ i.e. 'adapters'
+            params: query params i.e. fields='config'
+
+        Raises:
+            LocalAPIUnavailable: Unable to connect to the API or it returned an error.
+        '''
+        if not self.available():
+            raise LocalAPIUnavailable(f'{self.sock} not found')
+
+        url = f'/api/v1.0/{path.lstrip("/")}'
+        params = {k: v for k, v in params.items() if v is not None}
+        if params:
+            url = f'{url}?{urlencode(params)}'
+
+        conn = _UnixHTTPConnection(self.sock, timeout=self.timeout)
+        try:
+            conn.request('GET', url, headers={**codec.request_headers(), 'accept-encoding': 'identity'})
+            resp = conn.getresponse()
+            payload = resp.read()
+        except (OSError, http.client.HTTPException) as e:
+            raise LocalAPIUnavailable(f'{e.__class__.__name__}: {e}')
+        finally:
+            conn.close()
+
+        if resp.status != 200:
+            raise LocalAPIUnavailable(f'{url} returned {resp.status} {resp.reason}')
+
+        try:
+            data = codec.loads(payload, resp.getheader('content-type'))
+        except ValueError as e:
+            raise LocalAPIUnavailable(f'Invalid response from API {e}')
+
+        log.debug(f'[LOCAL API] {url} {len(payload)} bytes')
+        return data
@@ -0,0 +1,179 @@
+#!/etc/ConsolePi/venv/bin/python3
+
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from consolepi import codec, log  # type: ignore
+
+TXT_VERSION = '2'
+TXT_BUDGET = 1300  # max bytes for the TXT record (the announcement fits in a single packet on a 1500 MTU link)
+TXT_ENTRY_MAX = 255  # max bytes for each key=value entry (single length byte)
+
+# -- compact TXT keys --
+#   v: TXT format version          p: api port        r: inventory revision (codec.revision)
+#   n: number of adapters          a: adapter names   u: user                s: cpuserial
+#   h: interface set revision (codec.interfaces_revision)
+# Browsers compare r and h with what they have cached, and only query the API if either changed.
+# hostname, rem_ip and interfaces (ip only) keep their original keys, they are required by older ConsolePis.
+# The original api_port, user and cpuserial keys are also added (lowest priority, if they fit in the budget)
+# so older ConsolePis still get a non-default api port and the user.
+# Peers get the full adapter data via the API.
+
+
+class TxtBuilder:
+    '''Build TXT properties within TXT_BUDGET in a single pass, entries that don't fit are omitted.'''
+
+    def __init__(self, budget: int = TXT_BUDGET):
+        self.budget = budget
+        self.size = 0
+        self.properties: Dict[str, str] = {}
+
+    def room(self, key: str) -> int:
+        '''Max length of the value for key given the remaining budget.'''
+        overhead = 1 + len(key.encode()) + 1  # length byte + key + '='
+        return min(TXT_ENTRY_MAX + 1, self.budget - self.size) - overhead
+
+    def add(self, key: str, value: Any) -> bool:
+        value = str(value if value is not None else '')
+        if len(value.encode()) > self.room(key):
+            return False
+        self.properties[key] = value
+        self.size += 1 + len(key.encode()) + 1 + len(value.encode())
+        return True
+
+    def add_list(self, key: str, items: List[str], sep: str = ',') -> int:
+        '''Add as many items as fit.  returns: number of items added.'''
+        room, value, cnt = self.room(key), '', 0
+        for item in items:
+            _value = item if not value else f'{value}{sep}{item}'
+            if len(_value.encode()) > room:
+                break
+            value, cnt = _value, cnt + 1
+        if cnt:
+            self.add(key, value)
+        return cnt
+
+
+class Debouncer:
+    '''Trailing-edge debouncer, all debounced functions are run by a single scheduler thread.
+
+    A function triggered (by key) runs once quiet seconds after the last trigger, or max_delay seconds
+    after the first trigger if triggers keep arriving.
+    '''
+
+    def __init__(self, quiet: float, max_delay: float):
+        self.quiet = quiet
+        self.max_delay = max(quiet, max_delay)
+        self._pending: Dict[str, List[Any]] = {}  # key: [first trigger, last trigger, func]
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='mdns_debounce', daemon=True)
+        self._thread.start()
+
+    def trigger(self, key: str, func: Callable) -> None:
+        now = time.monotonic()
+        with self._cond:
+            if key in self._pending:
+                self._pending[key][1:] = [now, func]
+            else:
+                self._pending[key] = [now, now, func]
+            self._cond.notify()
+
+    def _due(self, key: str) -> float:
+        first, last, _ = self._pending[key]
+        return min(last + self.quiet, first + self.max_delay)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    due = {k: self._due(k) for k in self._pending}
+                    ready = [k for k in due if due[k] <= now]
+                    if ready:
+                        break
+                    self._cond.wait(None if not due else min(due.values()) - now)
+                funcs = [(k, self._pending.pop(k)[2]) for k in ready]
+
+            for key, func in funcs:
+                try:
+                    func()
+                except Exception as e:
+                    log.exception(f'[MDNS REG] {key} failed {e.__class__.__name__}: {e}')
+
+
+def encode_txt(local: Dict[str, Any], hostname: str) -> Dict[str, str]:
+    '''Return compact TXT properties for the local ConsolePi.
+
+    params:
+        local: details for this ConsolePi (the value of Local.data[hostname])
+        hostname: local hostname
+    '''
+    interfaces = local.get('interfaces', {})
+    adapters = local.get('adapters', {}) or {}
+    txt = TxtBuilder()
+    txt.add('hostname', hostname)
+    txt.add('rem_ip', interfaces.get('_ip_w_gw', ''))
+    txt.add('v', TXT_VERSION)
+    txt.add('p', local.get('api_port', 5000))
+    txt.add('r', codec.revision(adapters))
+    txt.add('h', codec.interfaces_revision(interfaces))
+    txt.add('n', len(adapters))
+    txt.add('u', local.get('user', ''))
+    txt.add('s', local.get('cpuserial', ''))
+
+    # interfaces (ip only) interface with the default gw first, as many as fit
+    _ifaces = sorted(
+        [i for i in interfaces if not i.startswith('_') and '.' not in i and isinstance(interfaces[i], dict) and interfaces[i].get('ip')],
+        key=lambda i: not interfaces[i].get('isgw')
+    )
+    room = txt.room('interfaces')
+    _iface_dict: Dict[str, Dict[str, str]] = {}
+    for i in _ifaces:
+        if len(json.dumps({**_iface_dict, i: {'ip': interfaces[i]['ip']}}, separators=(',', ':'))) > room:
+            break
+        _iface_dict[i] = {'ip': interfaces[i]['ip']}
+    if _iface_dict:
+        txt.add('interfaces', json.dumps(_iface_dict, separators=(',', ':')))
+
+    txt.add_list('a', [a.replace('/dev/', '') for a in adapters])
+
+    # keys used by older ConsolePis
+    txt.add('api_port', local.get('api_port', 5000))
+    txt.add('user', local.get('user', ''))
+    txt.add('cpuserial', local.get('cpuserial', ''))
+    return txt.properties
+
+
+def _decode(value: bytes) -> Any:
+    value = (value or b'').decode('UTF-8')
+    return value if not value or value[0] not in ['[', '{'] else json.loads(value)
+
+
+def decode_txt(properties: Dict[bytes, bytes]) -> Dict[str, Any]:
+    '''Return remote ConsolePi data from TXT properties (compact or the format used by older ConsolePis).
+
+    For compact TXT records adapters is None (retrieved via API), the adapter names advertised are in adapter_summary.
+    api_port, user and cpuserial are taken from the compact keys, falling back to the keys used by older ConsolePis.
+
+    Raises:
+        ValueError: if the properties can't be parsed.
+    '''
+    props = {k.decode('UTF-8'): _decode(v) for k, v in properties.items()}
+    if 'v' not in props:
+        return props
+
+    data = {
+        'hostname': props.get('hostname'),
+        'rem_ip': props.get('rem_ip') or None,
+        'interfaces': props.get('interfaces') or {},
+        'api_port': int(props.get('p') or props.get('api_port') or 5000),
+        'user': props.get('u') or props.get('user') or None,
+        'cpuserial': props.get('s') or props.get('cpuserial') or None,
+        'revision': props.get('r') or None,
+        'iface_revision': props.get('h') or None,
+        'adapters': None if str(props.get('n', '')) != '0' else {},
+        'adapter_summary': [] if not props.get('a') else props['a'].split(','),
+    }
+    return {k: v for k, v in data.items() if v is not None or k == 'adapters'}
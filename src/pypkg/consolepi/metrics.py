@@ -0,0 +1,213 @@
+#!/etc/ConsolePi/venv/bin/python3
+
+import atexit
+import fcntl
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+METRICS_DIR = Path('/dev/shm/consolepi-metrics')  # metrics from other ConsolePi processes (menu, mdns) served by the API
+ARCHIVE = 'exited'  # metrics from processes that have exited are merged into this file (so counters aren't lost)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+METRICS: Dict[str, Tuple[str, str]] = {
+    'consolepi_api_request_seconds': ('histogram', 'API request latency'),
+    'consolepi_remote_verify_seconds': ('histogram', 'Time to verify a remote ConsolePi via API'),
+    'consolepi_udev_scan_seconds': ('histogram', 'Time to scan udev for local adapters'),
+    'consolepi_ser2net_parse_seconds': ('histogram', 'Time to parse ser2net config'),
+    'consolepi_power_operation_seconds': ('histogram', 'Power controller operation latency'),
+    'consolepi_cache_requests_total': ('counter', 'API cache requests by result'),
+    'consolepi_cache_failures_total': ('counter', 'API cache refresh failures'),
+    'consolepi_mdns_discovery_total': ('counter', 'mdns discoveries processed by result (api: verified via API, cached: unchanged)'),
+}
+
+_lock = threading.Lock()
+_data: Dict[str, Dict[Tuple[Tuple[str, str], ...], Any]] = {}
+
+
+def _key(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted([(k, str(v)) for k, v in labels.items()]))
+
+
+def observe(name: str, value: float, **labels) -> None:
+    '''Record value in histogram name.'''
+    with _lock:
+        h = _data.setdefault(name, {}).setdefault(_key(labels), {'buckets': [0] * len(DEFAULT_BUCKETS), 'sum': 0, 'count': 0})
+        for idx, le in enumerate(DEFAULT_BUCKETS):
+            if value <= le:
+                h['buckets'][idx] += 1
+        h['sum'] += value
+        h['count'] += 1
+
+
+def inc(name: str, amount: float = 1, **labels) -> None:
+    '''Increment counter name.'''
+    with _lock:
+        _counter = _data.setdefault(name, {})
+        _counter[_key(labels)] = _counter.get(_key(labels), 0) + amount
+
+
+def timed(name: str, labels: Callable = None, flush: bool = False) -> Callable:
+    '''Decorator, record the duration of each call in histogram name.
+
+    params:
+        labels: optional function called with the decorated functions args returning dict of labels
+        flush: save metrics after each call (infrequent operations in short lived processes i.e. the menu)
+    '''
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start, **({} if not labels else labels(*args, **kwargs)))
+                if flush:
+                    save()
+        return wrapper
+    return decorator
+
+
+class timer:
+    '''Context manager, record the duration of the block in histogram name.'''
+    def __init__(self, name: str, **labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+
+
+def _dump(data: Dict[str, Dict[Tuple, Any]]) -> Dict[str, List]:
+    return {m: [[list(k), v] for k, v in series.items()] for m, series in data.items()}
+
+
+def save(name: str = None) -> None:
+    '''Save metrics for this process to METRICS_DIR (so they can be served by the API).
+
+    Each process saves to it's own file (<name>.<pid>.json), processes that exit are folded into ARCHIVE by render.
+    '''
+    name = name or Path(sys.argv[0]).stem
+    with _lock:
+        if not _data:
+            return
+        data = _dump(_data)
+    try:
+        METRICS_DIR.mkdir(mode=0o777, exist_ok=True)
+        tmp = METRICS_DIR / f'.{name}.{os.getpid()}.tmp'
+        tmp.write_text(json.dumps(data))
+        tmp.replace(METRICS_DIR / f'{name}.{os.getpid()}.json')
+    except OSError:
+        pass  # metrics are best effort
+
+
+atexit.register(save)
+
+
+def _pid(file: Path) -> int:
+    '''Return the pid a metrics file was saved by, None for ARCHIVE (or files saved by older versions).'''
+    pid = file.stem.rsplit('.', 1)[-1]
+    return None if not pid.isdigit() else int(pid)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def cleanup() -> None:
+    '''Merge metrics files saved by processes that have exited into ARCHIVE and remove them.'''
+    dead = [f for f in METRICS_DIR.glob('*.json') if _pid(f) and not _alive(_pid(f))]
+    if not dead:
+        return
+    archive = METRICS_DIR / f'{ARCHIVE}.json'
+    try:
+        with (METRICS_DIR / '.lock').open('w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)  # API workers may cleanup concurrently
+            merged: Dict[str, Dict[Tuple, Any]] = {}
+            if archive.is_file():
+                _merge(merged, json.loads(archive.read_text()))
+            dead = [f for f in dead if f.is_file()]
+            for f in dead:
+                try:
+                    _merge(merged, json.loads(f.read_text()))
+                except ValueError:
+                    pass
+            tmp = METRICS_DIR / f'.{ARCHIVE}.{os.getpid()}.tmp'
+            tmp.write_text(json.dumps(_dump(merged)))
+            tmp.replace(archive)
+            for f in dead:
+                f.unlink(missing_ok=True)
+    except (OSError, ValueError):
+        pass  # metrics are best effort
+
+
+def _merge(into: Dict[str, Dict[Tuple, Any]], data: Dict[str, List]) -> None:
+    for m, series in data.items():
+        for k, v in series:
+            k = tuple([tuple(i) for i in k])
+            cur = into.setdefault(m, {}).get(k)
+            if cur is None:
+                into[m][k] = v
+            elif isinstance(v, dict):
+                into[m][k] = {
+                    'buckets': [a + b for a, b in zip(cur['buckets'], v['buckets'])],
+                    'sum': cur['sum'] + v['sum'],
+                    'count': cur['count'] + v['count'],
+                }
+            else:
+                into[m][k] = cur + v
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(key: Tuple, **extra) -> str:
+    items = [*key, *[(k, str(v)) for k, v in extra.items()]]
+    return '' if not items else '{' + ','.join([f'{k}="{_escape(v)}"' for k, v in items]) + '}'
+
+
+def render(include_saved: bool = True) -> str:
+    '''Return metrics in Prometheus text exposition format.'''
+    with _lock:
+        merged = {m: dict(series) for m, series in _data.items()}
+    if include_saved and METRICS_DIR.is_dir():
+        cleanup()
+        for f in METRICS_DIR.glob('*.json'):
+            if _pid(f) == os.getpid():  # this process, already included
+                continue
+            try:
+                _merge(merged, json.loads(f.read_text()))
+            except (OSError, ValueError):
+                continue
+
+    lines = []
+    for m, (_type, _help) in METRICS.items():
+        lines += [f'# HELP {m} {_help}', f'# TYPE {m} {_type}']
+        for k, v in sorted(merged.get(m, {}).items()):
+            if _type == 'histogram':
+                for le, cnt in zip(DEFAULT_BUCKETS, v['buckets']):
+                    lines += [f'{m}_bucket{_labels(k, le=le)} {cnt}']
+                lines += [
+                    f'{m}_bucket{_labels(k, le="+Inf")} {v["count"]}',
+                    f'{m}_sum{_labels(k)} {round(v["sum"], 6)}',
+                    f'{m}_count{_labels(k)} {v["count"]}',
+                ]
+            else:
+                lines += [f'{m}{_labels(k)} {v}']
+    return '\n'.join(lines) + '\n'
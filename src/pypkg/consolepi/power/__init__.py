@@ -1,2 +1,8 @@
 from consolepi.power.dlirest import DLI  # NoQA
+from consolepi.power.esphome import ESPHomeEvents  # NoQA
+from consolepi.power.tasmota import Tasmota  # NoQA
+from consolepi.power.gpio import GpioOutlets  # NoQA
+from consolepi.power.journal import PowerJournal  # NoQA
+from consolepi.power.state import PowerState  # NoQA
+from consolepi.power.scheduler import PowerScheduler  # NoQA
 from consolepi.power.outlets import Outlets  # NoQA
@@ -0,0 +1,96 @@
+#!/etc/ConsolePi/venv/bin/python3
+
+import json
+import os
+import socket
+from typing import Any
+
+from consolepi import log, config  # type: ignore
+
+BROKER_SOCK = '/run/consolepi/power-broker.sock'
+BROKER_CONNECT_TIMEOUT = 0.5
+BROKER_TIMEOUT = 60  # operations are performed by the broker before responding (i.e. cycle)
+
+
+class PowerBrokerError(Exception):
+    '''Error returned by the power broker.'''
+    pass
+
+
+class PowerBrokerUnavailable(PowerBrokerError):
+    '''Power broker is not running or did not respond.'''
+    pass
+
+
+def restore_keys(data: Any) -> Any:
+    '''json keys are always str, restore int ports in outlet data (dli and multi-relay tasmota).
+
+    Only the port maps are converted, all other keys (outlet groups, linked devices, espHome relays) remain str.
+    '''
+    if not isinstance(data, dict):
+        return data
+
+    def _int_keys(ports: dict) -> dict:
+        return {int(k) if isinstance(k, str) and k.isdigit() else k: v for k, v in ports.items()}
+
+    for key in ['defined', 'failures']:
+        for v in [v for v in data.get(key, {}).values() if isinstance(v, dict)]:
+            if str(v.get('type', '')).lower() in ['dli', 'tasmota'] and isinstance(v.get('is_on'), dict):
+                v['is_on'] = _int_keys(v['is_on'])
+    if isinstance(data.get('dli_power'), dict):
+        data['dli_power'] = {k: _int_keys(v) if isinstance(v, dict) else v for k, v in data['dli_power'].items()}
+
+    return data
+
+
+class PowerBroker:
+    '''Client for the ConsolePi power broker daemon (power_broker.py).
+
+    The broker holds authenticated sessions and cached outlet state for all power controllers.
+    Requests/responses are single line json over a Unix socket:
+        request: {"cmd": str, "args": list, "kwargs": dict}
+        response: {"ok": bool, "result": Any} | {"ok": false, "error": str}
+    '''
+
+    def __init__(self, sock: str = None, timeout: float = BROKER_TIMEOUT):
+        self.sock = sock or config.static.get('POWER_BROKER_SOCK', BROKER_SOCK)
+        self.timeout = timeout
+
+    def available(self) -> bool:
+        '''Return True if the broker is running and responding.'''
+        if not os.path.exists(self.sock):
+            return False
+        try:
+            return self.request('ping') == 'pong'
+        except PowerBrokerError as e:
+            log.debug(f'[PWR BROKER] broker not available {e}')
+            return False
+
+    def request(self, cmd: str, *args, **kwargs) -> Any:
+        '''Send request to power broker and return the result.
+
+        Raises:
+            PowerBrokerUnavailable: Unable to connect to or communicate with the broker.
+            PowerBrokerError: The broker returned an error.
+        '''
+        payload = json.dumps({'cmd': cmd, 'args': args, 'kwargs': kwargs}, default=str) + '\n'
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.settimeout(BROKER_CONNECT_TIMEOUT)
+                s.connect(self.sock)
+                s.settimeout(self.timeout)
+                s.sendall(payload.encode())
+                with s.makefile('r') as f:
+                    line = f.readline()
+        except OSError as e:
+            raise PowerBrokerUnavailable(f'{e.__class__.__name__}: {e}')
+
+        try:
+            resp = json.loads(line)
+        except ValueError:
+            raise PowerBrokerUnavailable(f'Invalid response from power broker: {line[:80]}')
+
+        if not resp.get('ok'):
+            raise PowerBrokerError(resp.get('error', 'Unknown Error'))
+
+        return restore_keys(resp.get('result'))
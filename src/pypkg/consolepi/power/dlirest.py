@@ -12,6 +12,8 @@ from dlipower import PowerSwitch
 from requests.auth import HTTPDigestAuth
 from requests.models import ChunkedEncodingError
 
+from consolepi.power.resolver import CONNECT_TIMEOUT, resolver
+
 DLI_TIMEOUT = 7
 SEQUENCE_DELAY = 1
 DEBUG = False
@@ -42,10 +44,13 @@ class DLI:
         self.timeout = timeout
         self.log = log
         self.scheme = 'http://' if not use_https else 'https://'
-        self.reachable, self.ip = self.check_reachable(fqdn, 443 if self.scheme.split(':')[0] == 'https' else 80)
         self.fqdn = fqdn
-        self.base_url = self.scheme + str(self.ip)
-        self.outlet_url = self.base_url + '/restapi/relay/outlets/'
+        # no separate reachability probe, the first request (get_session) determines reachability
+        self.port = 443 if self.scheme.split(':')[0] == 'https' else 80
+        self.ip = resolver.resolve(fqdn, self.port)
+        self.reachable = self.ip is not None
+        if not self.reachable:
+            log.error('[DLI] {} is not reachable, unable to resolve'.format(fqdn))
         self.username = username
         self.password = password
         self.rest = None
@@ -53,6 +58,11 @@ class DLI:
             try:
                 self.dli = self.get_session(username, password)
                 self.outlets = self.get_dli_outlets()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                log.error('[DLI] {} is not reachable\n{}'.format(fqdn, e))
+                resolver.invalidate(fqdn)
+                self.reachable = False
+                self.dli = self.outlets = {}
             except ConnectionError:
                 log.warning(f"DLI @ {self.ip} ware reachable, but an exception occured while trying to establish a session")
                 self.dli = self.outlets = {}
@@ -110,27 +120,19 @@ class DLI:
 
         return ret_val
 
-    def check_reachable(self, host, port, timeout=2):
-        # if url is passed check dns first otherwise dns resolution failure causes longer delay
-        # determine if host is resolvable
-        try:
-            s = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
-            _ip = s[0][4][0]
-        except (socket.gaierror, socket.timeout, TimeoutError) as e:
-            self.log.error('[DLI] {} is not reachable\n{}'.format(host, e))
-            _ip = None
-            return False, _ip
-
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout)
-        try:
-            sock.connect((_ip, port))
-            reachable = True
-        except (socket.error, TimeoutError):
-            reachable = False
-        sock.close()
-
-        return reachable, _ip
+    @property
+    def base_url(self):
+        '''url for the dli, http urls use the cached ip (re-resolved after the cache entry is invalidated on connection failure).
+
+        https urls keep the fqdn, it's required for SNI, the Host header and certificate verification.
+        '''
+        if self.scheme == 'https://':
+            return self.scheme + self.fqdn
+        return self.scheme + resolver.netloc(self.fqdn, self.port)
+
+    @property
+    def outlet_url(self):
+        return self.base_url + '/restapi/relay/outlets/'
 
     def get_session(self, username: str, password: str, fqdn: str = None):
         '''Get or Renew a session with the dli from requests module.'''
@@ -144,12 +146,13 @@ class DLI:
         _session = requests.session()
         _session.auth = HTTPDigestAuth(username, password)
         _session.headers = headers
-        r = _session.get(f_url, headers=headers)
+        r = _session.get(f_url, headers=headers, timeout=(CONNECT_TIMEOUT, self.timeout))
         if TIMING:
             print('[TIMING] check api ({}): return: {}, {}'.format(fqdn, r.status_code, time.time() - start))  # type: ignore
         if r.headers['Content-Type'] != 'application/json':  # determine if old screen-scrape method is required for older dlis
             log.debug("[DLI] Using webui scraping method for {}, it doesn't appear to support the new rest API".format(fqdn))
             self.rest = False
+            self.ip = resolver.resolve(self.fqdn, self.port) or self.ip
             try:
                 switch = PowerSwitch(hostname=self.ip, userid=username, password=password, timeout=self.timeout)
             except (ConnectionError, ConnectionResetError, ChunkedEncodingError) as e:
@@ -213,10 +216,11 @@ class DLI:
             # New dli API takes about 5 seconds to retrieve the outlet data
             timeout = self.timeout + 3 if self.timeout < 6 else self.timeout
             try:
-                r = self.dli.get(self.outlet_url, timeout=timeout)
+                r = self.dli.get(self.outlet_url, timeout=(CONNECT_TIMEOUT, timeout))
                 # outlet_list = json.loads(r.content.decode('UTF-8'))
                 outlet_list = r.json()
             except (socket.error, TimeoutError):
+                resolver.invalidate(self.fqdn)
                 self.reachable = False
                 self.dli = self.outlets = {}
             idx = 1
@@ -232,7 +236,8 @@ class DLI:
                         log.error(f"dli returned error {outlet_list['error']}")
                         # TODO return class with error for menu
         else:
-            self.reachable = self.check_reachable(self.fqdn, port=443 if 'https' in self.scheme else 80)[0]
+            # no separate reachability probe, an unreachable dli results in no outlet_list
+            self.reachable = bool(self.dli)
             if self.reachable:
                 # retry = 0
                 for retry in range(0, 1):
@@ -244,13 +249,17 @@ class DLI:
                     except AttributeError as e:
                         log.error(f'dlirest.py, get_dli_outlets exceptions occurred attempting to get outlet_list: {e}')
                         continue
+                    except (socket.error, TimeoutError) as e:
+                        log.error(f'[DLI GET OUTLETS] dli @ {self.fqdn} appears to be unreachable: {e}')
+                        resolver.invalidate(self.fqdn)
+                        break
                     if outlet_list:  # can be None if dli suffers transient issue
                         for outlet in outlet_list:
                             outlet_dict[outlet[0]] = {'name': outlet[1], 'state': True if outlet[2].upper() == 'ON' else False}
                         break
                     # retry += 1
                 if not outlet_list:
-                    log.error(f'[DLI GET OUTLETS] dli @ {self.fqdn} reachable, but failed to fetch statuslist (outlet_list)')
+                    log.error(f'[DLI GET OUTLETS] dli @ {self.fqdn} failed to fetch statuslist (outlet_list)')
                     self.reachable = False
                     self.dli = self.outlets = {}  # TODO maybe update outlets in defined... see error in exec
             else:
@@ -272,6 +281,16 @@ class DLI:
             'OFF': False
         }
 
+        # --// multiple ports are sent to the dli in a single request \\--
+        if isinstance(port, list):
+            if func == 'cycle':
+                return self.cycle_ports(port)
+            elif toState is None:
+                raise Exception('desired state required when port type is not int')
+            elif isinstance(toState, str):
+                toState = bool_state.get(toState.upper(), toState)
+            return self.operate_ports(port, toState)
+
         if not self.rest:
             self.verify_legacy()
 
@@ -419,6 +438,106 @@ class DLI:
         else:
             return 'An Error occurred {}'.format(ret_val)
 
+    def _matrix_url(self, ports: list, func: str = 'state'):
+        '''Build rest API url using a matrix selector to target multiple outlets in a single request.
+
+        i.e. ports [1, 2, 5] --> http://<dli>/restapi/relay/outlets/=0,1,4/state/
+        '''
+        return '{}={}/{}/'.format(self.outlet_url, ','.join([str(int(p) - 1) for p in ports]), func)
+
+    def operate_ports(self, ports: list, toState: bool):
+        '''Power On/Off multiple ports on the dli with a single request.
+
+        rest capable dlis use a matrix selector so all ports are operated on in one PUT.
+        legacy (screen-scrape) dlis lack a bulk option, each port is toggled in turn.
+
+        parameters:
+            ports: list of ports (dli outlet numbering starting with 1)
+            toState: bool desired state (True = ON)
+
+        returns:
+            bool representing the resulting state of the ports, or str with error text.
+        '''
+        log = self.log
+        ports = sorted(set([int(p) for p in ports]))
+        if not ports:
+            return toState
+
+        bad_ports = [p for p in ports if p not in self.outlets]
+        if bad_ports:
+            return f'[DLI] {self.fqdn} invalid port(s) {bad_ports} provided in port list: {ports}'
+
+        if TIMING:
+            start = time.time()
+
+        if self.rest:
+            headers = {'Content-Type': 'application/json', 'X-Requested-With': 'XMLHttpRequest'}
+            f_url = self._matrix_url(ports)
+            try:
+                r = self.dli.put(f_url, data=json.dumps(toState), headers=headers, timeout=10)
+            except (Exception, OSError) as e:
+                log.error(f'EXCEPTION: Unable to Connect {self.base_url} to toggle ports {ports}:\n\t{e}')
+                return f'[DLI] {self.fqdn} Unable to Connect to toggle ports {ports}'
+
+            if r.status_code > 207:
+                log.warning(f'[DLI] {self.fqdn} returned error response to bulk toggle request {r.status_code}, {r.reason}')
+                ret = f'[DLI] {self.fqdn} returned error {r.status_code} toggling ports {ports}'
+            else:
+                ret = toState
+        else:
+            self.verify_legacy()
+            errors = []
+            for p in ports:
+                r = self.dli.on(p) if toState else self.dli.off(p)
+                if r:  # dlipower.PowerSwitch returns False if operation Success
+                    errors.append(p)
+            ret = toState if not errors else f'[DLI] {self.fqdn} Port(s) {errors} dlipower library gave an unexpected response'
+
+        if isinstance(ret, bool):
+            for p in ports:
+                self.outlets[p]['state'] = ret
+
+        if TIMING:
+            print('[TIMING {}] {} bulk toggle {}: {}'.format('rest' if self.rest else 'webui',
+                                                             self.fqdn, ports, time.time() - start))  # type: ignore
+        log.debug(f'[DLI] {self.fqdn} bulk toggle {ports} --> {self.pretty.get(ret, ret)}')
+        return ret
+
+    def cycle_ports(self, ports: list):
+        '''Power Cycle multiple ports on the dli with a single request.
+
+        Only ports currently in the ON state (based on outlet data already collected) are cycled.
+
+        parameters:
+            ports: list of ports (dli outlet numbering starting with 1)
+
+        returns:
+            bool, True if the ports that were on were cycled, False if all of the ports were off
+                (cycle is not valid on ports that are off), or str with error text.
+        '''
+        log = self.log
+        ports = sorted(set([int(p) for p in ports]))
+        on_ports = [p for p in ports if self.outlets.get(p, {}).get('state')]
+        if not on_ports:
+            return False  # a False response from cycle indicates port(s) were already off nothing occurred
+
+        if self.rest:
+            headers = {'X-Requested-With': 'XMLHttpRequest'}
+            try:
+                r = self.dli.post(self._matrix_url(on_ports, func='cycle'), data=None, headers=headers, timeout=10)
+            except (Exception, OSError) as e:
+                log.error(f'EXCEPTION: Unable to Connect {self.base_url} to cycle ports {on_ports}:\n\t{e}')
+                return f'[DLI] {self.fqdn} Unable to Connect to cycle ports {on_ports}'
+
+            if r.status_code > 207:
+                log.warning(f'[DLI] {self.fqdn} returned error response to bulk cycle request {r.status_code}, {r.reason}')
+                return f'[DLI] {self.fqdn} returned error {r.status_code} cycling ports {on_ports}'
+            return True
+        else:
+            self.verify_legacy()
+            errors = [p for p in on_ports if self.dli.cycle(p)]  # dlipower returns False on success
+            return True if not errors else f'[DLI] {self.fqdn} Port(s) {errors} dlipower library gave an unexpected response'
+
     def verify_legacy(self):
         '''Verify session is not expired for non-rest dli
 
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Union
+
+import requests
+
+from consolepi.power.resolver import CONNECT_TIMEOUT, resolver
+
+ESP_TIMEOUT = 3
+READ_TIMEOUT = 60  # espHome sends a ping event periodically, if nothing is received in this time the stream is restarted
+RETRY_INTERVAL = 10
+
+
+class ESPHomeEvents:
+    '''Maintain a live state table for espHome relays.
+
+    espHome's web_server exposes an /events (Server Sent Events) stream.  On connect the device sends the
+    current state of every entity, then sends a state event any time an entity changes.  A listener thread
+    is started for each device (address), which keeps self.states current.
+
+    states: {
+        address:str {
+            relay_id:str {
+                'name': name:str,
+                'state': state:bool, (True = On)
+                'updated': epoch:float
+            }
+        }
+    }
+    '''
+
+    def __init__(self, timeout: int = ESP_TIMEOUT, log=logging.getLogger(__name__)):
+        self.timeout = timeout
+        self.log = log
+        self.states: Dict[str, Dict[str, Any]] = {}
+        self.connected: Dict[str, bool] = {}
+        self._ready: Dict[str, threading.Event] = {}
+        self._tried: Dict[str, threading.Event] = {}  # set once the first connection attempt completes
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def subscribe(self, address: str) -> None:
+        '''Start the listener thread for an espHome device if not already running.'''
+        with self._lock:
+            if address in self._ready:
+                return
+            self._ready[address] = threading.Event()
+            self._tried[address] = threading.Event()
+            self.states[address] = {}
+            self.connected[address] = False
+        threading.Thread(target=self._listen, args=(address,), name=f'esphome_events_{address}', daemon=True).start()
+
+    def _listen(self, address: str) -> None:
+        headers = {'Accept': 'text/event-stream', 'Cache-Control': 'no-cache'}
+        while not self._stop.is_set():
+            url = f'http://{resolver.netloc(address)}/events'
+            try:
+                with requests.get(url, headers=headers, stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)) as r:
+                    if r.status_code != 200:
+                        raise requests.exceptions.RequestException(f'[{r.status_code}] error returned {r.reason}')
+                    self.connected[address] = True
+                    self._tried[address].set()
+                    self.log.debug(f'[ESP EVENTS] {address} event stream connected')
+                    event = None
+                    for line in r.iter_lines(decode_unicode=True):
+                        if self._stop.is_set():
+                            break
+                        if not line:
+                            event = None
+                        elif line.startswith('event:'):
+                            event = line.split(':', 1)[1].strip()
+                        elif line.startswith('data:') and event == 'state':
+                            self._update(address, line.split(':', 1)[1].strip())
+            except (requests.exceptions.RequestException, ValueError) as e:
+                self.log.debug(f'[ESP EVENTS] {address} event stream {e.__class__.__name__}: {e}')
+                if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+                    resolver.invalidate(address)
+
+            self.connected[address] = False
+            self._tried[address].set()
+            self._ready[address].set()  # wake any waiters
+            if not self._stop.is_set():
+                self._stop.wait(RETRY_INTERVAL)
+
+    def _update(self, address: str, data: str) -> None:
+        try:
+            data = json.loads(data)
+        except ValueError:
+            self.log.debug(f'[ESP EVENTS] {address} unable to parse state event {data}')
+            return
+
+        if not isinstance(data, dict) or not data.get('id', '').startswith('switch-'):
+            return
+
+        relay = data['id'].replace('switch-', '', 1)
+        state = data.get('value')
+        if not isinstance(state, bool):
+            state = True if str(data.get('state', '')).upper() == 'ON' else False
+        self.set(address, relay, state, name=data.get('name'))
+        self._ready[address].set()
+
+    def set(self, address: str, relay: Union[str, int], state: bool, name: str = None) -> None:
+        '''Update state table for a relay (called by listener, or after a successful command).'''
+        with self._lock:
+            if address not in self.states:
+                return
+            relay = str(relay)
+            self.states[address][relay] = {
+                'name': name or self.states[address].get(relay, {}).get('name', relay),
+                'state': state,
+                'updated': time.time()
+            }
+
+    def get(self, address: str, relay: Union[str, int]) -> Union[bool, None]:
+        '''Return current state of relay from state table, None if the state is not known.
+
+        State is only trusted if the event stream for the device is connected.
+        '''
+        if not self.connected.get(address):
+            return None
+        return self.states.get(address, {}).get(str(relay), {}).get('state')
+
+    def wait(self, address: str, relays: List[Union[str, int]], timeout: float = None) -> Dict[str, bool]:
+        '''Wait (up to timeout) for the event stream to provide state for relays.
+
+        Returns immediately if the event stream could not be established.
+
+        returns: dict {relay: state} for any relays with known state.
+        '''
+        timeout = self.timeout if timeout is None else timeout
+        if address not in self._ready:
+            self.subscribe(address)
+        start = time.perf_counter()
+        ret = {}
+        while True:
+            ret = {r: self.get(address, r) for r in relays if self.get(address, r) is not None}
+            remaining = timeout - (time.perf_counter() - start)
+            failed = self._tried[address].is_set() and not self.connected[address]
+            if len(ret) == len(relays) or remaining <= 0 or failed:
+                return ret
+            self._ready[address].clear()
+            self._ready[address].wait(min(remaining, 0.25))
+
+    def stop(self) -> None:
+        self._stop.set()
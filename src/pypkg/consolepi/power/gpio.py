@@ -0,0 +1,256 @@
+#!/etc/ConsolePi/venv/bin/python3
+
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, List, Union
+
+try:
+    import gpiod
+except (ModuleNotFoundError, ImportError):
+    gpiod = None
+
+try:
+    import RPi.GPIO as GPIO
+    is_rpi = True
+except (RuntimeError, ModuleNotFoundError, ImportError):
+    is_rpi = False
+
+from consolepi import log, config  # type: ignore
+
+GPIO_CONSUMER = 'consolepi'
+# consumer label identifies the process holding the lines (i.e. consolepi-power_broker[812])
+GPIO_CONSUMER_LABEL = f'{GPIO_CONSUMER}-{Path(sys.argv[0]).stem}[{os.getpid()}]'[-31:]
+
+
+class MockChip:
+    '''Pure python gpio chip, used when testing off-Pi (gpio_chip: mock).
+
+    Tracks line values, requests, and the number of get/set calls (each call would be a single
+    syscall on a real chip).
+    '''
+
+    name = 'mock'
+
+    def __init__(self, values: Dict[int, int] = None):
+        self.values: Dict[int, int] = values or {}
+        self.lines: List[int] = []
+        self.gets = self.sets = 0
+
+    def request(self, lines: List[int]) -> None:
+        self.lines = sorted(set([*self.lines, *lines]))
+        for line in lines:
+            self.values[line] = self.values.get(line, 0)
+
+    def get_values(self, lines: List[int]) -> Dict[int, int]:
+        self.gets += 1
+        return {line: self.values[line] for line in lines}
+
+    def set_values(self, values: Dict[int, int]) -> None:
+        self.sets += 1
+        self.values = {**self.values, **values}
+
+    def release(self) -> None:
+        self.lines = []
+
+    def holder(self, lines: List[int]) -> str:
+        return ''
+
+
+class GpiodChip:
+    '''gpio character device (libgpiod), supports both the v2 and v1 python bindings.
+
+    Lines are requested as-is and read before being configured as outputs, so relays retain
+    their current state.  All lines are read or written in a single request.
+    '''
+
+    def __init__(self, chip: str):
+        self.name = chip
+        self.lines: List[int] = []
+        self._req = None
+        self._v2 = hasattr(gpiod, 'request_lines')
+
+    def request(self, lines: List[int]) -> None:
+        lines = sorted(set([*self.lines, *lines]))
+        if lines == self.lines and self._req:
+            return
+        cur = self.get_values(self.lines) if self._req else {}
+        self.release()
+
+        if self._v2:
+            from gpiod.line import Direction, Value
+            # request as-is to read current levels, then switch to output without changing them
+            self._req = gpiod.request_lines(self.name, consumer=GPIO_CONSUMER_LABEL, config={tuple(lines): gpiod.LineSettings()})
+            cur = {**{line: int(v == Value.ACTIVE) for line, v in zip(lines, self._req.get_values(lines))}, **cur}
+            self._req.reconfigure_lines(
+                {line: gpiod.LineSettings(direction=Direction.OUTPUT, output_value=Value(cur[line])) for line in lines}
+            )
+        else:
+            _chip = gpiod.Chip(self.name)
+            _lines = _chip.get_lines(lines)
+            _lines.request(consumer=GPIO_CONSUMER_LABEL, type=gpiod.LINE_REQ_DIR_AS_IS)
+            cur = {**dict(zip(lines, _lines.get_values())), **cur}
+            _lines.release()
+            _lines.request(consumer=GPIO_CONSUMER_LABEL, type=gpiod.LINE_REQ_DIR_OUT, default_vals=[cur[line] for line in lines])
+            self._req = _lines
+        self.lines = lines
+
+    def get_values(self, lines: List[int]) -> Dict[int, int]:
+        if self._v2:
+            return {line: int(v.value) for line, v in zip(lines, self._req.get_values(lines))}
+        values = dict(zip(self.lines, self._req.get_values()))
+        return {line: values[line] for line in lines}
+
+    def set_values(self, values: Dict[int, int]) -> None:
+        if self._v2:
+            from gpiod.line import Value
+            self._req.set_values({line: Value(v) for line, v in values.items()})
+        else:
+            cur = dict(zip(self.lines, self._req.get_values()))
+            self._req.set_values([values.get(line, cur[line]) for line in self.lines])
+
+    def release(self) -> None:
+        if self._req:
+            self._req.release()
+            self._req = None
+        self.lines = []
+
+    def holder(self, lines: List[int]) -> str:
+        '''Return the consumer(s) holding any of lines (used to log who has the lines when they are busy).'''
+        try:
+            if self._v2:
+                with gpiod.Chip(self.name) as chip:
+                    consumers = [chip.get_line_info(line).consumer for line in lines]
+            else:
+                chip = gpiod.Chip(self.name)
+                consumers = [chip.get_line(line).consumer() for line in lines]
+        except (OSError, ValueError) as e:
+            return f'unknown ({e})'
+        return ', '.join(sorted(set([c for c in consumers if c]))) or 'unknown'
+
+
+class RPiGPIOChip:
+    '''Fallback to RPi.GPIO when libgpiod is not available.  Each line is a separate call.'''
+
+    name = 'RPi.GPIO'
+
+    def __init__(self):
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setwarnings(False)
+        self.lines: List[int] = []
+
+    def request(self, lines: List[int]) -> None:
+        for line in [line for line in lines if line not in self.lines]:
+            GPIO.setup(line, GPIO.OUT)
+            self.lines.append(line)
+
+    def get_values(self, lines: List[int]) -> Dict[int, int]:
+        return {line: int(GPIO.input(line)) for line in lines}
+
+    def set_values(self, values: Dict[int, int]) -> None:
+        for line, v in values.items():
+            GPIO.output(line, v)
+
+    def release(self) -> None:
+        self.lines = []
+
+    def holder(self, lines: List[int]) -> str:
+        return ''
+
+
+class GpioOutlets:
+    '''Driver for GPIO connected relays.
+
+    Uses the gpio character device via libgpiod if available (gpio_chip override, default /dev/gpiochip0)
+    falling back to RPi.GPIO.  States of all lines are read/written in bulk.
+
+    Only the owner (the power broker) drives the lines.  The lines are requested once and held, so they
+    keep their value between operations.  Other processes operate GPIO outlets via the power broker.
+    If the lines are held by another process they are not available.
+
+    Line values are translated to outlet state based on noff (normally off).  A normally off relay is on
+    when the line is high, otherwise it's on when the line is low.
+    '''
+
+    def __init__(self, chip: Union[str, MockChip, GpiodChip, RPiGPIOChip] = None):
+        chip = chip or config.gpio_chip
+        self._lock = threading.Lock()
+        if not isinstance(chip, str):
+            self.chip = chip
+        elif chip == 'mock':
+            self.chip = MockChip()
+        elif gpiod and Path(chip if chip.startswith('/') else f'/dev/{chip}').exists():
+            self.chip = GpiodChip(chip if chip.startswith('/') else f'/dev/{chip}')
+        elif is_rpi:
+            self.chip = RPiGPIOChip()
+        else:
+            self.chip = None
+
+    @property
+    def available(self) -> bool:
+        return self.chip is not None
+
+    def request(self, lines: List[int]) -> bool:
+        '''Request and hold lines, lines already held are retained.
+
+        returns: True if the lines are available.
+        '''
+        if not lines or not self.chip:
+            return False
+        with self._lock:
+            return self._request(lines)
+
+    def _request(self, lines: List[int]) -> bool:
+        '''Request lines (caller holds self._lock).  returns: True if the lines are available.'''
+        lines = [int(line) for line in lines]
+        if all([line in self.chip.lines for line in lines]):
+            return True
+        try:
+            self.chip.request(lines)
+        except (OSError, ValueError) as e:
+            holder = '' if not isinstance(self.chip, GpiodChip) else f', held by {self.chip.holder(lines)}'
+            log.warning(f'[PWR-GPIO] Unable to request lines {lines} from {self.chip.name}{holder} '
+                        f'{e.__class__.__name__}: {e}. GPIO outlets are not available', show=True)
+            return False
+        return True
+
+    def get(self, lines: Dict[int, bool]) -> Dict[int, bool]:
+        '''Return state of lines in a single read.
+
+        params:
+            lines: {line: noff}
+
+        returns: {line: state(bool True = ON)}, empty dict if gpio is not available
+        '''
+        if not lines or not self.chip:
+            return {}
+        with self._lock:
+            if not self._request(list(lines.keys())):
+                return {}
+            values = self.chip.get_values([int(line) for line in lines])
+        return {line: bool(values[int(line)]) if noff else not bool(values[int(line)]) for line, noff in lines.items()}
+
+    def set(self, lines: Dict[int, bool], noff: Dict[int, bool] = None) -> Dict[int, bool]:
+        '''Set state of lines in a single write.
+
+        params:
+            lines: {line: desired_state(bool True = ON)}
+            noff: {line: noff} lines not in the dict are treated as normally off
+
+        returns: {line: state(bool)} the resulting state of the lines, empty dict if gpio is not available
+        '''
+        noff = noff or {}
+        if not lines or not self.chip:
+            return {}
+        with self._lock:
+            if not self._request(list(lines.keys())):
+                return {}
+            self.chip.set_values({int(line): int(state if noff.get(line, True) else not state) for line, state in lines.items()})
+            values = self.chip.get_values([int(line) for line in lines])
+        return {line: bool(values[int(line)]) if noff.get(line, True) else not bool(values[int(line)]) for line in lines}
+
+    def close(self) -> None:
+        if self.chip:
+            with self._lock:
+                self.chip.release()
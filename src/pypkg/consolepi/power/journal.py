@@ -0,0 +1,104 @@
+#!/etc/ConsolePi/venv/bin/python3
+
+import atexit
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from consolepi import log, config, utils  # type: ignore
+
+POWER_STATE_FILE = '/etc/ConsolePi/.power_state.json'
+SAVE_DELAY = 1.0  # secs, updates within this window (i.e. the per outlet init threads) are written once
+
+
+class PowerJournal:
+    '''Persisted last known state of power outlets.
+
+    Allows the power menus to be displayed immediately with the last known state,
+    while the outlets are verified in the background.
+
+    file format:
+        defined: {outlet_grp: {'type': str, 'address': str|int, 'is_on': bool|dict, 'updated': epoch}}
+        dli_power: {address: {'ports': dict, 'updated': epoch}}
+        esp_power: {address: {'ports': dict, 'updated': epoch}}
+    '''
+
+    def __init__(self, file: str = None, delay: float = SAVE_DELAY):
+        self.file = Path(file or config.static.get('POWER_STATE_FILE', POWER_STATE_FILE))
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._timer: threading.Timer = None
+        self.data: Dict[str, Any] = self.load()
+        atexit.register(self.flush)
+
+    def load(self) -> Dict[str, Any]:
+        if not utils.valid_file(self.file):
+            return {}
+        try:
+            data = json.loads(self.file.read_text())
+        except (OSError, ValueError) as e:
+            log.warning(f'[PWR JOURNAL] Unable to load last known power state from {self.file}\n\t{e}')
+            return {}
+
+        # json keys are always str, restore int ports (dli and multi-relay tasmota)
+        for v in data.get('defined', {}).values():
+            if v.get('type') in ['dli', 'tasmota'] and isinstance(v.get('is_on'), dict):
+                v['is_on'] = {int(k) if k.isdigit() else k: s for k, s in v['is_on'].items()}
+        for v in data.get('dli_power', {}).values():
+            v['ports'] = {int(k) if k.isdigit() else k: s for k, s in v.get('ports', {}).items()}
+
+        return data
+
+    def get(self, key: str, name: str) -> Dict[str, Any]:
+        '''Return last known state for an outlet group (key='defined') or dli/esp address (key='dli_power'|'esp_power').'''
+        return self.data.get(key, {}).get(name, {})
+
+    def save(self, pwr_data: Dict[str, Any], verified: List[str]) -> None:
+        '''Update the journal with the state of outlet groups that were just verified.
+
+        The file is written SAVE_DELAY after the last update, so the per outlet threads result in a single write.
+
+        params:
+            pwr_data: Outlets.data
+            verified: outlet groups that were verified (dli/esp entries are updated based on the address of these groups)
+        '''
+        now = time.time()
+        defined = pwr_data.get('defined', {})
+        with self._lock:
+            for grp in [g for g in verified if g in defined]:
+                outlet = defined[grp]
+                self.data['defined'] = {
+                    **self.data.get('defined', {}),
+                    grp: {'type': outlet['type'].lower(), 'address': outlet['address'], 'is_on': outlet.get('is_on'), 'updated': now}
+                }
+                for key in ['dli_power', 'esp_power']:
+                    if outlet['address'] in pwr_data.get(key, {}):
+                        self.data[key] = {
+                            **self.data.get(key, {}),
+                            outlet['address']: {'ports': pwr_data[key][outlet['address']], 'updated': now}
+                        }
+
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.delay, self.flush)
+            self._timer.daemon = True
+            self._timer.name = 'pwr_journal_save'
+            self._timer.start()
+
+    def flush(self) -> None:
+        '''Write pending updates to the journal file.'''
+        with self._lock:
+            if self._timer is None:
+                return
+            self._timer.cancel()
+            self._timer = None
+            try:
+                _tmp = self.file.parent / f'.{self.file.name}.tmp'
+                _tmp.write_text(json.dumps(self.data, indent=4, sort_keys=True, default=str))
+                os.replace(_tmp, self.file)
+                utils.set_perm(str(self.file))
+            except (OSError, TypeError, ValueError, KeyError) as e:
+                log.debug(f'[PWR JOURNAL] Unable to save last known power state to {self.file} {e.__class__.__name__}: {e}')
@@ -1,20 +1,18 @@
 #!/etc/ConsolePi/venv/bin/python3
 
+import copy
 import json
 import threading
 import time
 from typing import Any, Dict, List, Tuple, Union
 
-try:
-    import RPi.GPIO as GPIO
-    is_rpi = True
-except (RuntimeError, ModuleNotFoundError, ImportError):
-    is_rpi = False
-
-from consolepi import log, config, requests, utils  # type: ignore
-from consolepi.power import DLI  # type: ignore
+from consolepi import log, config, requests, utils, metrics  # type: ignore
+from consolepi.power import DLI, ESPHomeEvents, GpioOutlets, PowerJournal, PowerScheduler, PowerState, Tasmota  # type: ignore
+from consolepi.power.broker import PowerBroker, PowerBrokerError, PowerBrokerUnavailable  # type: ignore
+from consolepi.power.resolver import CONNECT_TIMEOUT, resolver  # type: ignore
 
 TIMING = False
+GPIO_NO_BROKER = '[PWR-GPIO] GPIO outlets are operated by the power broker (consolepi-powerbroker), which is not available'
 
 
 class ConsolePiPowerException(Exception):
@@ -22,10 +20,17 @@ class ConsolePiPowerException(Exception):
 
 
 class Outlets:
-    def __init__(self):
-        if is_rpi:
-            GPIO.setmode(GPIO.BCM)
-            GPIO.setwarnings(False)
+    def __init__(self, use_broker: bool = True, owner: bool = False):
+        '''Power Outlets
+
+        Args:
+            use_broker (bool, optional): Use the power broker daemon (if running) for dli, GPIO and espHome operations
+                and outlet data.  The broker holds authenticated sessions with the dlis, the GPIO lines, the espHome
+                event streams and cached outlet state. Defaults to True.
+            owner (bool, optional): This process owns the long-lived power resources (GPIO lines, espHome event streams).
+                Only the power broker is the owner, other processes operate GPIO outlets via the broker, and poll
+                espHome devices if the broker is not available.  Defaults to False.
+        '''
         self._dli = {}
 
         # Some convenience Bools used by menu to determine what options to display
@@ -39,92 +44,132 @@ class Outlets:
         else:
             self.outlets_exists = False
 
-        self.data: Dict[str, Any] = config.outlets
-
-        if config.power:
+        self.state = PowerState(config.outlets)  # self.data is the current snapshot, changes are made via self.state.update()
+
+        # -- // GPIO lines for all GPIO outlets are requested once and held by the owner (power broker) \\ --
+        self.gpio = None
+        if self.gpio_exists and owner:
+            self.gpio = GpioOutlets()
+            self.gpio.request([o['address'] for o in self.data.get('defined', {}).values() if o['type'].upper() == 'GPIO'])
+        self.tasmota = Tasmota(timeout=config.so_timeout, log=log)
+        self.scheduler = PowerScheduler(self)
+        self.timeline: List[Dict[str, Any]] = []  # timeline from the last sequenced power operation
+        self.journal = PowerJournal()
+        self.stale: Dict[str, float] = {}  # outlet grps/addresses populated from last known state {key: last verified epoch}
+
+        # -- // espHome relay state is maintained via the devices event stream (by the power broker) \\ --
+        self.esp = None
+        if owner and self.esphome_exists and config.esphome_events:
+            self.esp = ESPHomeEvents(timeout=config.so_timeout, log=log)
+            for outlet in self.data.get('defined', {}).values():
+                if outlet.get('type', '').lower() == 'esphome' and outlet.get('address'):
+                    self.esp.subscribe(outlet['address'])
+
+        # -- // dli sessions, GPIO lines, espHome event streams and outlet state are held by the power broker if it's running \\ --
+        self.broker = None
+        if use_broker and config.power and (self.dli_exists or self.gpio_exists or (self.esphome_exists and config.esphome_events)):
+            broker = PowerBroker()
+            if broker.available():
+                try:
+                    self.data = broker.request('data')
+                    self.broker = broker
+                    log.debug('[PWR BROKER] Using power broker for dli sessions and outlet data')
+                except PowerBrokerError as e:
+                    log.warning(f'[PWR BROKER] Unable to get outlet data from power broker {e}')
+
+        if config.power and not self.broker:
+            self.load_last_state()
             self.pwr_start_update_threads()
 
+    @property
+    def data(self) -> Dict[str, Any]:
+        '''Current snapshot of outlet data (read-only, use self.state.update() to make changes).'''
+        return self.state.snapshot()
+
+    @data.setter
+    def data(self, data: Dict[str, Any]) -> None:
+        self.state.replace(data)
+
     def linked(self):
         pass
 
-    def do_tasmota_cmd(self, address, command=None):
+    def load_last_state(self) -> None:
+        '''Populate outlet data with the last known state (from the journal).
+
+        Outlets are marked stale (self.stale) until they are verified by pwr_get_outlets.
+        '''
+        with self.state.update() as data:
+            defined = data.get('defined', {})
+            for grp, outlet in defined.items():
+                last = self.journal.get('defined', grp)
+                if not last or last.get('type') != outlet['type'].lower() or str(last.get('address')) != str(outlet['address']):
+                    continue
+                outlet['is_on'] = last['is_on']
+                self.stale[grp] = last['updated']
+
+            addresses = [str(o['address']) for o in defined.values()]
+            for key in ['dli_power', 'esp_power']:
+                for addr, last in self.journal.data.get(key, {}).items():
+                    if addr in addresses and last.get('ports'):
+                        data[key][addr] = last['ports']
+                        self.stale[addr] = last['updated']
+
+    def stale_age(self, key: str) -> Union[str, None]:
+        '''Return age of last known state for outlet grp/address if it has not been verified yet, otherwise None'''
+        if key not in self.stale:
+            return None
+        _age = int(time.time() - self.stale[key])
+        if _age < 60:
+            return f'{_age}s ago'
+        elif _age < 3600:
+            return f'{_age // 60}m ago'
+        elif _age < 86400:
+            return f'{_age // 3600}h ago'
+        return f'{_age // 86400}d ago'
+
+    def do_tasmota_cmd(self, address, command=None, relay=None):
         '''
         Perform Operation on Tasmota outlet:
         params:
         address: IP or resolvable hostname
         command:
+            None: get current state of outlet
             True | 'ON': power the outlet on
             False | 'OFF': power the outlet off
             'Toggle': Toggle the outlet
             'cycle': Cycle Power on outlets that are powered On
+        relay: int | list, The relay(s) to perform the operation on (multi-relay devices), default: relay 1
+            All relays are updated with a single request (status is gathered from all relays at once,
+            changes to multiple relays are sent as a Backlog)
 
-        TODO: Right now this method does not verify if port is currently in an ON state
-            before allowing 'cycle', resulting in it powering on the port consolepi-menu
-            verifies status before allowing the command, but *may* be that other outlet
-            are handled by this library.. check & make consistent
+        returns:
+            bool | dict: state of outlet after operation (True = ON), dict {relay: bool} if a list of relays was provided
+                         False is returned for cycle if the outlet(s) were off.
+            str: error text
         TODO: remove int returns and re-factor all returns to use a return class (like requests)
         '''
-        # sub to make the api call to the tasmota device
-        def tasmota_req(**kwargs):
-            querystring = kwargs['querystring']
-            try:
-                response = requests.request("GET", url, headers=headers, params=querystring, timeout=config.so_timeout)
-                if response.status_code == 200:
-                    if json.loads(response.text)['POWER'] == 'ON':
-                        _response = True
-                    elif json.loads(response.text)['POWER'] == 'OFF':
-                        _response = False
-                    else:
-                        _response = 'invalid state returned {}'.format(response.text)
-                else:
-                    _response = '[{}] error returned {}'.format(response.status_code, response.text)
-            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
-                _response = 'Unreachable'
-            except requests.exceptions.RequestException as e:
-                log.debug(f"[tasmota_req] {url.replace('http://', '').replace('https://', '').split('/')[0]} Exception: {e}")
-                _response = 'Unreachable ~ hit catchall exception handler'  # determine if other exceptions types are possible
-            return _response
-        # -------- END SUB --------
-
-        url = 'http://' + address + '/cm'
-        headers = {
-            'Cache-Control': "no-cache",
-            'Connection': "keep-alive",
-            'cache-control': "no-cache"
-        }
-
-        querystring = {"cmnd": "Power"}
-        cycle = False
-        if command is not None:
-            if isinstance(command, bool):
-                command = 'ON' if command else 'OFF'
-
-            command = command.upper()
-            if command in ['ON', 'OFF', 'TOGGLE']:
-                querystring = {"cmnd": f"Power {command}"}
+        relays = [int(r) for r in utils.listify(relay)] if relay is not None else [1]
+        if command is None:
+            r = self.tasmota.status(address)
+        else:
+            if isinstance(command, str):
+                command = command.upper()
+            if isinstance(command, bool) or command in ['ON', 'OFF', 'TOGGLE']:
+                r = self.tasmota.operate(address, {_r: command for _r in relays})
             elif command == 'CYCLE':
-                cur_state = tasmota_req(querystring={"cmnd": "Power"})
-                if isinstance(cur_state, bool):
-                    if cur_state:
-                        querystring = {"cmnd": "Power OFF"}
-                        cycle = True
-                    else:
-                        return False  # return False for cycle if outlet was off indicating state is invalid for cycle
-                else:
-                    return cur_state  # an error occurred getting current state
+                r = self.tasmota.cycle(address, relays, cycle_time=config.cycle_time)
             else:
                 raise ConsolePiPowerException(f'Invalid Type {type(command)} passed to do_tasmota_cmd')
 
-        # -- // Send Request to TASMOTA \\ --
-        r = tasmota_req(querystring=querystring)
-        if cycle:
-            if isinstance(r, bool):
-                if not r:
-                    time.sleep(config.cycle_time)
-                    r = tasmota_req(querystring={"cmnd": "Power ON"})
-                else:
-                    return 'Unexpected response, port returned on state expected off'
-        return r
+        if isinstance(r, dict):
+            if isinstance(relay, list):
+                return {_r: r[_r] for _r in relays if _r in r}
+            elif relays[0] in r:
+                return r[relays[0]]
+            else:
+                return f'invalid state returned, relay {relays[0]} not found'
+
+        return r  # error or False for cycle if outlet was off
 
     def do_esphome_cmd(self, address, relay_id, command=None):
         '''Perform Operation on espHome outlets.
@@ -143,6 +188,9 @@ class Outlets:
 
         Returns:
             Bool or str -- Bool indicating state of outlet after operation or str with error text
+
+        If the event stream for the device is connected current state is pulled from the live state table
+        otherwise the device is queried.
         '''
         def esphome_req(*args, command=command):
             '''sub function to perform operation on outlet
@@ -150,7 +198,7 @@ class Outlets:
             try:
                 method = "GET" if command is None else "POST"
                 response = requests.request(method, url=url,
-                                            headers=headers, timeout=config.so_timeout)
+                                            headers=headers, timeout=(CONNECT_TIMEOUT, config.so_timeout))
                 if response.status_code == 200:
                     if command is None:
                         _response = response.json().get('value')
@@ -163,6 +211,7 @@ class Outlets:
                 else:
                     _response = '[{}] error returned {}'.format(response.status_code, response.text)
             except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+                resolver.invalidate(address)
                 _response = 'Unreachable'
             except requests.exceptions.RequestException as e:
                 log.debug(f"[esphome_req] {url.replace('http://', '').replace('https://', '').split('/')[0]} Exception: {e}")
@@ -170,14 +219,16 @@ class Outlets:
             return _response
         # -------- END SUB --------
 
-        url = status_url = 'http://' + address + '/switch/' + str(relay_id)
+        url = status_url = 'http://' + resolver.netloc(address) + '/switch/' + str(relay_id)
         headers = {
             'Cache-Control': "no-cache",
             'Connection': "keep-alive",
             'cache-control': "no-cache"
         }
         # -- Get initial State of Outlet --
-        cur_state = esphome_req(command=None)
+        cur_state = None if not self.esp else self.esp.get(address, relay_id)
+        if cur_state is None:
+            cur_state = esphome_req(command=None)
 
         cycle = False
         if command is None:
@@ -211,8 +262,85 @@ class Outlets:
                     r = esphome_req()
                 else:
                     return '[PWR-ESP] Unexpected response, port returned on state expected off'
+            if self.esp:
+                self.esp.set(address, relay_id, r)
         return r
 
+    def get_esphome_states(self, address: str, relays: List[str]) -> Dict[str, Union[bool, str]]:
+        '''Get the state of multiple relays on an espHome device.
+
+        State is pulled from the live state table (event stream), any relays not available there
+        (event stream disabled, not connected yet, or the device doesn't send them) are polled once.
+
+        Returns:
+            dict -- {relay: state} state is Bool (True = ON) or str with error text
+        '''
+        states = {} if not self.esp else self.esp.wait(address, relays)
+        for r in [r for r in relays if r not in states]:
+            states[r] = self.do_esphome_cmd(address, r)
+            if states[r] == 'Unreachable':  # no point in polling remaining relays
+                states = {**states, **{_r: states[r] for _r in relays if _r not in states}}
+                break
+
+        return states
+
+    def esphome_live_data(self) -> Dict[str, Any]:
+        '''Return outlet data with espHome relay states from the live state table (event streams).
+
+        Only the owner (power broker) runs the event streams, the relay states it has are applied to
+        the snapshot before it's returned to broker clients.
+        '''
+        if not self.esp:
+            return self.data
+
+        changed = {
+            grp: {relay: state for relay, state in [(r, self.esp.get(o['address'], r)) for r in o['is_on']]
+                  if state is not None and state != o['is_on'][relay].get('state')}
+            for grp, o in self.data.get('defined', {}).items()
+            if o.get('type', '').lower() == 'esphome' and isinstance(o.get('is_on'), dict)
+        }
+        if any(changed.values()):
+            with self.state.update() as data:
+                for grp in [g for g in changed if changed[g]]:
+                    outlet = data['defined'][grp]
+                    for relay, state in changed[grp].items():
+                        outlet['is_on'][relay]['state'] = state
+                    if outlet['address'] in data.get('esp_power', {}):
+                        data['esp_power'][outlet['address']] = outlet['is_on']
+
+        return self.data
+
+    def broker_request(self, cmd: str, *args, **kwargs) -> Any:
+        '''Send request to the power broker.
+
+        If the broker has become unavailable, falls back to local sessions.  Returns None in that case
+        (callers then perform the operation locally).
+        '''
+        try:
+            return self.broker.request(cmd, *args, **kwargs)
+        except PowerBrokerUnavailable as e:
+            log.warning(f'[PWR BROKER] power broker unavailable, falling back to local sessions. {e}')
+            self.broker = None
+        except PowerBrokerError as e:
+            return f'[PWR BROKER] {e}'
+
+    def get_dli(self, address: str) -> Union[DLI, None]:
+        '''Return DLI object for address, loads the dli (using credentials from the config) if not loaded.'''
+        if address not in self._dli:
+            outlet = [o for o in self.data.get('defined', {}).values() if o['type'].lower() == 'dli' and o['address'] == address]
+            if outlet:
+                self.load_dli(address, outlet[0].get('username'), outlet[0].get('password'))
+        return self._dli.get(address)
+
+    def dli_ready(self, address: str) -> bool:
+        '''Return True if dli is loaded (or available via the power broker)'''
+        return address in self._dli or bool(self.broker and address in self.data.get('dli_power', {}))
+
+    def dli_port_name(self, address: str, port: int) -> str:
+        if self.broker:
+            return self.data['dli_power'][address][port]['name']
+        return self._dli[address].name(port)
+
     def load_dli(self, address, username, password):
         '''
         Returns instace of DLI class
@@ -287,6 +415,71 @@ class Outlets:
 
         return outlet, _p
 
+    def group_dli_ports(self, outlets: Dict[str, Any]) -> Dict[str, List[int]]:
+        '''Combine the linked ports of all dli outlet groups by dli.
+
+        Multiple outlet groups in the config can reference the same dli.  Grouping
+        the ports allows a single request to be sent to each dli.
+
+        Params:
+            dict -- outlet dict (i.e. self.data['defined'])
+
+        Returns:
+            dict -- {dli address: [linked ports]}, outlets with no_all: true are excluded.
+        '''
+        dli_ports: Dict[str, List[int]] = {}
+        for grp in outlets:
+            outlet = outlets[grp]
+            if outlet['type'].lower() != 'dli' or outlet.get('no_all') or not outlet.get('linked_devs'):
+                continue
+            if not self.dli_ready(outlet['address']):
+                continue
+            _ports = dli_ports.get(outlet['address'], [])
+            for dev in outlet['linked_devs']:
+                _ports += [int(p) for p in utils.listify(outlet['linked_devs'][dev])]
+            dli_ports[outlet['address']] = sorted(set(_ports))
+
+        return dli_ports
+
+    def update_dli_state(self, address: str, ports: List[int], state: bool) -> None:
+        '''Update outlet data with the result of an operation on dli ports.
+
+        Avoids re-querying the dli after an operation when the dli has already
+        confirmed the resulting state.
+
+        Params:
+            address: the address of the dli
+            ports: the ports (dli outlet numbering starting with 1) that were operated on
+            state: bool resulting state (True = ON)
+        '''
+        with self.state.update() as data:
+            for p in ports:
+                if p in data.get('dli_power', {}).get(address, {}):
+                    data['dli_power'][address][p]['state'] = state
+            for outlet in data.get('defined', {}).values():
+                if outlet['type'].lower() == 'dli' and outlet['address'] == address and isinstance(outlet.get('is_on'), dict):
+                    for p in ports:
+                        if p in outlet['is_on']:
+                            outlet['is_on'][p]['state'] = state
+
+    def update_outlet_state(self, grp: str, state: Union[bool, Dict[Union[int, str], Any]], key: str = 'state') -> None:
+        '''Update outlet data with the result of an operation on an outlet group.
+
+        Params:
+            grp: the outlet group
+            state: bool (single port outlets GPIO/tasmota) or dict {port: value} for multi-port outlets
+            key: the key updated for multi-port outlets ('state' or 'name')
+        '''
+        with self.state.update() as data:
+            outlet = data.get('defined', {}).get(grp)
+            if not outlet:
+                return
+            if not isinstance(state, dict):
+                outlet['is_on'] = state
+            elif isinstance(outlet.get('is_on'), dict):
+                for p in [p for p in state if p in outlet['is_on']]:
+                    outlet['is_on'][p][key] = state[p]
+
     def dli_close_all(self, dlis=None):
         '''Close Connection to any connected dli Web Power Switches
 
@@ -313,18 +506,37 @@ class Outlets:
                 all ports for the dli.
             failures:dict: when refreshing outlets pass in previous failures so they can be re-tried
         '''
+        # -- // power broker has the sessions and the data \\ --
+        if self.broker:
+            data = self.broker_request('pwr_get_outlets', upd_linked=upd_linked)
+            if isinstance(data, dict):
+                self.data = {**self.data, **data}
+                return self.data
+            elif data is not None:
+                log.warning(f'[PWR VRFY (pwr_get_outlets)] {data}', show=True)
+                return self.data
+
         # re-attempt connection to failed power controllers on refresh
         log.debug(f"[PWR VRFY (pwr_get_outlets)] Processing {', '.join(outlet_data.keys())}")
         if not failures:
             failures = outlet_data.get('failures', {}) if outlet_data.get('failures') else self.data.get('failures', {})
 
-        outlet_data = self.data.get('defined', {}) if not outlet_data else outlet_data
+        # outlets are updated in a private copy, which is committed to the state store when complete
+        snapshot = self.data
+        outlet_data = copy.deepcopy(snapshot.get('defined', {}) if not outlet_data else outlet_data)
         if failures:
-            outlet_data = {**outlet_data, **failures}
+            outlet_data = {**outlet_data, **copy.deepcopy(failures)}
             failures = {}
 
-        dli_power = self.data.get('dli_power', {})
-        esp_power = self.data.get('esp_power', {})
+        dli_power = copy.deepcopy(snapshot.get('dli_power', {}))
+        esp_power = copy.deepcopy(snapshot.get('esp_power', {}))
+        addresses = [o['address'] for o in outlet_data.values()]
+
+        # -- // state of all GPIO outlets is read in a single request \\ --
+        gpio_states = {}
+        gpio_lines = {o['address']: o.get('noff', True) for o in outlet_data.values() if o['type'].upper() == 'GPIO'}
+        if gpio_lines and self.gpio and self.gpio.available:
+            gpio_states = self.gpio.get(gpio_lines)
 
         for k in outlet_data:
             outlet = outlet_data[k]
@@ -332,38 +544,58 @@ class Outlets:
 
             # -- // GPIO \\ --
             if outlet['type'].upper() == 'GPIO':
-                if not is_rpi:
-                    log.warning('GPIO Outlet Defined, GPIO Only Supported on RPi - ignored', show=True)
+                if not self.gpio:
+                    log.warning(f'{GPIO_NO_BROKER} - {k} ignored', show=True)
                     continue
-                noff = True if 'noff' not in outlet else outlet['noff']
-                GPIO.setup(outlet['address'], GPIO.OUT)
-                outlet_data[k]['is_on'] = bool(GPIO.input(outlet['address'])) if noff \
-                    else not bool(GPIO.input(outlet['address']))
+                if outlet['address'] not in gpio_states:
+                    log.warning('GPIO Outlet Defined, GPIO Only Supported on RPi (or systems with libgpiod) - ignored', show=True)
+                    continue
+                outlet_data[k]['is_on'] = gpio_states[outlet['address']]
 
             # -- // tasmota \\ --
             elif outlet['type'] == 'tasmota':
-                response = self.do_tasmota_cmd(outlet['address'])
-                outlet['is_on'] = response
-                if response not in [0, 1, True, False]:
+                # multi-relay devices, the state of all relays is gathered with a single request
+                if outlet.get('relays'):
+                    relays = [int(r) for r in utils.listify(outlet['relays'])]
+                    response = self.do_tasmota_cmd(outlet['address'], relay=relays)
+                    if isinstance(response, dict) and response:
+                        outlet['is_on'] = {r: {'state': response[r], 'name': str(r)} for r in relays if r in response}
+                        bad_relays = [r for r in relays if r not in response]
+                        if bad_relays:
+                            log.warning(f'[PWR-TASMOTA] {k} ({outlet["address"]}) relay(s) {bad_relays} not found on device - Removed',
+                                        show=True)
+                        tasmota_ok = True
+                    else:
+                        tasmota_ok = False
+                        response = response if response else 'no relay state returned'
+                else:
+                    response = self.do_tasmota_cmd(outlet['address'])
+                    outlet['is_on'] = response
+                    tasmota_ok = response in [0, 1, True, False]
+
+                if not tasmota_ok:
                     failures[k] = outlet_data[k]
                     failures[k]['error'] = f'[PWR-TASMOTA] {k}:{failures[k]["address"]} {response} - Removed'
                     log.warning(failures[k]['error'], show=True)
 
             # -- // esphome \\ --
             elif outlet['type'] == 'esphome':
-                # TODO have do_esphome accept list, slice, or str for one or multiple relays
                 relays = utils.listify(outlet.get('relays', k))  # if they have not specified the relay try name of outlet
-                outlet['is_on'] = {}
+                states = self.get_esphome_states(outlet['address'], relays)
+                outlet['is_on'] = {r: {'state': states[r], 'name': r} for r in relays if isinstance(states[r], bool)}
+                bad_relays = [r for r in relays if not isinstance(states[r], bool)]
                 esp_ok = True
-                for r in relays:
-                    response = self.do_esphome_cmd(outlet['address'], r)
-                    outlet['is_on'][r] = {'state': response, 'name': r}
-                    if response not in [True, False]:
-                        failures[k] = outlet_data[k]
-                        failures[k]['error'] = f'[PWR-ESP] {k}:{r} ({failures[k]["address"]}) {response} - Removed'
-                        log.warning(failures[k]['error'], show=True)
-                        esp_ok = False
-                        break
+                if len(bad_relays) == len(relays):
+                    failures[k] = outlet_data[k]
+                    failures[k]['error'] = f'[PWR-ESP] {k} ({failures[k]["address"]}) {states[relays[0]]} - Removed'
+                    log.warning(failures[k]['error'], show=True)
+                    esp_ok = False
+                elif bad_relays:  # Only the relays that returned an error are removed
+                    log.warning(
+                        f'[PWR-ESP] {k} ({outlet["address"]}) relay{"s" if len(bad_relays) > 1 else ""} '
+                        f'{", ".join([f"{r}: {states[r]}" for r in bad_relays])} - Removed', show=True
+                    )
+                    relays = [r for r in relays if r not in bad_relays]
 
                 # add multi-port esp_outlets to dli_menu, unless all outlets are linked anyway
                 # if esp is 8 ports add it to dli regardless (dli are 8 and they get that treatment)
@@ -406,7 +638,7 @@ class Outlets:
                         print(json.dumps(dli_power, indent=4, sort_keys=True))
 
                     # upd_linked is for faster update in power menu only refreshes data for linked ports vs entire dli
-                    if upd_linked and self.data['dli_power'].get(outlet['address']):
+                    if upd_linked and dli_power.get(outlet['address']):
                         if outlet.get('linked_devs'):
                             (outlet, _p) = self.update_linked_devs(outlet)
                             if k in outlet_data:
@@ -442,32 +674,57 @@ class Outlets:
                     print('[TIMING] this_dli.outlets: {}'.format(time.perf_counter() - xstart))  # type: ignore
 
             log.debug(f"{outlet['type'].lower()} {k} Updated. Elapsed Time(secs): {time.perf_counter() - _start}")
+            metrics.observe(
+                'consolepi_power_operation_seconds', time.perf_counter() - _start,
+                type=outlet['type'].lower(), address=outlet['address'], operation='get'
+            )
             # -- END for LOOP for k in outlet_data --
 
-        # Move failed outlets from the keys that populate the menu to the 'failures' key
-        # failures are displayed in the footer section of the menu, then re-tried on refresh
-        for _dev in failures.copy():
+        # outlets processed here (verified or failed)
+        verified = [(_dev, str(outlet_data.get(_dev, failures.get(_dev, {})).get('address'))) for _dev in [*outlet_data, *failures]]
+
+        for _dev in failures:
             if outlet_data.get(_dev):
                 del outlet_data[_dev]
-            if self.data['defined'].get(_dev):
-                del self.data['defined'][_dev]
             if failures[_dev]['address'] in dli_power:
                 del dli_power[failures[_dev]['address']]
-            self.data['failures'][_dev] = failures[_dev]
-
-        # restore outlets that failed on menu launch but found reachable during refresh
-        for _dev in outlet_data.copy():
-            if _dev not in self.data['defined']:
-                self.data['defined'][_dev] = outlet_data[_dev]
-            if _dev in self.data['failures']:
-                del self.data['failures'][_dev]
-
-        self.data['dli_power'] = dli_power
-        self.data['esp_power'] = esp_power
+            if failures[_dev]['address'] in esp_power:
+                del esp_power[failures[_dev]['address']]
+
+        # -- // commit, only the outlets (and their controllers) processed here are updated \\ --
+        with self.state.update() as data:
+            # Move failed outlets from the keys that populate the menu to the 'failures' key
+            # failures are displayed in the footer section of the menu, then re-tried on refresh
+            for _dev in failures:
+                data['defined'].pop(_dev, None)
+                data['failures'] = {**data.get('failures', {}), _dev: failures[_dev]}
+
+            # restore outlets that failed on menu launch but found reachable during refresh
+            for _dev in outlet_data:
+                data['defined'][_dev] = outlet_data[_dev]
+                data.get('failures', {}).pop(_dev, None)
+
+            for key, _power in [('dli_power', dli_power), ('esp_power', esp_power)]:
+                data[key] = {
+                    **{a: v for a, v in data.get(key, {}).items() if a not in addresses},
+                    **{a: _power[a] for a in addresses if a in _power}
+                }
+
+        # no longer displaying last known state, cleared after the commit so the menu redraws with the results
+        for _dev, _address in verified:
+            self.stale.pop(_dev, None)
+            self.stale.pop(_address, None)
+        self.journal.save(self.data, verified=list(outlet_data.keys()))
+        metrics.save()
 
         log.debug(f"[PWR VRFY (pwr_get_outlets)] Done Processing {', '.join(outlet_data.keys())}")
         return self.data
 
+    @metrics.timed(
+        'consolepi_power_operation_seconds',
+        labels=lambda self, pwr_type, address, *args, **kwargs: {'type': pwr_type.lower(), 'address': address, 'operation': 'toggle'},
+        flush=True
+    )
     def pwr_toggle(self, pwr_type, address, desired_state=None, port=None, noff=True, noconfirm=False):
         '''Toggle Power On the specified port
 
@@ -480,7 +737,7 @@ class Outlets:
             port: Only required for dli: can be type str | int | list.
                 valid:
                     int: representing the dli outlet #
-                    list: list of outlets(int) to perform operation on
+                    list: list of outlets(int) to perform operation on (sent to the dli in a single request)
                     str: 'all' ~ to perform operation on all outlets
             noff: Bool, default: True.  = normally off, only applies to GPIO based outlets.
                 If an outlet is normally off (True) = the relay/outlet is off if no power is applied via GPIO
@@ -498,29 +755,38 @@ class Outlets:
         # -- // Toggle dli web power switch port \\ --
         if pwr_type.lower() == 'dli':
             if port is not None:
-                return self._dli[address].toggle(port, toState=desired_state)
+                if self.broker:
+                    r = self.broker_request('pwr_toggle', pwr_type, address, desired_state=desired_state, port=port)
+                    if r is not None:
+                        return r
+                return self.get_dli(address).toggle(port, toState=desired_state)
 
         # -- // Toggle GPIO port \\ --
         elif pwr_type.upper() == 'GPIO':
+            if self.broker:
+                r = self.broker_request('pwr_toggle', pwr_type, address, desired_state=desired_state, noff=noff)
+                if r is not None:
+                    return r
+            if not self.gpio:
+                return GPIO_NO_BROKER
             gpio = address
             # get current state and determine inverse if toggle called with no desired_state specified
             if desired_state is None:
-                cur_state = bool(GPIO.input(gpio)) if noff else not bool(GPIO.input(gpio))
-                desired_state = not cur_state
-            if desired_state:
-                GPIO.output(gpio, int(noff))
-            else:
-                GPIO.output(gpio, int(not noff))
-            return bool(GPIO.input(gpio)) if noff else not bool(GPIO.input(gpio))
+                desired_state = not self.gpio.get({gpio: noff}).get(gpio)
+            return self.gpio.set({gpio: desired_state}, noff={gpio: noff}).get(gpio, f'[PWR-GPIO] gpio {gpio} is not available')
 
         # -- // Toggle TASMOTA port \\ --
         elif pwr_type.lower() == 'tasmota':
             if desired_state is None:
-                desired_state = not self.do_tasmota_cmd(address)
-            return self.do_tasmota_cmd(address, desired_state)
+                return self.do_tasmota_cmd(address, 'toggle', relay=port)
+            return self.do_tasmota_cmd(address, desired_state, relay=port)
 
         # -- // Toggle espHome port \\ --
         elif pwr_type.lower() == 'esphome':
+            if self.broker:
+                r = self.broker_request('pwr_toggle', pwr_type, address, desired_state=desired_state, port=port)
+                if r is not None:
+                    return r
             if desired_state is None:
                 desired_state = not self.do_esphome_cmd(address, port)
             return self.do_esphome_cmd(address, port, desired_state)
@@ -528,6 +794,11 @@ class Outlets:
         else:
             raise Exception('pwr_toggle: Invalid type ({}) or no name provided'.format(pwr_type))
 
+    @metrics.timed(
+        'consolepi_power_operation_seconds',
+        labels=lambda self, pwr_type, address, *args, **kwargs: {'type': pwr_type.lower(), 'address': address, 'operation': 'cycle'},
+        flush=True
+    )
     def pwr_cycle(self, pwr_type, address, port=None, noff=True):
         '''returns Bool True = Power Cycle success, False Not performed Outlet OFF
 
@@ -537,32 +808,42 @@ class Outlets:
         # --// CYCLE DLI PORT \\--
         if pwr_type == 'dli':
             if port is not None:
-                return self._dli[address].cycle(port)
+                if self.broker:
+                    r = self.broker_request('pwr_cycle', pwr_type, address, port=port)
+                    if r is not None:
+                        return r
+                return self.get_dli(address).cycle(port)
             else:
                 raise ConsolePiPowerException('pwr_cycle: port must be provided for outlet type dli')
 
         # --// CYCLE GPIO PORT \\--
         elif pwr_type == 'gpio':
+            if self.broker:
+                r = self.broker_request('pwr_cycle', pwr_type, address, noff=noff)
+                if r is not None:
+                    return r
+            if not self.gpio:
+                return GPIO_NO_BROKER
             gpio = address
             # normally off states are normal 0:off, 1:on - if not normally off it's reversed 0:on 1:off
-            cur_state = GPIO.input(gpio) if noff else not GPIO.input(gpio)
+            cur_state = self.gpio.get({gpio: noff}).get(gpio)
             if cur_state:
-                GPIO.output(gpio, int(not noff))
+                self.gpio.set({gpio: False}, noff={gpio: noff})
                 time.sleep(config.cycle_time)
-                GPIO.output(gpio, int(noff))
-                response = bool(GPIO.input(gpio))
-                return response if noff else not response
+                return self.gpio.set({gpio: True}, noff={gpio: noff}).get(gpio, f'[PWR-GPIO] gpio {gpio} is not available')
             else:
                 return False  # Cycle is not valid on ports that are already off
 
         # --// CYCLE TASMOTA PORT \\--
         elif pwr_type == 'tasmota':
-            # response = self.do_tasmota_cmd(address)  # this logic is handled in the function now
-            # if response:  # Only Cycle if outlet is currently ON
-            return self.do_tasmota_cmd(address, 'cycle')
+            return self.do_tasmota_cmd(address, 'cycle', relay=port)
 
         # --// CYCLE ESPHOME PORT \\--
         elif pwr_type == 'esphome':
+            if self.broker:
+                r = self.broker_request('pwr_cycle', pwr_type, address, port=port)
+                if r is not None:
+                    return r
             return self.do_esphome_cmd(address, port, 'cycle')
 
     def pwr_rename(self, type, address, name=None, port=None):
@@ -574,9 +855,12 @@ class Outlets:
                 return 'Rename Aborted'
         if type.lower() == 'dli':
             if port is not None:
-                response = self._dli[address].rename(port, name)
+                response = None if not self.broker else self.broker_request('pwr_rename', type, address, name=name, port=port)
+                if response is None:
+                    response = self.get_dli(address).rename(port, name)
                 if response:
-                    self.data['dli_power'][address][port]['name'] = name
+                    with self.state.update() as data:
+                        data['dli_power'][address][port]['name'] = name
             else:
                 response = 'ERROR port must be provided for outlet type dli'
         elif type.lower() in ['gpio', 'tasmota', 'esphome']:
@@ -595,65 +879,65 @@ class Outlets:
         Returns List of responses representing state of outlet after exec
             Valid response is Bool where True = ON
             Errors are returned in str format
+
+        toggle operations are sequenced by the PowerScheduler (depends_on, circuit inrush budgets, stagger)
+        the resulting timeline is stored in self.timeline
         '''
         if action == 'toggle' and desired_state is None:
             return 'Error: desired final state must be provided'  # should never hit this
 
         if outlets is None:
             outlets = self.pwr_get_outlets()['defined']
+
+        # if no_all: true in config outlet is ignored during all off/on operations
+        outlets = {grp: outlets[grp] for grp in outlets if not outlets[grp].get('no_all')}
         responses = []
+        if action == 'toggle':
+            self.timeline = self.scheduler.run(outlets, desired_state)
+            self.journal.save(self.data, verified=[t['outlet'] for t in self.timeline if not isinstance(t['result'], str)])
+            return [t['result'] for t in self.timeline]
+
+        # -- // cycle \\ --
+        dli_ports = self.group_dli_ports(outlets)
         for grp in outlets:
             outlet = outlets[grp]
-            # if no_all: true in config outlet is ignored during all off/on operations
-            if outlet.get("no_all"):
-                continue
             noff = True if 'noff' not in outlet else outlet['noff']
-            if action == 'toggle':
-                # skip any defined dlis that don't have any linked_outlets defined
-                # if not outlet['type'] == 'dli' or outlet.get('linked_devs')):
-                if outlet['type'] == 'dli':
-                    if outlet.get('linked_devs'):
-                        responses.append(
-                            self.pwr_toggle(outlet['type'], outlet['address'], desired_state=desired_state, port=self.update_linked_devs(outlet)[1], noff=noff, noconfirm=True)
-                        )
-                elif outlet['type'] == 'esphome':
-                    _relays = utils.listify(outlet.get('relays'))
-                    for p in _relays:
-                        responses.append(self.pwr_toggle(outlet['type'], outlet['address'], desired_state=desired_state,
-                                         port=p, noff=noff, noconfirm=True))
-                else:
-                    responses.append(self.pwr_toggle(outlet['type'], outlet['address'], desired_state=desired_state,
-                                     noff=noff, noconfirm=True))
-            elif action == 'cycle':
-                if outlet['type'] == 'dli':
-                    if 'linked_ports' in outlet:
-                        linked_ports = utils.listify(outlet['linked_ports'])
-                        for p in linked_ports:
-                            # Start a thread for each port run in parallel
-                            # menu status for (linked) power menu is updated on load
-                            threading.Thread(
-                                target=self.pwr_cycle,
-                                args=[outlet['type'], outlet['address']],
-                                kwargs={'port': p, 'noff': noff},
-                                name=f'cycle_{p}'
-                            ).start()
-                elif outlet['type'] == 'esphome':
-                    relays = utils.listify(outlet.get('relays', []))
-                    for p in relays:
-                        # Start a thread for each port run in parallel
-                        threading.Thread(
-                            target=self.pwr_cycle,
-                            args=[outlet['type'], outlet['address']],
-                            kwargs={'port': p, 'noff': noff},
-                            name=f'cycle_{p}'
-                        ).start()
-                else:
+            if outlet['type'] == 'dli':
+                continue
+            elif outlet['type'] == 'esphome':
+                relays = utils.listify(outlet.get('relays', []))
+                for p in relays:
+                    # Start a thread for each port run in parallel
                     threading.Thread(
                         target=self.pwr_cycle,
                         args=[outlet['type'], outlet['address']],
-                        kwargs={'noff': noff},
-                        name='cycle_{}'.format(outlet['address'])
+                        kwargs={'port': p, 'noff': noff},
+                        name=f'cycle_{p}'
                     ).start()
+            elif outlet['type'] == 'tasmota' and outlet.get('relays'):
+                threading.Thread(
+                    target=self.pwr_cycle,
+                    args=[outlet['type'], outlet['address']],
+                    kwargs={'port': [int(p) for p in utils.listify(outlet['relays'])]},
+                    name='cycle_{}'.format(outlet['address'])
+                ).start()
+            else:
+                threading.Thread(
+                    target=self.pwr_cycle,
+                    args=[outlet['type'], outlet['address']],
+                    kwargs={'noff': noff},
+                    name='cycle_{}'.format(outlet['address'])
+                ).start()
+
+        # -- // All linked ports on a dli are cycled with a single request \\ --
+        for address, ports in dli_ports.items():
+            # menu status for (linked) power menu is updated on load
+            threading.Thread(
+                target=self.pwr_cycle,
+                args=['dli', address],
+                kwargs={'port': ports},
+                name=f'cycle_{address}'
+            ).start()
 
         # Wait for all threads to complete
         while True:
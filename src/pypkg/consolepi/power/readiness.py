@@ -0,0 +1,208 @@
+#!/etc/ConsolePi/venv/bin/python3
+
+import json
+import os
+import re
+import select
+import socket
+import termios
+import threading
+import time
+import tty
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+from consolepi import log, config, utils  # type: ignore
+
+DEFAULT_BOOT_TIMEOUT = 60  # max seconds to wait for a device to be ready after it's powered on
+DEFAULT_BOOT_QUIET = 5  # serial device is considered ready once it's output has been idle this many seconds
+DEFAULT_BOOT_PATTERNS = [
+    r'login:\s*$',
+    r'username:\s*$',
+    r'password:\s*$',
+    r'press (return|enter|any key)',
+    r'^\S+[>#]\s*$',  # cli prompt
+]
+BOOT_SAMPLES = 10  # number of boot times retained per device
+PROBE_MIN = 0.1  # initial delay between tcp probes (doubles each attempt up to PROBE_MAX)
+PROBE_MAX = 2
+PROBE_TIMEOUT = 0.5  # connect timeout for each tcp probe
+_ANSI = re.compile(r'\x1b\[[0-9;?]*[a-zA-Z]|\r')
+
+
+class Readiness:
+    '''Detect when a device is ready (booted) after it's linked outlet is powered on.
+
+    The wait is opt-in per device via the boot_wait override (true for all devices or a list of devices).
+
+    Serial devices are watched (read-only) for a boot complete pattern (i.e. a login prompt), or until
+    the output has been idle for boot_quiet seconds (devices that don't display a prompt until they
+    receive input).  ssh/TELNET hosts are probed with a tcp connect, with exponential backoff between probes.
+
+    Patterns are configured via the boot_patterns override, either a list (applies to all devices)
+    or a dict keyed by device with an optional default key.  Patterns are regular expressions
+    (case insensitive, multi-line).  boot_timeout is the max time to wait.
+
+    The measured boot time (seconds from power on to ready) is recorded per device in
+    BOOT_TIMES_FILE.
+    '''
+
+    def __init__(self):
+        self.timeout = float(config.ovrd.get('boot_timeout', DEFAULT_BOOT_TIMEOUT))
+        self.quiet = float(config.ovrd.get('boot_quiet', DEFAULT_BOOT_QUIET))
+        self.boot_times_file = Path(config.static.get('BOOT_TIMES_FILE', '/etc/ConsolePi/.boot_times.json'))
+        self._lock = threading.Lock()
+
+    def enabled(self, dev: str) -> bool:
+        '''Return True if boot_wait is enabled for the device.'''
+        _enabled = config.ovrd.get('boot_wait', False)
+        if isinstance(_enabled, bool):
+            return _enabled
+        _dev = dev.replace('/dev/', '').replace('/host/', '')
+        return _dev in utils.listify(_enabled) or dev in utils.listify(_enabled)
+
+    def patterns(self, dev: str) -> List[re.Pattern]:
+        _patterns = config.ovrd.get('boot_patterns') or DEFAULT_BOOT_PATTERNS
+        if isinstance(_patterns, dict):
+            _dev = dev.replace('/dev/', '').replace('/host/', '')
+            _patterns = _patterns.get(_dev, _patterns.get(dev, _patterns.get('default', DEFAULT_BOOT_PATTERNS)))
+        return [re.compile(p, re.I | re.M) for p in utils.listify(_patterns)]
+
+    def wait_serial(self, dev: str, baud: int = 9600, timeout: float = None, patterns: List[re.Pattern] = None) -> Union[bool, None]:
+        '''Watch serial port (read-only) until a boot complete pattern is seen, or the output goes quiet.
+
+        The terminal attributes of the port are restored when done, so the connection tool opens the
+        port as it would have without the wait.
+
+        returns: True if a pattern matched or output went quiet, False on timeout, None if the port could not be opened.
+        '''
+        timeout = timeout or self.timeout
+        patterns = patterns or self.patterns(dev)
+        try:
+            fd = os.open(dev, os.O_RDONLY | os.O_NOCTTY | os.O_NONBLOCK)
+        except OSError as e:
+            log.warning(f'[READY] Unable to open {dev} to watch for boot completion {e.__class__.__name__}: {e}')
+            return None
+
+        saved = None
+        try:
+            saved = termios.tcgetattr(fd)
+            tty.setraw(fd)
+            attrs = termios.tcgetattr(fd)
+            attrs[4] = attrs[5] = getattr(termios, f'B{baud}', termios.B9600)
+            attrs[2] = (attrs[2] | termios.CLOCAL | termios.CREAD) & ~termios.HUPCL  # don't drop DTR on close
+            termios.tcsetattr(fd, termios.TCSANOW, attrs)
+
+            buf = ''
+            last_rx = None  # output has to be seen before the quiet heuristic applies
+            end = time.monotonic() + timeout
+            while time.monotonic() < end:
+                r, _, _ = select.select([fd], [], [], min(0.25, max(0, end - time.monotonic())))
+                if not r:
+                    if last_rx and time.monotonic() - last_rx >= self.quiet:
+                        log.debug(f'[READY] {dev} output idle for {self.quiet}s, assuming boot complete')
+                        return True
+                    continue
+                try:
+                    data = os.read(fd, 4096)
+                except BlockingIOError:
+                    continue
+                last_rx = time.monotonic()
+                buf = (buf + _ANSI.sub('', data.decode('utf-8', errors='ignore')))[-4096:]
+                for p in patterns:
+                    if p.search(buf):
+                        log.debug(f'[READY] {dev} boot complete pattern matched {p.pattern}')
+                        return True
+            return False
+        except (OSError, termios.error) as e:
+            log.warning(f'[READY] Error watching {dev} for boot completion {e.__class__.__name__}: {e}')
+            return None
+        finally:
+            if saved:
+                try:
+                    saved[2] &= ~termios.HUPCL  # still don't drop DTR on close
+                    termios.tcsetattr(fd, termios.TCSANOW, saved)
+                except (OSError, termios.error) as e:
+                    log.debug(f'[READY] Unable to restore terminal attributes for {dev} {e.__class__.__name__}: {e}')
+            os.close(fd)
+
+    def wait_tcp(self, host: str, port: int, timeout: float = None) -> bool:
+        '''Probe tcp port with exponential backoff (PROBE_MIN - PROBE_MAX) until it accepts a connection.
+
+        returns: True if port is reachable, False on timeout.
+        '''
+        timeout = timeout or self.timeout
+        end = time.monotonic() + timeout
+        delay = PROBE_MIN
+        while True:
+            try:
+                with socket.create_connection((host, port), timeout=PROBE_TIMEOUT):
+                    return True
+            except OSError:
+                pass
+            if time.monotonic() + delay > end:
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2, PROBE_MAX)
+
+    def wait(self, dev: str, cmd: str, powered_at: float = None, timeout: float = None) -> Union[bool, None]:
+        '''Wait for device to be ready based on the connection command (picocom, ssh, telnet).
+
+        params:
+            dev: device (pwr_key) /dev/... or /host/...
+            cmd: the command used to connect to the device
+            powered_at: time.monotonic() when the linked outlets were powered on (to record boot time)
+
+        returns: True if ready, False on timeout, None if readiness can't be determined.
+        '''
+        start = time.monotonic()
+        if dev.startswith('/dev/') or 'picocom' in cmd:
+            _baud = re.search(r'(?:--baud|-b)\s+(\d+)', cmd)
+            ready = self.wait_serial(dev, baud=int(_baud.group(1)) if _baud else config.default_baud, timeout=timeout)
+            method = 'serial'
+        else:
+            _h, _p = self.parse_host(cmd)
+            if not _h:
+                return None
+            ready = self.wait_tcp(_h, _p, timeout=timeout)
+            method = 'tcp'
+
+        if ready:
+            self.record(dev, time.monotonic() - (powered_at or start), method)
+        return ready
+
+    @staticmethod
+    def parse_host(cmd: str) -> tuple:
+        '''Extract host and port from ssh/telnet command.  returns: tuple (host, port), (None, None) if not found.'''
+        c = cmd.split()
+        if 'ssh' in c and '-p' in c:
+            _h = c[c.index('-p') - 1].split('@')[-1]
+            return _h, int(c[c.index('-p') + 1])
+        elif 'telnet' in c:
+            return c[-2], int(c[-1])
+        return None, None
+
+    def get_boot_times(self) -> Dict[str, Any]:
+        if self.boot_times_file.is_file():
+            try:
+                return json.loads(self.boot_times_file.read_text())
+            except (OSError, ValueError) as e:
+                log.warning(f'[READY] Unable to load {self.boot_times_file} {e.__class__.__name__}: {e}')
+        return {}
+
+    def expected(self, dev: str) -> Union[float, None]:
+        '''Return the average recorded boot time for the device, None if none recorded.'''
+        samples = self.get_boot_times().get(dev, {}).get('samples')
+        return None if not samples else round(sum(samples) / len(samples), 1)
+
+    def record(self, dev: str, seconds: float, method: str) -> None:
+        seconds = round(seconds, 2)
+        log.info(f'[READY] {dev} ready {seconds}s after power on ({method})')
+        with self._lock:
+            boot_times = self.get_boot_times()
+            samples = [*boot_times.get(dev, {}).get('samples', []), seconds][-BOOT_SAMPLES:]
+            boot_times[dev] = {'last': seconds, 'method': method, 'samples': samples, 'updated': int(time.time())}
+            try:
+                self.boot_times_file.write_text(json.dumps(boot_times, indent=4))
+            except OSError as e:
+                log.warning(f'[READY] Unable to write {self.boot_times_file} {e.__class__.__name__}: {e}')
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+import ipaddress
+import socket
+import threading
+import time
+from typing import Dict, Tuple, Union
+
+RESOLVER_TTL = 300  # seconds a resolved address is cached
+RESOLVER_NEG_TTL = 10  # seconds a failed lookup is cached
+CONNECT_TIMEOUT = 1.5  # connect timeout for power controller requests (the request itself is the reachability check)
+
+
+class Resolver:
+    '''Shared DNS cache for power controller addresses.
+
+    Power controllers are typically referenced by hostname, resolving the name on every request
+    adds a round trip (or a resolver timeout when DNS is down) to every power operation.
+    Lookups are cached for ttl seconds, failed lookups for neg_ttl seconds.  Callers should
+    invalidate() an address when a connection to it fails so it's re-resolved on the next request.
+    '''
+
+    def __init__(self, ttl: int = RESOLVER_TTL, neg_ttl: int = RESOLVER_NEG_TTL):
+        self.ttl = ttl
+        self.neg_ttl = neg_ttl
+        self._cache: Dict[str, Tuple[Union[str, None], float]] = {}  # host: (ip, expires)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_ip(host: str) -> bool:
+        try:
+            ipaddress.ip_address(host)
+            return True
+        except ValueError:
+            return False
+
+    def resolve(self, host: str, port: int = 80) -> Union[str, None]:
+        '''Return ip for host (from cache if valid), None if host can not be resolved.'''
+        if self.is_ip(host):
+            return host
+
+        with self._lock:
+            _lock = self._locks.setdefault(host, threading.Lock())
+
+        # concurrent lookups for the same host wait on the first rather than each querying DNS
+        with _lock:
+            ip, expires = self._cache.get(host, (None, 0))
+            if expires > time.monotonic():
+                return ip
+
+            try:
+                ip = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0][4][0]
+                expires = time.monotonic() + self.ttl
+            except (socket.gaierror, socket.timeout, TimeoutError, UnicodeError):
+                ip = None
+                expires = time.monotonic() + self.neg_ttl
+            self._cache[host] = (ip, expires)
+
+        return ip
+
+    def netloc(self, address: str, port: int = 80) -> str:
+        '''Return address (host or host:port) with host replaced by it's cached ip, for use in a url.
+
+        If the host can not be resolved the address is returned as is (the request will fail with
+        the appropriate error).
+        '''
+        host, _port = address, None
+        if address.count(':') == 1:
+            host, _port = address.split(':')
+        ip = self.resolve(host, port=int(_port or port))
+        if not ip:
+            return address
+        ip = ip if ':' not in ip else f'[{ip}]'
+        return ip if not _port else f'{ip}:{_port}'
+
+    def invalidate(self, address: str) -> None:
+        '''Remove address from the cache (i.e. after a connection failure).'''
+        host = address if address.count(':') != 1 else address.split(':')[0]
+        with self._lock:
+            self._cache.pop(host, None)
+
+
+resolver = Resolver()
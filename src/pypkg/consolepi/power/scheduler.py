@@ -0,0 +1,263 @@
+#!/etc/ConsolePi/venv/bin/python3
+
+import threading
+import time
+from typing import Any, Dict, List, Union
+
+from consolepi import log, config, utils  # type: ignore
+
+
+class PowerStep:
+    '''A single operation performed by the PowerScheduler, one or more ports on an outlet group.'''
+
+    def __init__(self, grp: str, outlet: Dict[str, Any], ports: List[Union[int, str]] = None, bulk: bool = True):
+        self.grp = grp
+        self.outlet = outlet
+        self.type = outlet['type'].lower()
+        self.address = outlet['address']
+        # operations against the same controller are performed serially
+        self.controller = f'gpio:{self.address}' if self.type == 'gpio' else str(self.address)
+        self.ports = ports
+        self.bulk = bulk  # bulk steps for the same controller can be combined into a single request
+        self.circuit = outlet.get('circuit')
+        self.inrush = float(outlet.get('inrush', 0)) * max(len(ports or []), 1)
+        self.stagger = float(outlet.get('stagger', config.power_stagger))
+        self.start = self.end = self.result = None
+
+    def __repr__(self) -> str:
+        return f'<PowerStep {self.grp} {self.type}:{self.address} ports:{self.ports}>'
+
+
+class PowerScheduler:
+    '''Sequence power operations across outlet groups.
+
+    - Outlet groups with depends_on are operated after the groups they depend on (reversed when powering off)
+    - Operations against the same controller are serial, up to max_parallel controllers are operated concurrently.
+    - Power on operations for outlets on a circuit are held until the circuit has budget for the outlets
+      inrush (circuit budgets are defined via the power_circuits override).  Inrush is counted against the
+      circuit until stagger seconds after the outlet is switched.
+    - Outlets with a stagger delay have their ports switched one at a time stagger seconds apart.
+      Otherwise all ports are sent to the controller in a single request.
+
+    run() returns a timeline of when each outlet actually switched.
+    '''
+
+    def __init__(self, pwr, circuits: Dict[str, float] = None, max_parallel: int = None):
+        self.pwr = pwr
+        self.circuits = config.power_circuits if circuits is None else circuits
+        self.max_parallel = max(1, int(max_parallel or config.power_max_parallel))
+
+    def get_ports(self, outlet: Dict[str, Any]) -> Union[List[Union[int, str]], None]:
+        '''Return the ports for an outlet group, None for single port outlets (GPIO/single relay tasmota).'''
+        _type = outlet['type'].lower()
+        if _type == 'dli':
+            if not self.pwr.dli_ready(outlet['address']):
+                return []
+            return sorted(set([int(p) for dev in outlet.get('linked_devs', {}) for p in utils.listify(outlet['linked_devs'][dev])]))
+        elif _type == 'esphome' or (_type == 'tasmota' and outlet.get('relays')):
+            if isinstance(outlet.get('is_on'), dict):
+                return list(outlet['is_on'].keys())
+            return utils.listify(outlet.get('relays'))
+        else:
+            return None
+
+    def order(self, outlets: Dict[str, Any], reverse: bool = False) -> List[str]:
+        '''Return outlet group names in dependency order (depends_on).
+
+        Dependencies on outlet groups not being operated on are ignored.  If a dependency loop is
+        found it's logged and the remaining groups are appended in config order.
+        '''
+        deps = {grp: [d for d in utils.listify(outlets[grp].get('depends_on')) if d in outlets and d != grp] for grp in outlets}
+        ordered: List[str] = []
+        while len(ordered) < len(outlets):
+            ready = [grp for grp in outlets if grp not in ordered and not [d for d in deps[grp] if d not in ordered]]
+            if not ready:
+                _loop = [grp for grp in outlets if grp not in ordered]
+                log.warning(f"[PWR SCHED] depends_on loop detected between {', '.join(_loop)}, ignoring dependencies", show=True)
+                ordered += _loop
+                break
+            ordered += ready
+
+        return ordered if not reverse else ordered[::-1]
+
+    def build_steps(self, outlets: Dict[str, Any], desired_state: bool, ports: Dict[str, Any] = None,
+                    order: List[str] = None) -> List[PowerStep]:
+        order = order or self.order(outlets)
+        steps = []
+        for grp in (order if desired_state else order[::-1]):
+            outlet = outlets[grp]
+            _ports = ports[grp] if ports and grp in ports else self.get_ports(outlet)
+            if _ports is not None and not _ports:
+                continue  # nothing to do (i.e. dli with no linked ports)
+
+            _stagger = float(outlet.get('stagger', config.power_stagger))
+            _budgeted = outlet.get('circuit') in self.circuits and float(outlet.get('inrush', 0))
+            if desired_state and _ports and (_stagger or _budgeted):
+                steps += [PowerStep(grp, outlet, ports=[p], bulk=False) for p in _ports]
+            else:
+                steps += [PowerStep(grp, outlet, ports=_ports)]
+
+        return steps
+
+    def run(
+        self, outlets: Dict[str, Any], desired_state: bool, ports: Dict[str, Any] = None, max_parallel: int = None
+    ) -> List[Dict[str, Any]]:
+        '''Power outlet groups on or off.
+
+        params:
+            outlets: dict of outlet groups (same format as Outlets.data['defined'])
+            desired_state: bool True = ON
+            ports: optional dict {grp: [ports]} to limit operation to specific ports/relays,
+                   any groups not in the dict are operated on all (linked) ports.
+            max_parallel: optional override of the number of controllers operated concurrently.
+
+        returns:
+            list: timeline one dict per step: {'outlet', 'type', 'address', 'ports', 'start', 'end', 'result'}
+                  start/end are seconds from when the run began.  result is bool (True = ON), dict
+                  {port: bool} for multi-relay tasmota/espHome or str with error text.
+        '''
+        _order = self.order(outlets)  # only dependencies that agree with the order are honored (loops)
+        steps = self.build_steps(outlets, desired_state, ports=ports, order=_order)
+        grps = set([s.grp for s in steps])
+        if desired_state:
+            deps = {
+                g: [d for d in utils.listify(outlets[g].get('depends_on')) if d in grps and _order.index(d) < _order.index(g)]
+                for g in grps
+            }
+        else:  # powering off, outlets that depend on a group are powered off first
+            deps = {
+                g: [d for d in grps if g in utils.listify(outlets[d].get('depends_on')) and _order.index(g) < _order.index(d)]
+                for g in grps
+            }
+        remaining = {g: len([s for s in steps if s.grp == g]) for g in grps}
+        busy_until: Dict[str, float] = {}  # controller: time controller is available
+        inrush: Dict[str, List[List[Any]]] = {}  # circuit: [[release time, inrush, step], ...]
+        pending = steps.copy()
+        running = [0]
+        _max_parallel = max(1, int(max_parallel or self.max_parallel))
+        cond = threading.Condition()
+        t0 = time.monotonic()
+
+        def fits(step: PowerStep, extra: float = 0) -> bool:
+            if not desired_state or step.circuit not in self.circuits or not step.inrush:
+                return True
+            used = sum([i[1] for i in inrush.get(step.circuit, [])]) + extra
+            return not used or used + step.inrush <= float(self.circuits[step.circuit])
+
+        def do_batch(batch: List[PowerStep]) -> None:
+            start = time.monotonic()
+            results = self._operate(batch, desired_state)
+            end = time.monotonic()
+            with cond:
+                for s, r in zip(batch, results):
+                    s.start, s.end, s.result = start - t0, end - t0, r
+                    remaining[s.grp] -= 1
+                    for i in inrush.get(s.circuit, []):
+                        if i[2] is s:
+                            i[0] = end + s.stagger
+                _stagger = 0 if not desired_state else max([s.stagger for s in batch if not s.bulk] or [0])
+                busy_until[batch[0].controller] = end + _stagger
+                running[0] -= 1
+                cond.notify_all()
+
+        with cond:
+            while pending or running[0]:
+                now = time.monotonic()
+                for c in inrush:
+                    inrush[c] = [i for i in inrush[c] if i[0] > now]
+
+                for step in pending.copy():
+                    if running[0] >= _max_parallel:
+                        break
+                    if step not in pending or busy_until.get(step.controller, 0) > now:
+                        continue
+                    if [d for d in deps[step.grp] if remaining[d]] or not fits(step):
+                        continue
+
+                    # combine other ready bulk steps for the same controller into a single request
+                    batch = [step]
+                    if step.bulk and step.type in ['dli', 'tasmota'] and step.ports is not None:
+                        for s in pending:
+                            if s is step or not s.bulk or s.controller != step.controller or s.type != step.type or s.ports is None:
+                                continue
+                            if [d for d in deps[s.grp] if remaining[d]] or not fits(s, extra=sum([b.inrush for b in batch])):
+                                continue
+                            batch += [s]
+
+                    for s in batch:
+                        pending.remove(s)
+                        if desired_state and s.circuit in self.circuits and s.inrush:
+                            inrush[s.circuit] = [*inrush.get(s.circuit, []), [float('inf'), s.inrush, s]]
+                    busy_until[step.controller] = float('inf')
+                    running[0] += 1
+                    threading.Thread(target=do_batch, args=(batch,), name=f'pwr_sched_{step.controller}', daemon=True).start()
+
+                if not pending and not running[0]:
+                    break
+                wake = [t for t in [*busy_until.values(), *[i[0] for c in inrush for i in inrush[c]]] if now < t < float('inf')]
+                cond.wait(timeout=None if not wake else min(wake) - now)
+
+        timeline = [
+            {
+                'outlet': s.grp,
+                'type': s.type,
+                'address': s.address,
+                'ports': s.ports,
+                'start': round(s.start, 3),
+                'end': round(s.end, 3),
+                'result': s.result
+            } for s in sorted(steps, key=lambda s: (s.start, s.grp))
+        ]
+        for t in timeline:
+            log.debug(f"[PWR SCHED] {t['start']:>7.3f} - {t['end']:>7.3f} {t['outlet']} {t['type']}:{t['address']}"
+                      f"{'' if t['ports'] is None else ' ports: ' + str(t['ports'])} -> {t['result']}")
+
+        return timeline
+
+    def _operate(self, batch: List[PowerStep], desired_state: bool) -> List[Any]:
+        '''Perform operation for a batch of steps (all for the same controller).
+
+        Updates outlet data with the result, returns list of results (one for each step)
+        '''
+        pwr = self.pwr
+        step = batch[0]
+        try:
+            # -- // dli and multi-relay tasmota all ports in a single request \\ --
+            if step.ports is not None and step.type in ['dli', 'tasmota']:
+                ports = sorted(set([int(p) for s in batch for p in s.ports]))
+                r = pwr.pwr_toggle(step.type, step.address, desired_state=desired_state, port=ports)
+                if step.type == 'dli':
+                    if isinstance(r, bool):
+                        pwr.update_dli_state(step.address, ports, r)
+                    return [r for _ in batch]
+
+                results = []
+                for s in batch:
+                    if isinstance(r, dict):
+                        results += [{p: r[p] for p in s.ports if p in r}]
+                        pwr.update_outlet_state(s.grp, results[-1])
+                    else:
+                        results += [r]
+                return results
+
+            # -- // espHome one request per relay \\ --
+            elif step.type == 'esphome':
+                results = []
+                for s in batch:
+                    r = {}
+                    for p in s.ports:
+                        r[p] = pwr.pwr_toggle(s.type, s.address, desired_state=desired_state, port=p)
+                    pwr.update_outlet_state(s.grp, {p: v for p, v in r.items() if isinstance(v, bool)})
+                    errors = [str(v) for v in r.values() if not isinstance(v, bool)]
+                    results += [r if not errors else '\n'.join(errors)]
+                return results
+
+            # -- // GPIO and single relay tasmota \\ --
+            else:
+                r = pwr.pwr_toggle(step.type, step.address, desired_state=desired_state, noff=step.outlet.get('noff', True))
+                if isinstance(r, bool):
+                    pwr.update_outlet_state(step.grp, r)
+                return [r]
+        except Exception as e:
+            log.error(f'[PWR SCHED] {step.grp} {step.type}:{step.address} {e.__class__.__name__}: {e}')
+            return [f'{e.__class__.__name__}: {e}' for _ in batch]
@@ -0,0 +1,54 @@
+#!/etc/ConsolePi/venv/bin/python3
+
+import copy
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+
+class PowerState:
+    '''Versioned copy-on-write store for outlet data (Outlets.data).
+
+    Readers get the current snapshot, which is never modified once published.  Readers never
+    block and never see a partially applied update.  Snapshots should be treated as read-only.
+
+    Writers make changes within update(), which provides a private copy of the current snapshot.
+    The copy is published (and version incremented) when the block exits, or discarded if an
+    exception occurs.  Writers are serialized.  update() can be nested in the same thread, the
+    nested block shares the outer blocks copy which is published when the outer block exits.
+
+        with pwr.state.update() as data:
+            data['defined'][grp]['is_on'] = True
+    '''
+
+    def __init__(self, data: Dict[str, Any] = None):
+        self._data: Dict[str, Any] = data if data is not None else {}
+        self.version = 0
+        self._lock = threading.RLock()
+        self._working: Dict[str, Any] = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        '''Return the current (read-only) snapshot.'''
+        return self._data
+
+    @contextmanager
+    def update(self) -> Iterator[Dict[str, Any]]:
+        '''Context manager providing a copy of the current snapshot to modify, published on exit.'''
+        with self._lock:
+            if self._working is not None:  # nested update in same thread
+                yield self._working
+                return
+
+            self._working = copy.deepcopy(self._data)
+            try:
+                yield self._working
+                self._data = self._working
+                self.version += 1
+            finally:
+                self._working = None
+
+    def replace(self, data: Dict[str, Any]) -> None:
+        '''Publish data as the new snapshot (i.e. data from the power broker).'''
+        with self._lock:
+            self._data = data
+            self.version += 1
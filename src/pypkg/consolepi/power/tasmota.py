@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import time
+from typing import Dict, List, Union
+
+import requests
+
+from consolepi.power.resolver import CONNECT_TIMEOUT, resolver
+
+TASMOTA_TIMEOUT = 3
+
+
+class Tasmota:
+    '''Driver for Tasmota flashed smart outlets.
+
+    Supports single and multi-relay devices.  Relays are referenced by number (Tasmota Power<x> index),
+    relay 1 is the only relay on single relay devices.
+
+    The state of all relays is gathered in a single request (Status 11), and changes to multiple
+    relays are sent in a single request via Backlog.
+    '''
+
+    def __init__(self, timeout: int = TASMOTA_TIMEOUT, log=logging.getLogger(__name__)):
+        self.timeout = timeout
+        self.log = log
+        self.headers = {
+            'Cache-Control': "no-cache",
+            'Connection': "keep-alive",
+            'cache-control': "no-cache"
+        }
+
+    def _req(self, address: str, cmnd: str) -> Union[dict, str]:
+        '''Send command to tasmota device.
+
+        returns dict (json response) or str with error text.
+        '''
+        url = f'http://{resolver.netloc(address)}/cm'
+        try:
+            response = requests.request("GET", url, headers=self.headers, params={'cmnd': cmnd},
+                                        timeout=(CONNECT_TIMEOUT, self.timeout))
+            if response.status_code == 200:
+                try:
+                    return json.loads(response.text or '{}')
+                except ValueError:
+                    return 'invalid response returned {}'.format(response.text)
+            else:
+                return '[{}] error returned {}'.format(response.status_code, response.text)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            resolver.invalidate(address)
+            return 'Unreachable'
+        except requests.exceptions.RequestException as e:
+            self.log.debug(f"[tasmota_req] {address} Exception: {e}")
+            return 'Unreachable ~ hit catchall exception handler'
+
+    @staticmethod
+    def parse_power(data: dict) -> Dict[int, bool]:
+        '''Parse relay states from tasmota response.
+
+        Handles both the Status 11 format {"StatusSTS": {"POWER1": "ON", ...}} and the
+        Power format {"POWER": "ON"} | {"POWER1": "ON", "POWER2": "OFF"}.
+
+        returns dict {relay(int): state(bool)}
+        '''
+        data = data.get('StatusSTS', data) if isinstance(data, dict) else {}
+        states = {}
+        for k, v in data.items():
+            if not k.upper().startswith('POWER') or v not in ['ON', 'OFF']:
+                continue
+            relay = k[5:]
+            if relay == '':
+                states[1] = v == 'ON'
+            elif relay.isdigit():
+                states[int(relay)] = v == 'ON'
+
+        return states
+
+    def status(self, address: str) -> Union[Dict[int, bool], str]:
+        '''Get state of all relays on the device with a single request.
+
+        returns dict {relay(int): state(bool)} or str with error text.
+        '''
+        r = self._req(address, 'Status 11')
+        if isinstance(r, str):
+            return r
+
+        states = self.parse_power(r)
+        if not states:  # Should not happen, but older firmware may not include POWER in Status 11
+            r = self._req(address, 'Power0')
+            if isinstance(r, str):
+                return r
+            states = self.parse_power(r)
+
+        return states if states else 'invalid state returned {}'.format(r)
+
+    def operate(self, address: str, relays: Dict[int, Union[bool, str]]) -> Union[Dict[int, bool], str]:
+        '''Change the state of one or more relays.
+
+        Changes to multiple relays are combined into a single Backlog command.
+
+        params:
+            relays: dict {relay(int): command} where command is True|'ON', False|'OFF' or 'TOGGLE'
+
+        returns dict {relay(int): state(bool)} or str with error text.
+        '''
+        cmds = []
+        for relay, command in relays.items():
+            if isinstance(command, bool):
+                command = 'ON' if command else 'OFF'
+            if str(command).upper() not in ['ON', 'OFF', 'TOGGLE']:
+                return f'[PWR-TASMOTA] DEV Note: Invalid command \'{command}\' passed to func'
+            cmds.append(f'Power{relay} {command.upper()}')
+
+        r = self._req(address, cmds[0] if len(cmds) == 1 else f"Backlog {'; '.join(cmds)}")
+        if isinstance(r, str):
+            return r
+
+        states = self.parse_power(r)
+        # Backlog commands are executed by the device after the response is sent, response lacks state
+        if [relay for relay in relays if relay not in states]:
+            time.sleep(0.25 * len(cmds))
+            states = self.status(address)
+
+        return states
+
+    def cycle(self, address: str, relays: List[int], cycle_time: int = 3) -> Union[Dict[int, bool], bool, str]:
+        '''Cycle power on any relays that are currently on.
+
+        returns dict {relay(int): state(bool)}, False if all relays were off (cycle is not valid)
+        or str with error text.
+        '''
+        cur = self.status(address)
+        if isinstance(cur, str):
+            return cur
+        relays_on = [r for r in relays if cur.get(r)]
+        if not relays_on:
+            return False
+
+        r = self.operate(address, {r: False for r in relays_on})
+        if isinstance(r, str):
+            return r
+        elif [relay for relay in relays_on if r.get(relay) is not False]:
+            return '[PWR-TASMOTA] Unexpected response, port returned on state expected off'
+
+        time.sleep(cycle_time)
+        r = self.operate(address, {r: True for r in relays_on})
+        return r if isinstance(r, str) else {**cur, **r}
@@ -6,7 +6,7 @@ from typing import Any, Dict, List, Union
 from halo import Halo
 from sys import stdin
 from log_symbols import LogSymbols as log_sym  # Enum
-from consolepi import utils, log, config, json  # type: ignore
+from consolepi import utils, log, config, json, codec, metrics  # type: ignore
 from aiohttp import ClientSession
 import asyncio
 from aiohttp.client_exceptions import ContentTypeError, ClientConnectorError
@@ -18,6 +18,30 @@ from aiohttp.client_exceptions import ContentTypeError, ClientConnectorError
 # from .models import Remote
 
 
+API_ADAPTER_FIELDS = [
+    "config",
+    "outlets",
+    "udev.devname",
+    "udev.id_model",
+    "udev.id_model_from_database",
+    "udev.id_serial_short",
+    "udev.id_vendor",
+    "udev.id_vendor_from_database",
+    "udev.id_usb_driver",
+]
+
+
+API_SNAPSHOT_ID_FIELDS = [
+    "hostname",
+    "cpuserial",
+    "api_version",
+    "revision",
+    "interfaces",
+]
+API_SNAPSHOT_FIELDS = [*API_SNAPSHOT_ID_FIELDS, *[f"adapters.*.{f}" for f in API_ADAPTER_FIELDS]]
+API_SNAPSHOT_FULL_FIELDS = [*API_SNAPSHOT_ID_FIELDS, "adapters"]  # full udev (rename menu / show adapter details)
+
+
 class Remotes:
     """Remotes Object Contains attributes for discovered remote ConsolePis
 
@@ -84,7 +108,12 @@ class Remotes:
                 self.spin.stop()
                 self.spin.start(f"verifying {remotepi}")
             self.running_spinners += [remotepi]
+            _start = time.perf_counter()
             res = await self.api_reachable(remotepi, this, rename=rename)
+            metrics.observe(
+                'consolepi_remote_verify_seconds', time.perf_counter() - _start,
+                remote=remotepi, result='reachable' if res.reachable else 'unreachable'
+            )
             _ = self.running_spinners.pop(self.running_spinners.index(remotepi))
             if stdin.isatty():  # restore spin text to any spinners that are still runnning
                 self.spin.stop() if res.reachable else self.spin.fail(f'verifying {remotepi}')
@@ -145,6 +174,7 @@ class Remotes:
                 )
 
             _ = await asyncio.gather(*[verify_remote(remotepi, data, rename) for remotepi in data])
+            metrics.save()  # verification is done by the menu/mdns processes, saved for the API (/metrics)
 
         # update local cache if any ConsolePis found UnReachable
         if self.cache_update_pending:
@@ -425,37 +455,31 @@ class Remotes:
 
         return remote_consoles
 
-    async def get_adapters_via_api(self, ip: str, port: int = 5000, rename: bool = False, log_host: str = None):
-        """Send RestFul GET request to Remote ConsolePi to collect adapter info
+    async def _api_get(self, ip: str, port: int, path: str, log_host: str = None) -> tuple:
+        """Send RestFul GET request to Remote ConsolePi API
 
         params:
         ip(str): ip address or FQDN of remote ConsolePi
-        rename(bool): TODO
+        path(str): url path (and query) i.e. /api/v1.0/adapters
         log_host(str): friendly string for logging purposes "hostname(ip)"
 
         returns:
-        adapter dict for remote if successful and adapters exist
-        status_code 200 if successful but no adapters or Falsey or response status_code if an error occurred.
-        22 if unable to reach API, but can reach port 22 (ssh)
+        tuple (status_code, payload) status_code is None if unable to reach API, payload is None if
+        the request failed or payload could not be decoded.
         """
-        if not log_host:
-            log_host = ip
-        url = f"http://{ip}:{port}/api/v1.0/adapters"
-        if rename:
-            url = f"{url}?refresh=true"
-
+        log_host = log_host or ip
+        url = f"http://{ip}:{port}{path}"
         log.debug(url)
 
         headers = {
-            "Accept": "*/*",
             "Cache-Control": "no-cache",
             "Host": f"{ip}:{port}",
-            "accept-encoding": "gzip, deflate",
             "Connection": "keep-alive",
             "cache-control": "no-cache",
+            **codec.request_headers(),  # Accept (msgpack if available), accept-encoding
         }
 
-        ret = None
+        status = payload = None
         try:
             _start = time.perf_counter()
             async with ClientSession() as client:
@@ -466,32 +490,97 @@ class Remotes:
                     timeout=getattr(config.remote_timeout, log_host),
                 )
                 _elapsed = time.perf_counter() - _start
+                status = resp.status
                 if resp.ok:
                     try:
-                        ret = await resp.json()
-                        ret = ret["adapters"] if ret["adapters"] else resp.status
-                        _msg = f"Adapters Successfully retrieved via API for Remote ConsolePi: {log_host}, elapsed {_elapsed:.2f}s"
-                        log.info("[API RQST OUT] {}".format(_msg))
+                        payload = codec.loads(await resp.read(), resp.headers.get("content-type"))
+                        log.info(f"[API RQST OUT] {path.split('?')[0]} Successfully retrieved via API for Remote ConsolePi: {log_host}, elapsed {_elapsed:.2f}s")
                         log.debugv(
                             "[API RQST OUT] Response: \n{}".format(
-                                json.dumps(ret, indent=4, sort_keys=True)
+                                json.dumps(payload, indent=4, sort_keys=True, default=str)
                             )
                         )
-                    except (json.decoder.JSONDecodeError, ContentTypeError):
+                    except (ValueError, ContentTypeError):
                         log.error(f'[API RQST OUT] Puked on payload from {log_host} \n{await resp.text()}')
-                        ret = resp.status
         except (asyncio.TimeoutError, ClientConnectorError):
             log.warning(f"[API RQST OUT] Remote ConsolePi: {log_host} TimeOut when querying via API - Unreachable.")
         except Exception as e:
-            log.show(f'Exception: {e.__class__.__name__}, in remotes.get_adapters_via_api() check logs')
+            log.show(f'Exception: {e.__class__.__name__}, in remotes._api_get() check logs')
             log.exception(e)
 
+        return status, payload
+
+    async def get_adapters_via_api(self, ip: str, port: int = 5000, rename: bool = False, log_host: str = None):
+        """Send RestFul GET request to Remote ConsolePi to collect adapter info
+
+        params:
+        ip(str): ip address or FQDN of remote ConsolePi
+        rename(bool): refresh adapter data on the remote first (after remote rename), and get the full adapter data
+        log_host(str): friendly string for logging purposes "hostname(ip)"
+
+        returns:
+        adapter dict for remote if successful and adapters exist
+        status_code 200 if successful but no adapters or Falsey or response status_code if an error occurred.
+        22 if unable to reach API, but can reach port 22 (ssh)
+        """
+        # only the fields used by the menu are requested (older ConsolePis ignore fields and send everything)
+        # rename menu gets the full record (udev details are displayed)
+        path = f"/api/v1.0/adapters?fields={','.join(API_ADAPTER_FIELDS)}" if not rename else "/api/v1.0/adapters?refresh=true"
+
+        status, payload = await self._api_get(ip, port, path, log_host=log_host)
+        ret = None if not status or status >= 300 else status
+        if isinstance(payload, dict) and payload.get("adapters"):
+            ret = payload["adapters"]
+
         if not ret:  # hit an exception / or not reachable
             if utils.is_reachable(ip, port=22, silent=True):
                 ret = 22  # indicates only available via ssh
 
         return ret
 
+    async def get_snapshot_via_api(self, ip: str, port: int = 5000, rename: bool = False, log_host: str = None):
+        """Send RestFul GET request to Remote ConsolePi to collect adapters, interfaces, and identity in one request
+
+        params:
+        ip(str): ip address or FQDN of remote ConsolePi
+        rename(bool): refresh adapter data on the remote first (after remote rename), and get the full adapter data
+        log_host(str): friendly string for logging purposes "hostname(ip)"
+
+        returns:
+        snapshot dict if successful, otherwise the same as get_adapters_via_api (falls back to adapters
+        endpoint for remotes running a version of ConsolePi prior to the snapshot endpoint).
+        """
+        path = f"/api/v1.0/snapshot?fields={','.join(API_SNAPSHOT_FIELDS if not rename else API_SNAPSHOT_FULL_FIELDS)}"
+        if rename:
+            path = f"{path}&refresh=true"
+
+        status, payload = await self._api_get(ip, port, path, log_host=log_host)
+        if status == 404:
+            log.debug(f"[API RQST OUT] {log_host or ip} does not support snapshot endpoint, falling back to adapters")
+            return await self.get_adapters_via_api(ip, port=port, rename=rename, log_host=log_host)
+        elif isinstance(payload, dict) and "adapters" in payload:
+            return payload
+
+        if status and status < 300:
+            return status
+        elif utils.is_reachable(ip, port=22, silent=True):
+            return 22  # indicates only available via ssh
+
+    @staticmethod
+    def merge_udev(adapters: dict, cached: dict) -> dict:
+        """Merge projected udev (API_ADAPTER_FIELDS) into the full udev already cached for the same adapter.
+
+        The full udev is retrieved by the rename menu, it's retained so the projected data
+        doesn't overwrite it.
+        """
+        for a in adapters:
+            _udev, _cached = adapters[a].get("udev"), cached.get(a, {}).get("udev")
+            if not isinstance(_udev, dict) or not isinstance(_cached, dict):
+                continue
+            if all(_cached.get(k) == _udev.get(k) for k in ["id_serial_short", "id_model"]):  # same physical adapter
+                adapters[a]["udev"] = {**_cached, **_udev}
+        return adapters
+
     async def api_reachable(self, remote_host: str, cache_data: dict, rename: bool = False):
         """Check Rechability & Fetch adapter data via API for remote ConsolePi
 
@@ -537,7 +626,31 @@ class Remotes:
         rem_ip = _adapters = None
         for _ip in rem_ip_list:
             log.debug(f"[API_REACHABLE] verifying {remote_host}")
-            _adapters = await self.get_adapters_via_api(_ip, port=int(cache_data.get("api_port", 5000)), rename=rename, log_host=f"{remote_host}({_ip})")
+            _adapters = await self.get_snapshot_via_api(_ip, port=int(cache_data.get("api_port", 5000)), rename=rename, log_host=f"{remote_host}({_ip})")
+            if isinstance(_adapters, dict) and "revision" in _adapters:  # snapshot (vs. adapters from older remote)
+                _snap = _adapters
+                if _snap.get("hostname") and _snap["hostname"] != remote_host:
+                    log.warning(
+                        f"[API_REACHABLE] {remote_host} {_ip} responded as {_snap['hostname']}, ip is no longer used by {remote_host}"
+                    )
+                    _adapters = None
+                    continue
+                if cache_data.get("cpuserial") and _snap.get("cpuserial") and _snap["cpuserial"] != cache_data["cpuserial"]:
+                    log.warning(
+                        f"[API_REACHABLE] Hostname collision, {remote_host} {_ip} has cpuserial {_snap['cpuserial']} "
+                        f"cached data is from {cache_data['cpuserial']}.  Multiple ConsolePis are using the same hostname.",
+                        show=True,
+                    )
+                    cache_data["cpuserial"] = _snap["cpuserial"]
+                    update = True
+                if _snap.get("interfaces") and _snap["interfaces"] != cache_data.get("interfaces"):
+                    cache_data["interfaces"] = _snap["interfaces"]
+                    update = True  # --> Update if interfaces changed (previously only updated via mdns/cloud)
+                if _snap.get("revision") != cache_data.get("revision"):
+                    cache_data["revision"] = _snap["revision"]
+                    update = True
+                _adapters = _snap["adapters"] or 200
+
             if _adapters:
                 rem_ip = _ip  # Remote is reachable
                 if not isinstance(_adapters, int):  # indicates status_code returned (error or no adapters found)
@@ -548,6 +661,8 @@ class Remotes:
                                 f"{remote_host} provided old api schema.  Recommend Upgrading to current."
                             )
                             self.old_api_log_sent = True
+                    if not rename and cache_data.get("adapters"):
+                        _adapters = self.merge_udev(_adapters, cache_data["adapters"])
                     # Only compare config dict for each adapter as udev dict will generally be different due to time_since_init
                     if not cache_data.get("adapters") or {
                         a: {"config": _adapters[a].get("config", {})} for a in _adapters
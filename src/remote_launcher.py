@@ -11,14 +11,35 @@ try:
     import subprocess
     import time
     sys.path.insert(0, '/etc/ConsolePi/src/pypkg')
-    from consolepi import config, utils  # type: ignore # NoQA
-    from consolepi.consolepi import ConsolePi  # type: ignore # NoQA
-    cpi = ConsolePi(bypass_remotes=True)
+    from consolepi import utils, log  # type: ignore # NoQA
+    from consolepi.localapi import LocalAPI, LocalAPIUnavailable  # type: ignore # NoQA
 except (KeyboardInterrupt, EOFError):
     print("Operation Aborted")
     exit(0)
 
 
+def get_adapters(refresh: bool = False) -> dict:
+    '''Return local adapters from the running API (unix socket), built locally if the API is not running.
+
+    The Config is only built if the API is not running, or the device has linked outlets.
+    '''
+    try:
+        return LocalAPI().get('adapters', refresh='true' if refresh else None, fields='config,outlets')['adapters']
+    except LocalAPIUnavailable as e:
+        log.debug(f'[LOCAL API] API not available, collecting adapters locally {e}')
+        from consolepi.local import Local  # type: ignore # NoQA
+        local = Local()
+        return local.adapters if not refresh else local.build_adapter_dict(refresh=True)
+
+
+def get_cpiexec():
+    '''ConsolePiExec for auto power-on of linked outlets (only power is initialized).'''
+    from consolepi import config  # type: ignore # NoQA
+    from consolepi.power import Outlets  # type: ignore # NoQA
+    from consolepi.exec import ConsolePiExec  # type: ignore # NoQA
+    return ConsolePiExec(config, Outlets(), None, None)
+
+
 def find_procs_by_name(name, dev):
     "Return a list of processes matching 'name'."
     ppid = None
@@ -69,11 +90,10 @@ if __name__ == '__main__':
     # Allow user to ssh to configured port which using ForceCommand and specifying only the device they want to connect to
     if len(sys.argv) == 2 and "picocom" not in sys.argv[1]:
         _device = f'/dev/{sys.argv[1].replace("/dev/", "")}'
-        adapter_data = cpi.local.adapters.get(_device)
+        adapter_data = get_adapters().get(_device)
         if not adapter_data:
             print(f'{_device.replace("/dev/", "")} Not found on system... Refreshing local adapters.')
-            cpi.local.build_adapter_dict(refresh=True)
-            adapter_data = cpi.local.adapters.get(_device)
+            adapter_data = get_adapters(refresh=True).get(_device)
 
         if adapter_data:
             print(f'Establishing Connection to {_device.replace("/dev/", "")}...')
@@ -85,12 +105,15 @@ if __name__ == '__main__':
     elif len(sys.argv) >= 3:
         _cmd = sys.argv[1:]
         _device = f'/dev/{sys.argv[2].replace("/dev/", "")}'
+        adapter_data = get_adapters().get(_device, {})
 
     ppid = check_hung_process(_cmd[0], _device)
 
     if ppid is None:
-        # if power feature enabled and adapter linked - ensure outlet is on
+        # if power feature enabled and adapter linked - ensure outlet is on (outlets are only populated if power is enabled)
         # TODO try/except block here
-        if config.power:
-            cpi.cpiexec.exec_auto_pwron(_device)
+        if adapter_data.get('outlets'):
+            cpiexec = get_cpiexec()
+            cpiexec.exec_auto_pwron(_device)
+            cpiexec.wait_for_ready(_device, ' '.join(_cmd))
         subprocess.run(_cmd)
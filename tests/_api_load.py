@@ -0,0 +1,119 @@
+#!/etc/ConsolePi/venv/bin/python3
+
+"""ConsolePi API load test.
+
+Sends requests to the API from --concurrency clients (keep-alive) for --duration seconds per endpoint
+and reports requests/sec and latency percentiles.  The hardware model (Pi hardware class), worker count
+and encoding are included in the results so runs on different hardware can be compared.
+
+    usage: _api_load.py [--host 127.0.0.1] [--port 5000] [--paths /api/v1.0/adapters,/api/v1.0/snapshot]
+                        [--concurrency 16] [--duration 10] [--msgpack] [--gzip] [--json]
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from aiohttp import ClientSession, TCPConnector
+
+DEFAULT_PATHS = '/api/v1.0/adapters,/api/v1.0/details,/api/v1.0/interfaces,/api/v1.0/snapshot'
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Load test the ConsolePi API')
+    parser.add_argument('--host', default='127.0.0.1', help='API host')
+    parser.add_argument('--port', type=int, default=5000, help='API port')
+    parser.add_argument('--paths', default=DEFAULT_PATHS, help='comma separated list of paths to test')
+    parser.add_argument('--concurrency', type=int, default=16, help='number of concurrent clients')
+    parser.add_argument('--duration', type=float, default=10, help='seconds to run each path')
+    parser.add_argument('--msgpack', action='store_true', help='request msgpack encoding')
+    parser.add_argument('--gzip', action='store_true', help='request compressed responses')
+    parser.add_argument('--json', action='store_true', help='output results as json')
+    return parser.parse_args()
+
+
+def hw_model() -> str:
+    model = Path('/proc/device-tree/model')
+    return model.read_text().rstrip('\x00') if model.exists() else f'{platform.system()} {platform.machine()}'
+
+
+def percentile(values: List[float], pct: float) -> float:
+    values = sorted(values)
+    if not values:
+        return 0
+    idx = min(len(values) - 1, max(0, int(round(pct / 100 * len(values) + 0.5)) - 1))
+    return values[idx]
+
+
+async def run_path(args, path: str) -> Dict[str, Any]:
+    headers = {
+        'Accept': 'application/msgpack' if args.msgpack else 'application/json',
+        'Accept-Encoding': 'gzip' if args.gzip else 'identity',
+    }
+    url = f'http://{args.host}:{args.port}{path}'
+    times: List[float] = []
+    errors = 0
+    size = 0
+    end = time.perf_counter() + args.duration
+
+    async def client(session: ClientSession):
+        nonlocal errors, size
+        while time.perf_counter() < end:
+            start = time.perf_counter()
+            try:
+                async with session.get(url, headers=headers) as resp:
+                    body = await resp.read()
+                    if resp.status != 200:
+                        errors += 1
+                        continue
+                    size = len(body)
+            except Exception:
+                errors += 1
+                continue
+            times.append(time.perf_counter() - start)
+
+    _start = time.perf_counter()
+    async with ClientSession(connector=TCPConnector(limit=args.concurrency), auto_decompress=False) as session:
+        await asyncio.gather(*[client(session) for _ in range(args.concurrency)])
+    elapsed = time.perf_counter() - _start
+
+    return {
+        'requests': len(times),
+        'errors': errors,
+        'rps': round(len(times) / elapsed, 1),
+        'bytes': size,
+        'p50': round(percentile(times, 50) * 1000, 2),  # ms
+        'p95': round(percentile(times, 95) * 1000, 2),
+        'p99': round(percentile(times, 99) * 1000, 2),
+    }
+
+
+async def main() -> int:
+    args = get_args()
+    results = {
+        'hardware': hw_model(),
+        'concurrency': args.concurrency,
+        'encoding': f"{'msgpack' if args.msgpack else 'json'}{'+gzip' if args.gzip else ''}",
+        'paths': {},
+    }
+    for path in [p.strip() for p in args.paths.split(',') if p.strip()]:
+        results['paths'][path] = await run_path(args, path)
+
+    if args.json:
+        print(json.dumps(results, indent=4))
+    else:
+        print(f"\n-- {results['hardware']} -- concurrency {args.concurrency} -- {results['encoding']} --")
+        print(f"{'path':<32}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'bytes':>10}{'errors':>8}")
+        for path, r in results['paths'].items():
+            print(f"{path:<32}{r['rps']:>10}{r['p50']:>10}{r['p95']:>10}{r['p99']:>10}{r['bytes']:>10}{r['errors']:>8}")
+
+    return 1 if [r for r in results['paths'].values() if not r['requests']] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
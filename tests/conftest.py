@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# test the consolepi package in this checkout (/etc/ConsolePi/src/pypkg on a ConsolePi)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src' / 'pypkg'))
@@ -0,0 +1,55 @@
+"""Tests for the API RefreshCache."""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from consolepi.cache import RefreshCache
+
+
+def get_cancelled(cache: RefreshCache, executor: ThreadPoolExecutor, key: str):
+    '''cache.get(key) with the refresh cancelled by the executor shutting down before it runs.'''
+    async def main():
+        release = threading.Event()
+        executor.submit(release.wait, 5)  # occupies the only worker, the refresh is queued behind it
+        task = asyncio.ensure_future(cache.get(key, refresh=True))
+        await asyncio.sleep(0.05)
+        executor.shutdown(wait=False, cancel_futures=True)
+        release.set()
+        return await asyncio.wait_for(task, 2)  # would time out if the waiters are never resolved
+
+    return asyncio.run(main())
+
+
+def test_refresh_cancelled_not_loaded():
+    executor = ThreadPoolExecutor(max_workers=1)
+    cache = RefreshCache(executor=executor)
+    cache.register('adapters', lambda: {'/dev/r1-switch': {}}, ttl=30)
+    with pytest.raises(RuntimeError):
+        get_cancelled(cache, executor, 'adapters')
+    assert cache.stats()['adapters']['errors'] == 1
+
+
+def test_refresh_cancelled_loaded():
+    '''The last value is returned if the refresh is cancelled.'''
+    executor = ThreadPoolExecutor(max_workers=1)
+    cache = RefreshCache(executor=executor)
+    cache.register('adapters', lambda: {'/dev/r2-router': {}}, ttl=30)
+    cache.prime('adapters', {'/dev/r1-switch': {}})
+    assert get_cancelled(cache, executor, 'adapters') == {'/dev/r1-switch': {}}
+    assert cache._entries['adapters'].future is None
+
+
+def test_refresh_coalesced():
+    executor = ThreadPoolExecutor(max_workers=2)
+    calls = []
+    cache = RefreshCache(executor=executor)
+    cache.register('adapters', lambda: calls.append(1) or len(calls), ttl=30)
+
+    async def main():
+        return await asyncio.gather(*[cache.get('adapters') for _ in range(5)])
+
+    assert asyncio.run(main()) == [1] * 5 and len(calls) == 1
+    executor.shutdown()
@@ -0,0 +1,42 @@
+from consolepi import codec
+
+ADAPTERS = {
+    '/dev/r1-switch': {'config': {'port': 7001, 'baud': 9600}, 'udev': {'devname': '/dev/ttyUSB0', 'time_since_init': 10}},
+    '/dev/r2-router': {'config': {'port': 7002, 'baud': 115200}, 'udev': {'devname': '/dev/ttyUSB1', 'time_since_init': 20}},
+}
+
+
+def test_project_unchanged():
+    assert codec.project(ADAPTERS) is ADAPTERS
+
+
+def test_project_fields():
+    data = codec.project(ADAPTERS, fields='/dev/r1-switch.config')
+    assert data == {'/dev/r1-switch': {'config': ADAPTERS['/dev/r1-switch']['config']}}
+
+
+def test_project_fields_prefix():
+    '''prefix '*' applies the paths to each adapter.'''
+    data = codec.project(ADAPTERS, fields='config.port, udev.devname', prefix='*')
+    assert data == {
+        '/dev/r1-switch': {'config': {'port': 7001}, 'udev': {'devname': '/dev/ttyUSB0'}},
+        '/dev/r2-router': {'config': {'port': 7002}, 'udev': {'devname': '/dev/ttyUSB1'}},
+    }
+
+
+def test_project_exclude():
+    data = codec.project(ADAPTERS, exclude=['*.udev', '/dev/r2-router.config.baud'])
+    assert data == {'/dev/r1-switch': {'config': {'port': 7001, 'baud': 9600}}, '/dev/r2-router': {'config': {'port': 7002}}}
+    assert 'udev' in ADAPTERS['/dev/r1-switch'] and 'baud' in ADAPTERS['/dev/r2-router']['config']  # source not modified
+
+
+def test_project_fields_and_exclude():
+    data = codec.project(ADAPTERS, fields='config,udev', exclude='udev.time_since_init', prefix='*')
+    assert data['/dev/r1-switch'] == {'config': ADAPTERS['/dev/r1-switch']['config'], 'udev': {'devname': '/dev/ttyUSB0'}}
+
+
+def test_revision_ignores_udev():
+    changed = {a: {**v, 'udev': {**v['udev'], 'time_since_init': 99}} for a, v in ADAPTERS.items()}
+    assert codec.revision(changed) == codec.revision(ADAPTERS)
+    changed['/dev/r1-switch'] = {**changed['/dev/r1-switch'], 'config': {'port': 7005, 'baud': 9600}}
+    assert codec.revision(changed) != codec.revision(ADAPTERS)
@@ -0,0 +1,192 @@
+"""Tests for the mDNS TXT record (consolepi.mdns encode_txt / decode_txt), discovery (mdns_browser) and the Debouncer."""
+
+import asyncio
+import importlib.util
+import json
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from consolepi import codec
+from consolepi.mdns import TXT_BUDGET, TXT_ENTRY_MAX, Debouncer, decode_txt, encode_txt
+
+LOCAL = {
+    'user': 'wade',
+    'api_port': 5010,
+    'cpuserial': '10000000abcdef01',
+    'interfaces': {
+        'eth0': {'ip': '10.0.30.41', 'mac': 'dc:a6:32:00:00:01', 'isgw': True},
+        'wlan0': {'ip': '10.3.0.1', 'mac': 'dc:a6:32:00:00:02', 'isgw': False},
+        '_ip_w_gw': '10.0.30.41',
+    },
+    'adapters': {f'/dev/r1-switch-{i}': {'config': {'port': 7000 + i, 'baud': 9600}} for i in range(4)},
+}
+
+
+def as_properties(txt: dict) -> dict:
+    '''TXT properties as received by the browser (bytes).'''
+    return {k.encode(): v.encode() for k, v in txt.items()}
+
+
+def size(txt: dict) -> int:
+    return sum([1 + len(k.encode()) + 1 + len(v.encode()) for k, v in txt.items()])
+
+
+def test_legacy_keys():
+    '''Keys used by older ConsolePis are included when they fit.'''
+    txt = encode_txt(LOCAL, 'ConsolePi-A')
+    assert txt['api_port'] == '5010' and txt['user'] == 'wade' and txt['cpuserial'] == LOCAL['cpuserial'], txt
+    assert size(txt) <= TXT_BUDGET
+
+
+def test_many_adapters():
+    '''With many adapters the record stays within budget and the compact keys are all included.'''
+    local = {**LOCAL, 'adapters': {f'/dev/r{i}-a-very-long-adapter-alias-{i}': {} for i in range(200)}}
+    txt = encode_txt(local, 'ConsolePi-A')
+    assert size(txt) <= TXT_BUDGET and max([len(f'{k}={v}'.encode()) for k, v in txt.items()]) <= TXT_ENTRY_MAX
+    assert {'hostname', 'rem_ip', 'v', 'p', 'r', 'h', 'n', 'u', 's', 'interfaces', 'a'} <= set(txt), txt.keys()
+
+
+def test_decode_compact():
+    data = decode_txt(as_properties(encode_txt(LOCAL, 'ConsolePi-A')))
+    assert data['hostname'] == 'ConsolePi-A' and data['rem_ip'] == '10.0.30.41'
+    assert data['api_port'] == 5010 and data['user'] == 'wade' and data['cpuserial'] == LOCAL['cpuserial']
+    assert data['adapters'] is None and len(data['adapter_summary']) == 4
+    assert data['interfaces'] == {'eth0': {'ip': '10.0.30.41'}, 'wlan0': {'ip': '10.3.0.1'}}
+
+
+def test_round_trip():
+    '''Revisions and adapter names survive encode -> decode.'''
+    data = decode_txt(as_properties(encode_txt(LOCAL, 'ConsolePi-A')))
+    assert data['revision'] == codec.revision(LOCAL['adapters'])
+    assert data['iface_revision'] == codec.interfaces_revision(LOCAL['interfaces'])
+    assert data['adapter_summary'] == [a.replace('/dev/', '') for a in LOCAL['adapters']]
+
+
+def test_round_trip_no_adapters():
+    data = decode_txt(as_properties(encode_txt({**LOCAL, 'adapters': {}}, 'ConsolePi-A')))
+    assert data['adapters'] == {} and data['adapter_summary'] == []
+
+
+def test_decode_compact_legacy_fallback():
+    '''Compact record without the compact keys, values from the legacy keys are used.'''
+    txt = {k: v for k, v in encode_txt(LOCAL, 'ConsolePi-A').items() if k not in ['p', 'u', 's']}
+    data = decode_txt(as_properties(txt))
+    assert data['api_port'] == 5010 and data['user'] == 'wade' and data['cpuserial'] == LOCAL['cpuserial'], data
+
+
+def test_decode_legacy():
+    '''Record from an older ConsolePi (json values, no v key).'''
+    txt = {
+        'hostname': 'ConsolePi-B', 'user': 'pi', 'api_port': '5000', 'rem_ip': '10.0.30.42',
+        'interfaces': json.dumps({'eth0': {'ip': '10.0.30.42'}}),
+        'adapters': json.dumps({'/dev/r2-switch': {'config': {'port': 7001}}}),
+    }
+    data = decode_txt(as_properties(txt))
+    assert data['user'] == 'pi' and data['api_port'] == '5000' and 'v' not in data
+    assert data['adapters']['/dev/r2-switch']['config']['port'] == 7001
+
+
+def load_browser():
+    spec = importlib.util.spec_from_file_location('mdns_browser', Path(__file__).resolve().parent.parent / 'src' / 'mdns_browser.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeRemotes:
+    '''Remotes, api_reachable answers unreachable for the first `unreachable` calls.'''
+
+    def __init__(self, unreachable: int = 1):
+        self.data = {}
+        self.unreachable = unreachable
+        self.calls = []
+
+    async def api_reachable(self, hostname, data):
+        self.calls.append(dict(data))
+        if len(self.calls) <= self.unreachable:
+            return SimpleNamespace(update=True, data=data, reachable=False)
+        data['revision'] = codec.revision(LOCAL['adapters'])  # from the snapshot
+        data['adapters'] = LOCAL['adapters']
+        return SimpleNamespace(update=True, data=data, reachable=True)
+
+    def update_local_cloud_file(self, remote_consoles):
+        return {**self.data, **remote_consoles}
+
+
+def test_unreachable_then_reachable():
+    '''An unreachable peer is verified again when it's next announced, the TXT revision is never cached.'''
+    mdns_browser = load_browser()
+    txt = as_properties(encode_txt(LOCAL, 'ConsolePi-A'))
+
+    class FakeInfo:
+        def __init__(self, service_type, name):
+            self.properties, self.port, self.server = txt, 5010, 'ConsolePi-A.local.'
+
+        async def async_request(self, zc, timeout):
+            return True
+
+        def parsed_addresses(self):
+            return ['10.0.30.41']
+
+    browser = mdns_browser.MDNS_Browser.__new__(mdns_browser.MDNS_Browser)
+    browser.cpi = SimpleNamespace(remotes=FakeRemotes(unreachable=1))
+    browser.aiozc, browser.show, browser.debug = SimpleNamespace(zeroconf=None), False, False
+    browser.d_discovered, browser.discovered, browser.no_adapters, browser.fingerprints = [], [], [], {}
+    name = f'ConsolePi-A.{mdns_browser.SERVICE_TYPE}'
+
+    async def announce():
+        browser.cache_lock = asyncio.Lock()
+        await browser.process(name)
+
+    remotes = browser.cpi.remotes
+    with mock.patch.object(mdns_browser, 'AsyncServiceInfo', FakeInfo), mock.patch.object(mdns_browser, 'metrics'):
+        asyncio.run(announce())  # unreachable
+        assert len(remotes.calls) == 1 and 'revision' not in remotes.calls[0], remotes.calls
+        assert 'revision' not in remotes.data.get('ConsolePi-A', {}), remotes.data
+        asyncio.run(announce())  # same announcement, now reachable
+        assert len(remotes.calls) == 2, remotes.calls
+        assert remotes.data['ConsolePi-A']['revision'] == codec.revision(LOCAL['adapters']), remotes.data
+        browser.fingerprints.clear()  # i.e. removed and announced again
+        asyncio.run(announce())  # revision matches the cache, API not queried
+        assert len(remotes.calls) == 2, remotes.calls
+
+
+
+def test_debounce_quiet():
+    '''Triggers within the quiet time run the function once, after the last trigger.'''
+    debouncer, calls = Debouncer(quiet=0.2, max_delay=5), []
+    for _ in range(5):
+        debouncer.trigger('refresh', lambda: calls.append(time.monotonic()))
+        time.sleep(0.02)
+    last = time.monotonic()
+    time.sleep(0.5)
+    assert len(calls) == 1 and calls[0] >= last + 0.15, calls
+
+
+def test_debounce_max_delay():
+    '''Continuous triggers run the function after max_delay rather than waiting for things to settle.'''
+    debouncer, ran = Debouncer(quiet=0.2, max_delay=0.3), threading.Event()
+    start = time.monotonic()
+    while not ran.is_set() and time.monotonic() - start < 2:
+        debouncer.trigger('refresh', ran.set)
+        time.sleep(0.05)
+    assert ran.is_set() and time.monotonic() - start < 1
+
+
+def test_debounce_keys():
+    '''Each key is debounced separately, a failing function doesn't stop the scheduler.'''
+    debouncer, calls = Debouncer(quiet=0.05, max_delay=1), []
+
+    def fail():
+        raise ValueError('failed')
+
+    debouncer.trigger('fail', fail)
+    debouncer.trigger('mdns', lambda: calls.append('mdns'))
+    debouncer.trigger('cloud', lambda: calls.append('cloud'))
+    time.sleep(0.3)
+    debouncer.trigger('mdns', lambda: calls.append('mdns'))
+    time.sleep(0.3)
+    assert sorted(calls) == ['cloud', 'mdns', 'mdns'], calls
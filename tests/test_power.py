@@ -0,0 +1,205 @@
+"""Tests for the power subsystem building blocks (no power controllers required)."""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from consolepi.power import PowerState, Tasmota
+from consolepi.power import scheduler
+from consolepi.power.broker import restore_keys
+from consolepi.power.scheduler import PowerScheduler
+
+
+# -- // PowerState \\ --
+def test_state_copy_on_write():
+    state = PowerState({'defined': {'lab': {'type': 'GPIO', 'address': 4, 'is_on': False}}})
+    before = state.snapshot()
+    with state.update() as data:
+        data['defined']['lab']['is_on'] = True
+        assert state.snapshot() is before  # not published until the block exits
+
+    assert before['defined']['lab']['is_on'] is False  # published snapshots are never modified
+    assert state.snapshot()['defined']['lab']['is_on'] is True and state.version == 1
+
+
+def test_state_update_exception_discarded():
+    state = PowerState({'defined': {'lab': {'is_on': False}}})
+    with pytest.raises(ValueError):
+        with state.update() as data:
+            data['defined']['lab']['is_on'] = True
+            raise ValueError('abort')
+
+    assert state.snapshot()['defined']['lab']['is_on'] is False and state.version == 0
+
+
+def test_state_nested_update():
+    '''A nested update shares the outer copy, which is published once.'''
+    state = PowerState({'a': 1, 'b': 1})
+    with state.update() as outer:
+        outer['a'] = 2
+        with state.update() as inner:
+            assert inner is outer
+            inner['b'] = 2
+        assert state.snapshot() == {'a': 1, 'b': 1}
+
+    assert state.snapshot() == {'a': 2, 'b': 2} and state.version == 1
+
+
+def test_state_concurrent_updates():
+    '''Writers are serialized, no update is lost.'''
+    state = PowerState({'count': 0})
+
+    def incr():
+        for _ in range(100):
+            with state.update() as data:
+                data['count'] += 1
+
+    threads = [threading.Thread(target=incr) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert state.snapshot()['count'] == 400 and state.version == 400
+
+
+# -- // PowerScheduler \\ --
+class FakeOutlets:
+    '''Stands in for Outlets, records operations performed by the scheduler.'''
+
+    def __init__(self, delay: float = 0.1):
+        self.delay = delay
+        self.ops = []
+
+    def dli_ready(self, address):
+        return True
+
+    def pwr_toggle(self, pwr_type, address, desired_state=None, port=None, noff=True):
+        self.ops.append((pwr_type, address, port, desired_state))
+        time.sleep(self.delay)
+        return desired_state if not isinstance(port, list) or pwr_type == 'dli' else {p: desired_state for p in port}
+
+    def update_dli_state(self, address, ports, state):
+        pass
+
+    def update_outlet_state(self, grp, state):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def sched_config(monkeypatch):
+    monkeypatch.setattr(scheduler, 'config', SimpleNamespace(power_stagger=0, power_circuits={}, power_max_parallel=4))
+
+
+def gpio(address, **kwargs):
+    return {'type': 'GPIO', 'address': address, **kwargs}
+
+
+def dli(ports, **kwargs):
+    return {'type': 'dli', 'address': '10.0.10.10', 'linked_devs': {'/dev/r1-switch': ports}, **kwargs}
+
+
+def test_order_depends_on():
+    outlets = {'a': gpio(1, depends_on='b'), 'b': gpio(2, depends_on=['c', 'not_operated']), 'c': gpio(3)}
+    sched = PowerScheduler(FakeOutlets(), circuits={})
+    assert sched.order(outlets) == ['c', 'b', 'a']
+    assert sched.order(outlets, reverse=True) == ['a', 'b', 'c']
+
+
+def test_order_depends_on_loop():
+    '''Groups in a dependency loop are appended in config order (after the groups that can be ordered).'''
+    outlets = {'a': gpio(1, depends_on='b'), 'b': gpio(2, depends_on='a'), 'c': gpio(3), 'd': gpio(4, depends_on='c')}
+    assert PowerScheduler(FakeOutlets(), circuits={}).order(outlets) == ['c', 'd', 'a', 'b']
+
+
+def test_build_steps_bulk():
+    outlets = {'core': dli([1, 2]), 'edge': dli(3), 'spare': dli([]), 'lab': gpio(4, depends_on='core')}
+    sched = PowerScheduler(FakeOutlets(), circuits={})
+    steps = sched.build_steps(outlets, True)
+    assert [(s.grp, s.ports, s.bulk) for s in steps] == [('core', [1, 2], True), ('edge', [3], True), ('lab', None, True)]
+    assert [s.grp for s in sched.build_steps(outlets, False)] == ['lab', 'edge', 'core']  # reversed powering off
+
+
+def test_build_steps_stagger():
+    '''Ports of an outlet with a stagger delay are switched one at a time (only when powering on).'''
+    outlets = {'core': dli([1, 2, 3], stagger=0.5)}
+    sched = PowerScheduler(FakeOutlets(), circuits={})
+    assert [(s.ports, s.bulk) for s in sched.build_steps(outlets, True)] == [([1], False), ([2], False), ([3], False)]
+    assert [(s.ports, s.bulk) for s in sched.build_steps(outlets, False)] == [([1, 2, 3], True)]
+
+
+def test_build_steps_inrush():
+    '''Ports on a budgeted circuit are separate steps, each with the inrush of the port.'''
+    outlets = {'core': dli([1, 2], circuit='rack1', inrush=4), 'other': dli([5], circuit='rack2', inrush=4)}
+    steps = PowerScheduler(FakeOutlets(), circuits={'rack1': 10}).build_steps(outlets, True)
+    assert [(s.grp, s.ports, s.bulk, s.inrush) for s in steps] == [
+        ('core', [1], False, 4), ('core', [2], False, 4), ('other', [5], True, 4)
+    ]
+
+
+def test_run_inrush_budget():
+    '''Outlets on a circuit are powered on one after the other when the budget only allows one.'''
+    outlets = {'a': gpio(1, circuit='rack1', inrush=4), 'b': gpio(2, circuit='rack1', inrush=4)}
+    timeline = PowerScheduler(FakeOutlets(), circuits={'rack1': 5}).run(outlets, True)
+    assert timeline[1]['start'] >= timeline[0]['end']
+
+    timeline = PowerScheduler(FakeOutlets(), circuits={'rack1': 10}).run(outlets, True)
+    assert timeline[1]['start'] < timeline[0]['end']  # within budget, operated concurrently
+
+
+def test_run_stagger():
+    outlets = {'core': dli([1, 2], stagger=0.2)}
+    pwr = FakeOutlets(delay=0.01)
+    timeline = PowerScheduler(pwr, circuits={}).run(outlets, True)
+    assert [t['ports'] for t in timeline] == [[1], [2]]
+    assert timeline[1]['start'] >= timeline[0]['end'] + 0.2 - 0.001  # timeline is rounded to ms
+    assert pwr.ops == [('dli', '10.0.10.10', [1], True), ('dli', '10.0.10.10', [2], True)]
+
+
+def test_run_depends_on():
+    outlets = {'a': gpio(1, depends_on='b'), 'b': gpio(2)}
+    pwr = FakeOutlets(delay=0.05)
+    PowerScheduler(pwr, circuits={}).run(outlets, True)
+    assert [op[1] for op in pwr.ops] == [2, 1]
+    pwr.ops = []
+    PowerScheduler(pwr, circuits={}).run(outlets, False)
+    assert [op[1] for op in pwr.ops] == [1, 2]
+
+
+# -- // Tasmota \\ --
+def test_tasmota_parse_power():
+    assert Tasmota.parse_power({'POWER': 'ON'}) == {1: True}
+    assert Tasmota.parse_power({'POWER1': 'ON', 'POWER2': 'OFF', 'Dimmer': 50}) == {1: True, 2: False}
+    assert Tasmota.parse_power({'StatusSTS': {'POWER1': 'OFF', 'POWER3': 'ON', 'Uptime': '0T01:00:00'}}) == {1: False, 3: True}
+
+
+def test_tasmota_parse_power_invalid():
+    assert Tasmota.parse_power({'POWER': 'TOGGLE', 'POWERX': 'ON'}) == {}
+    assert Tasmota.parse_power('Unreachable') == {}
+
+
+# -- // power broker \\ --
+def test_restore_keys():
+    '''Only dli and multi-relay tasmota port maps have their keys converted to int.'''
+    data = {
+        'defined': {
+            '1234': {'type': 'GPIO', 'address': 4, 'is_on': True, 'linked_devs': {'5678': None}},
+            'rack': {'type': 'dli', 'address': 'dli1', 'is_on': {'1': {'state': True}}, 'linked_devs': {'/dev/r1': [1]}},
+            'strip': {'type': 'tasmota', 'address': 'tas1', 'is_on': {'1': {'state': True}, '2': {'state': False}}},
+            'esp': {'type': 'esphome', 'address': 'esp1', 'is_on': {'1': {'state': True}}},
+        },
+        'dli_power': {'dli1': {'1': {'state': True}, '2': {'state': False}}},
+        'esp_power': {'esp1': {'1': {'state': True}}},
+    }
+    data = restore_keys(data)
+    assert list(data['defined']) == ['1234', 'rack', 'strip', 'esp']
+    assert list(data['defined']['1234']['linked_devs']) == ['5678']
+    assert list(data['defined']['rack']['is_on']) == [1] and list(data['defined']['strip']['is_on']) == [1, 2]
+    assert list(data['defined']['esp']['is_on']) == ['1'] and list(data['esp_power']['esp1']) == ['1']
+    assert list(data['dli_power']['dli1']) == [1, 2]
+
+
+def test_restore_keys_passthrough():
+    assert restore_keys(True) is True and restore_keys('[PWR-DLI] error') == '[PWR-DLI] error' and restore_keys(None) is None
+    assert restore_keys({'1': 'pong'}) == {'1': 'pong'}
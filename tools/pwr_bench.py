@@ -0,0 +1,177 @@
+#!/etc/ConsolePi/venv/bin/python3
+
+"""Power subsystem benchmark, drives Outlets against simulated power controllers (pwr_sim.py).
+
+Measures latency of Outlets init (outlet discovery), pwr_get_outlets, pwr_all (on/off) and
+auto power-on for each controller count, and reports throughput (controllers/sec) and latency
+percentiles per operation.
+
+Exits non-zero if the p95 latency of any operation exceeds --max-p95 (for use in CI to catch
+regressions).
+
+    usage: pwr_bench.py [--type {dli,dli-legacy,tasmota,esphome,mixed}] [--controllers 1,10,50,200]
+                         [--iterations 5] [--latency 0.02] [--jitter 0.01] [--fail-rate 0] [--drop-rate 0]
+                         [--max-p95 SECONDS] [--json]
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src' / 'pypkg'))  # /etc/ConsolePi/src/pypkg
+
+from pwr_sim import SIMULATORS, Faults  # NoQA
+from consolepi import config  # NoQA
+from consolepi.exec import ConsolePiExec  # NoQA
+from consolepi.power import Outlets  # NoQA
+
+BENCH_DEV = 'pwr_bench'  # all simulated outlets are linked to this device (auto power-on)
+OPERATIONS = ['init', 'pwr_get_outlets', 'pwr_all_off', 'pwr_all_on', 'auto_pwron']
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Benchmark ConsolePi power operations against simulated controllers')
+    parser.add_argument('--type', choices=[*SIMULATORS.keys(), 'mixed'], default='mixed', help='controller type to simulate')
+    parser.add_argument('--controllers', default='1,10,50,200', help='comma separated list of controller counts')
+    parser.add_argument('--iterations', type=int, default=5, help='iterations of each operation per controller count')
+    parser.add_argument('--latency', type=float, default=0.02, help='simulated response latency (seconds)')
+    parser.add_argument('--jitter', type=float, default=0.01, help='simulated random additional latency (seconds)')
+    parser.add_argument('--fail-rate', type=float, default=0, help='fraction of requests answered with 503')
+    parser.add_argument('--drop-rate', type=float, default=0, help='fraction of requests dropped without a response')
+    parser.add_argument('--seed', type=int, default=None, help='seed for latency/failure injection')
+    parser.add_argument('--max-p95', type=float, default=None, help='exit non-zero if the p95 latency of any operation exceeds this')
+    parser.add_argument('--json', action='store_true', help='output results as json')
+    return parser.parse_args()
+
+
+def build(kind: str, count: int, faults: Faults) -> tuple:
+    '''Start simulators and build the POWER config for them.
+
+    returns: tuple (list of simulators, dict POWER config)
+    '''
+    sims, power = [], {}
+    kinds = list(SIMULATORS.keys()) if kind == 'mixed' else [kind]
+    for i in range(count):
+        _kind = kinds[i % len(kinds)]
+        name = f'bench_{_kind}_{i}'
+        if _kind.startswith('dli'):
+            sim = SIMULATORS[_kind](outlets=8, faults=faults).start()
+            power[name] = {'type': 'dli', 'address': sim.address, 'username': 'admin', 'password': 'admin',
+                           'linked_devs': {BENCH_DEV: [1, 2]}}
+        elif _kind == 'tasmota':
+            sim = SIMULATORS[_kind](relays=4, faults=faults).start()
+            power[name] = {'type': 'tasmota', 'address': sim.address, 'relays': [1, 2, 3, 4], 'linked_devs': {BENCH_DEV: [1, 2]}}
+        else:
+            sim = SIMULATORS[_kind](relays=['relay1', 'relay2'], faults=faults).start()
+            power[name] = {'type': 'esphome', 'address': sim.address, 'relays': ['relay1', 'relay2'],
+                           'linked_devs': {BENCH_DEV: ['relay1']}}
+        sims.append(sim)
+
+    return sims, power
+
+
+def configure(power: Dict[str, Any], state_file: str) -> None:
+    '''Replace outlet configuration with the simulated controllers.'''
+    config.power = True
+    config.do_dli_menu = config.linked_exists = False
+    config.cfg_yml = {**config.cfg_yml, 'POWER': power}
+    config.static['POWER_STATE_FILE'] = state_file
+    config.outlets = config.get_outlets_from_file()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    values = sorted(values)
+    if not values:
+        return 0
+    idx = min(len(values) - 1, max(0, int(round(pct / 100 * len(values) + 0.5)) - 1))
+    return values[idx]
+
+
+def run(count: int, args, state_file: str) -> Dict[str, Any]:
+    faults = Faults(latency=args.latency, jitter=args.jitter, fail_rate=args.fail_rate, drop_rate=args.drop_rate, seed=args.seed)
+    sims, power = build(args.type, count, faults)
+    configure(power, state_file)
+    times: Dict[str, List[float]] = {op: [] for op in OPERATIONS}
+    errors: Dict[str, int] = {op: 0 for op in OPERATIONS}
+
+    def timed(op, func, *a, **kw):
+        start = time.perf_counter()
+        r = func(*a, **kw)
+        times[op].append(time.perf_counter() - start)
+        return r
+
+    try:
+        for _ in range(args.iterations):
+            pwr = None
+
+            def init():
+                nonlocal pwr
+                pwr = Outlets(use_broker=False)
+                return ConsolePiExec(config, pwr, None, None).wait_for_threads('init', timeout=60)
+
+            if timed('init', init):
+                errors['init'] += 1
+            cpiexec = ConsolePiExec(config, pwr, None, None)
+
+            data = timed('pwr_get_outlets', pwr.pwr_get_outlets, upd_linked=True)
+            errors['pwr_get_outlets'] += len(data.get('failures', {}))
+            for op, state in [('pwr_all_off', False), ('pwr_all_on', True)]:
+                r = timed(op, pwr.pwr_all, action='toggle', desired_state=state)
+                errors[op] += 1 if isinstance(r, str) else len([x for x in r if isinstance(x, str)])
+
+            pwr.pwr_all(action='toggle', desired_state=False)
+            timed('auto_pwron', cpiexec.auto_pwron_thread, f'/dev/{BENCH_DEV}')
+            errors['auto_pwron'] += len([t for t in pwr.timeline if isinstance(t['result'], str)])
+
+            pwr.dli_close_all()
+            if pwr.esp:
+                pwr.esp.stop()
+    finally:
+        for sim in sims:
+            sim.stop()
+
+    return {
+        op: {
+            'controllers': count,
+            'iterations': len(times[op]),
+            'errors': errors[op],
+            'throughput': round(count * len(times[op]) / sum(times[op]), 2) if sum(times[op]) else 0,  # controllers/sec
+            'p50': round(percentile(times[op], 50), 4),
+            'p95': round(percentile(times[op], 95), 4),
+            'p99': round(percentile(times[op], 99), 4),
+            'max': round(max(times[op] or [0]), 4),
+        } for op in OPERATIONS
+    }
+
+
+def main() -> int:
+    args = get_args()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in [int(c) for c in args.controllers.split(',')]:
+            results[count] = run(count, args, str(Path(tmp) / '.power_state.json'))
+            if not args.json:
+                print(f'\n-- {count} {args.type} controller(s) -- latency {args.latency}s jitter {args.jitter}s '
+                      f'fail {args.fail_rate} drop {args.drop_rate} --')
+                print(f"{'operation':<16}{'ctrl/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}{'errors':>8}")
+                for op, r in results[count].items():
+                    print(f"{op:<16}{r['throughput']:>10}{r['p50']:>10}{r['p95']:>10}{r['p99']:>10}{r['max']:>10}{r['errors']:>8}")
+
+    if args.json:
+        print(json.dumps(results, indent=4))
+
+    if args.max_p95 is not None:
+        slow = [f'{c}:{op} p95 {r["p95"]}' for c in results for op, r in results[c].items() if r['p95'] > args.max_p95]
+        if slow:
+            print(f'\nFAIL p95 latency exceeds {args.max_p95}s: {", ".join(slow)}', file=sys.stderr)
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,329 @@
+#!/etc/ConsolePi/venv/bin/python3
+
+"""Simulated power controllers for exercising the power subsystem without hardware.
+
+In-process HTTP servers emulating:
+    DLIRestSim:     dli web power switch (rest API), includes matrix (=0,1,4) selectors
+    DLILegacySim:   older dli (screen-scrape via dlipower)
+    TasmotaSim:     Tasmota /cm?cmnd= (Power<x>, Power0, Status 11, Backlog)
+    ESPHomeSim:     espHome web_server REST (/switch/<id>) and /events (Server Sent Events)
+
+Each simulator accepts a Faults instance to inject latency, jitter and failures.  The
+simulators use only the standard library, and are used by pwr_bench.py.
+
+    sim = DLIRestSim(outlets=8, faults=Faults(latency=0.05, jitter=0.02, fail_rate=0.01)).start()
+    sim.address  # --> '127.0.0.1:<port>' use as the address for the outlet in the POWER config
+    sim.stop()
+"""
+
+import json
+import queue
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Union
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+class Faults:
+    '''Latency and failure injection for a simulator.
+
+    params:
+        latency: base delay (seconds) added to every response
+        jitter: random additional delay (0 - jitter seconds)
+        fail_rate: fraction of requests answered with a 503
+        drop_rate: fraction of requests where the connection is closed without a response
+        seed: seed for the random generator (repeatable runs)
+    '''
+
+    def __init__(self, latency: float = 0, jitter: float = 0, fail_rate: float = 0, drop_rate: float = 0, seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.drop_rate = drop_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self) -> None:
+        with self._lock:
+            _jitter = self._random.uniform(0, self.jitter) if self.jitter else 0
+        if self.latency + _jitter:
+            time.sleep(self.latency + _jitter)
+
+    def roll(self) -> Union[str, None]:
+        '''Return 'drop', 'fail' or None.'''
+        with self._lock:
+            r = self._random.random()
+        if r < self.drop_rate:
+            return 'drop'
+        elif r < self.drop_rate + self.fail_rate:
+            return 'fail'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, same as the real devices
+
+    def log_message(self, *args):
+        pass
+
+    def _dispatch(self):
+        sim: SimServer = self.server.sim
+        sim.requests += 1
+        if sim.offline:
+            self.close_connection = True
+            return
+        sim.faults.delay()
+        fault = sim.faults.roll()
+        if fault == 'drop':
+            sim.failures += 1
+            self.close_connection = True
+            return
+        elif fault == 'fail':
+            sim.failures += 1
+            return self.respond(503, 'Service Unavailable', ctype='text/plain')
+
+        length = int(self.headers.get('Content-Length', 0) or 0)
+        body = self.rfile.read(length).decode() if length else ''
+        url = urlparse(self.path)
+        sim.handle(self, self.command, unquote(url.path), parse_qs(url.query, keep_blank_values=True), body)
+
+    do_GET = do_PUT = do_POST = _dispatch
+
+    def respond(self, status: int = 200, body: Union[str, dict, list, bool, None] = None, ctype: str = 'application/json'):
+        if body is None:
+            data = b''
+        elif isinstance(body, str) and ctype != 'application/json':
+            data = body.encode()
+        else:
+            data = json.dumps(body).encode()
+        self.send_response(status)
+        if data or status != 204:
+            self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class SimServer:
+    '''Base simulator, HTTP server on 127.0.0.1 (random port) in a daemon thread.'''
+
+    def __init__(self, faults: Faults = None):
+        self.faults = faults or Faults()
+        self.offline = False  # True: all connections are closed without a response
+        self.requests = 0
+        self.failures = 0
+        self.lock = threading.Lock()
+        self._server = None
+
+    @property
+    def address(self) -> str:
+        return f'127.0.0.1:{self._server.server_address[1]}'
+
+    def start(self) -> 'SimServer':
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.sim = self
+        threading.Thread(target=self._server.serve_forever, name=f'sim_{self.__class__.__name__}', daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def handle(self, req: _Handler, method: str, path: str, query: Dict[str, List[str]], body: str) -> None:
+        raise NotImplementedError
+
+
+class DLIRestSim(SimServer):
+    '''dli web power switch pro (rest API).  Authentication is not enforced.'''
+
+    def __init__(self, outlets: int = 8, faults: Faults = None):
+        super().__init__(faults)
+        self.outlets = [{'name': f'Outlet {p + 1}', 'state': False, 'locked': False, 'critical': False} for p in range(outlets)]
+
+    def _idx(self, selector: str) -> List[int]:
+        if selector.startswith('='):
+            return [int(i) for i in selector[1:].split(',')]
+        return [int(selector)]
+
+    def handle(self, req, method, path, query, body):
+        parts = [p for p in path.split('/') if p]
+        if parts[:2] != ['restapi', 'relay']:
+            if path == '/outlet' and 'a' in query:  # "all" operations use the web ui
+                with self.lock:
+                    for o in self.outlets:
+                        o['state'] = query['a'][0].upper() == 'ON' if query['a'][0].upper() != 'CCL' else o['state']
+                return req.respond(200, '<META HTTP-EQUIV="refresh" content="0; URL=/index.htm">', ctype='text/html')
+            return req.respond(404, 'Not Found', ctype='text/html')
+
+        if parts[2:] == ['version']:
+            return req.respond(200, '1.7.24')
+        elif parts[2:] == ['outlets']:
+            return req.respond(200, self.outlets)
+        elif len(parts) == 5 and parts[2] == 'outlets':
+            try:
+                idx = self._idx(parts[3])
+                [self.outlets[i] for i in idx]
+            except (ValueError, IndexError):
+                return req.respond(404, {'error': 'invalid outlet'})
+            func = parts[4]
+            if method == 'GET' and func in ['state', 'name']:
+                return req.respond(200, self.outlets[idx[0]][func])
+            elif method == 'PUT' and func in ['state', 'name']:
+                with self.lock:
+                    for i in idx:
+                        self.outlets[i][func] = json.loads(body)
+                return req.respond(204)
+            elif method == 'POST' and func == 'cycle':
+                if not [i for i in idx if self.outlets[i]['state']]:
+                    return req.respond(200, False)
+                return req.respond(204)
+        return req.respond(404, {'error': 'not found'})
+
+
+class DLILegacySim(SimServer):
+    '''Older dli (lpc 7 and prior), the web ui is screen scraped by the dlipower library.'''
+
+    def __init__(self, outlets: int = 8, faults: Faults = None):
+        super().__init__(faults)
+        self.outlets = [{'name': f'Outlet {p + 1}', 'state': False} for p in range(outlets)]
+
+    def index(self) -> str:
+        rows = ''.join(
+            [
+                f'<tr><td>{p + 1}</td><td>{o["name"]}</td><td><font>{"ON" if o["state"] else "OFF"}</font></td>'
+                f'<td><a href=outlet?{p + 1}={"OFF" if o["state"] else "ON"}>Switch</a></td><td></td></tr>'
+                for p, o in enumerate(self.outlets)
+            ]
+        )
+        return f'<html><body><table><tr><th>#</th><th>Name</th><th>State</th><th>Action</th><th></th></tr>{rows}</table></body></html>'
+
+    def handle(self, req, method, path, query, body):
+        if path.startswith('/restapi/'):
+            return req.respond(404, 'Not Found', ctype='text/html')  # no rest API, triggers screen scrape method
+        elif path == '/outlet':
+            with self.lock:
+                for k, v in query.items():
+                    v = v[0].upper()
+                    targets = self.outlets if k == 'a' else [self.outlets[int(k) - 1]] if k.isdigit() else []
+                    for o in targets:
+                        o['state'] = v == 'ON' if v in ['ON', 'OFF'] else o['state']
+        elif path == '/unitnames.cgi':
+            with self.lock:
+                for k, v in query.items():
+                    if k.startswith('outname') and k[7:].isdigit():
+                        self.outlets[int(k[7:]) - 1]['name'] = v[0]
+        return req.respond(200, self.index(), ctype='text/html')
+
+
+class TasmotaSim(SimServer):
+    '''Tasmota flashed outlet with one or more relays.'''
+
+    def __init__(self, relays: int = 1, faults: Faults = None):
+        super().__init__(faults)
+        self.relays = {r: False for r in range(1, relays + 1)}
+
+    def _power(self, relay: int = None) -> dict:
+        if len(self.relays) == 1:
+            return {'POWER': 'ON' if self.relays[1] else 'OFF'}
+        relays = [relay] if relay else self.relays
+        return {f'POWER{r}': 'ON' if self.relays[r] else 'OFF' for r in relays}
+
+    def _cmnd(self, cmnd: str) -> dict:
+        cmd, _, arg = cmnd.strip().partition(' ')
+        cmd, arg = cmd.upper(), arg.strip().upper()
+        if cmd == 'STATUS' and arg == '11':
+            return {'StatusSTS': {'UptimeSec': 1, **self._power()}}
+        elif cmd.startswith('POWER'):
+            relay = int(cmd[5:] or 1)
+            targets = list(self.relays) if relay == 0 else [relay]
+            if [r for r in targets if r not in self.relays]:
+                return {'Command': 'Unknown'}
+            with self.lock:
+                for r in targets:
+                    if arg in ['ON', '1']:
+                        self.relays[r] = True
+                    elif arg in ['OFF', '0']:
+                        self.relays[r] = False
+                    elif arg in ['TOGGLE', '2']:
+                        self.relays[r] = not self.relays[r]
+            return self._power() if relay == 0 else self._power(relay)
+        return {'Command': 'Unknown'}
+
+    def handle(self, req, method, path, query, body):
+        if path != '/cm' or 'cmnd' not in query:
+            return req.respond(404, 'Not Found', ctype='text/plain')
+        cmnd = query['cmnd'][0]
+        if cmnd.upper().startswith('BACKLOG'):
+            for c in cmnd[7:].split(';'):
+                self._cmnd(c)
+            return req.respond(200, {})  # backlog responds before executing, no state in response
+        return req.respond(200, self._cmnd(cmnd))
+
+
+class ESPHomeSim(SimServer):
+    '''espHome flashed outlet, web_server component REST API and event stream.'''
+
+    PING_INTERVAL = 10
+
+    def __init__(self, relays: List[str] = None, faults: Faults = None):
+        super().__init__(faults)
+        self.relays = {r: False for r in (relays or ['relay1'])}
+        self._subscribers: List[queue.Queue] = []
+
+    def _state(self, relay: str) -> dict:
+        return {'id': f'switch-{relay}', 'name': relay, 'value': self.relays[relay], 'state': 'ON' if self.relays[relay] else 'OFF'}
+
+    def _publish(self, relay: str) -> None:
+        for q in self._subscribers.copy():
+            q.put(self._state(relay))
+
+    def _events(self, req) -> None:
+        req.send_response(200)
+        req.send_header('Content-Type', 'text/event-stream')
+        req.send_header('Cache-Control', 'no-cache')
+        req.end_headers()
+        req.close_connection = True
+        q = queue.Queue()
+        self._subscribers.append(q)
+        try:
+            for r in self.relays:
+                q.put(self._state(r))
+            while not self.offline:
+                try:
+                    data = q.get(timeout=self.PING_INTERVAL)
+                    req.wfile.write(f'event: state\ndata: {json.dumps(data)}\n\n'.encode())
+                except queue.Empty:
+                    req.wfile.write(b'event: ping\ndata: {}\n\n')
+                req.wfile.flush()
+        except OSError:
+            pass
+        finally:
+            self._subscribers.remove(q)
+
+    def handle(self, req, method, path, query, body):
+        parts = [p for p in path.split('/') if p]
+        if parts == ['events']:
+            return self._events(req)
+        if len(parts) < 2 or parts[0] != 'switch' or parts[1] not in self.relays:
+            return req.respond(404, 'Not Found', ctype='text/plain')
+
+        relay = parts[1]
+        if len(parts) == 2 and method == 'GET':
+            return req.respond(200, self._state(relay))
+        elif len(parts) == 3 and method == 'POST' and parts[2] in ['turn_on', 'turn_off', 'toggle']:
+            with self.lock:
+                self.relays[relay] = True if parts[2] == 'turn_on' else False if parts[2] == 'turn_off' else not self.relays[relay]
+            self._publish(relay)
+            return req.respond(200, None)
+        return req.respond(404, 'Not Found', ctype='text/plain')
+
+
+SIMULATORS = {
+    'dli': DLIRestSim,
+    'dli-legacy': DLILegacySim,
+    'tasmota': TasmotaSim,
+    'esphome': ESPHomeSim,
+}